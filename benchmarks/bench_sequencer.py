@@ -0,0 +1,400 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Sequencer benchmarks
+     Times the loading and the resolution of synthetic sequences of
+     configurable size, and compares the results to a stored baseline
+
+     Usage : python benchmarks/bench_sequencer.py [--preset large]
+                                                  [--save-baseline]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory is not reported there
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+# pylint: disable=wrong-import-position
+import media_library
+from cache_directory import CACHE_DIRECTORY_VARIABLE
+from media_library import get_media_library
+from media_prober import MediaProber
+from metadata_manager import MetaDataManager
+from player_backend import SimulatedBackend
+from plugin_manager import PluginManager
+from sequence_compiler import load_sequence_plan
+from sequence_model import LazySequence
+from sequencer import SequenceManager
+from video_pools import RANDOM_VIDEO_MODES
+
+# (number of media files, number of blocks) of each preset
+PRESETS = {"small": [(10, 10)],
+           "medium": [(1000, 100), (1000, 1000)],
+           "large": [(10000, 1000), (100000, 10000)],
+           "all": [(10, 10), (1000, 1000), (100000, 10000)]}
+# Number of media files per random video directory
+FILES_PER_DIRECTORY = 1000
+# Number of operations of the phases that are not sized by the input
+NB_PICKS = 2000
+NB_RECONFIGURES = 100
+# Default location of the baseline
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "baseline.json")
+# A phase is a regression if it is slower than the baseline by this ratio
+# and by more than the minimum difference, below which it is only noise
+REGRESSION_RATIO = 0.25
+REGRESSION_MIN_S = 0.005
+
+
+def generate_tree(directory, nb_files, nb_blocks, seed=0):
+    """! Writes a synthetic sequence, its metadata and its media files
+        @param directory : empty directory to write the tree in
+        @param nb_files : number of media files
+        @param nb_blocks : number of blocks of the sequence, repeats included
+        @return (sequence path, metadata path, dictionary of the
+                media file paths and their duration in seconds)
+    """
+    rng = random.Random(seed)
+    durations = {}
+    # A few fixed videos (jingles, ads), the others fill the random
+    # video directories
+    nb_fixed = max(1, min(nb_files // 10, 100))
+    os.makedirs(directory + "/fixed")
+    names = []
+    for i in range(nb_fixed):
+        names.append(f"fixed/jingle_{i}.mp4")
+    random_directories = []
+    for i in range(nb_files - nb_fixed):
+        random_directory = f"clips_{i // FILES_PER_DIRECTORY}"
+        if i % FILES_PER_DIRECTORY == 0:
+            os.makedirs(directory + "/" + random_directory)
+            random_directories.append(random_directory)
+        names.append(f"{random_directory}/clip_{i}.mp4")
+    if not random_directories:
+        random_directories.append("fixed")
+
+    metadata_lines = []
+    for name in names:
+        path = directory + "/" + name
+        SimulatedBackend.write_media_file(path)
+        durations[path] = rng.randint(30, 300)
+        begin_s = rng.choice((0, 0, 5))
+        end_s = rng.choice((0, durations[path] - 5))
+        metadata_lines.append(
+            f"{name.split('/').pop()},{begin_s // 60:02d}:{begin_s % 60:02d},"
+            f"{end_s // 60:02d}:{end_s % 60:02d},"
+            f"{rng.choice('yn')},{rng.choice('yn')},Artist {len(metadata_lines)},"
+            f"Song {len(metadata_lines)}\n")
+    metadata_path = directory + "/metadata.csv"
+    with open(metadata_path, "w", encoding="utf-8") as metadata_file:
+        metadata_file.writelines(metadata_lines)
+
+    # Blocks, with a repeat of a few random videos from time to time
+    nodes = []
+    nb_written = 0
+    while nb_written < nb_blocks:
+        if nb_written % 10 == 9 and nb_blocks - nb_written >= 4:
+            nodes.append(
+                '<Repeat nb_time="2">'
+                f'<RandomVideo path="{rng.choice(random_directories)}" '
+                'reselect_timeout="60"/>'
+                f'<Video path="fixed/jingle_{rng.randrange(nb_fixed)}.mp4"/>'
+                '</Repeat>')
+            nb_written = nb_written + 4
+        elif nb_written % 3 == 0:
+            nodes.append(
+                f'<Video path="fixed/jingle_{rng.randrange(nb_fixed)}.mp4"/>')
+            nb_written = nb_written + 1
+        else:
+            nodes.append(
+                f'<RandomVideo path="{rng.choice(random_directories)}" '
+                'reselect_timeout="30"/>')
+            nb_written = nb_written + 1
+    sequence_path = directory + "/sequence.xml"
+    with open(sequence_path, "w", encoding="utf-8") as sequence_file:
+        sequence_file.write("<Document><Title>Benchmark</Title><Sequence>" +
+                            "\n".join(nodes) + "</Sequence></Document>")
+    return sequence_path, metadata_path, durations
+
+
+def _get_max_rss_mb():
+    """! Returns the peak resident memory of the process in MB """
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # In kilobytes on Linux, in bytes on macOS
+    return max_rss / 1e6 if sys.platform == "darwin" else max_rss / 1e3
+
+
+class PhaseTimer:
+    """! Times the phases of a benchmark run, with their peak memory
+
+        By default the memory of a phase is the growth of the peak
+        resident memory of the process during the phase, which costs
+        nothing. Tracing the allocations gives the exact peak of
+        each phase, but slows the phases down several times.
+    """
+    # List of the results as dictionaries
+    results = []
+    # Name of the benchmarked configuration
+    config = ""
+    is_tracing_memory = False
+
+    def __init__(self, config, is_tracing_memory=False):
+        self.config = config
+        self.is_tracing_memory = is_tracing_memory
+        self.results = []
+
+    @contextlib.contextmanager
+    def phase(self, name, nb_items):
+        """! Times the code of the with block
+            @param name : name of the phase
+            @param nb_items : number of items processed, for the throughput
+        """
+        if self.is_tracing_memory:
+            tracemalloc.reset_peak()
+            memory_begin = tracemalloc.get_traced_memory()[0] / 1e6
+        else:
+            memory_begin = _get_max_rss_mb()
+        time_begin_s = time.perf_counter()
+        yield
+        duration_s = time.perf_counter() - time_begin_s
+        if self.is_tracing_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1] / 1e6 - memory_begin
+        else:
+            peak_memory = _get_max_rss_mb() - memory_begin
+        self.results.append({"config": self.config,
+                             "phase": name,
+                             "items": nb_items,
+                             "seconds": duration_s,
+                             "items_per_s": nb_items / duration_s
+                                            if duration_s > 0 else 0,
+                             "peak_memory_mb": peak_memory})
+
+
+def run_config(nb_files, nb_blocks, is_tracing_memory=False):
+    """! Benchmarks the sequencer phases on a synthetic tree
+        @param is_tracing_memory : True to trace the allocations
+        @return the list of the phase results
+    """
+    timer = PhaseTimer(f"{nb_files} files, {nb_blocks} blocks",
+                       is_tracing_memory)
+    working_directory = os.getcwd()
+    # The traces of the application are not part of the report
+    with tempfile.TemporaryDirectory(prefix="vlcsequencer_bench_") as directory, \
+            open(os.devnull, "w", encoding="utf-8") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        # The media library and the plan cache are written in the
+        # temporary directory, as the other files of the application
+        os.chdir(directory)
+        cache_directory = os.environ.get(CACHE_DIRECTORY_VARIABLE)
+        os.environ[CACHE_DIRECTORY_VARIABLE] = directory + "/cache"
+        try:
+            sequence_path, metadata_path, durations = generate_tree(
+                directory + "/media", nb_files, nb_blocks)
+            backend = SimulatedBackend(durations)
+            random_directories = sorted({os.path.dirname(path)
+                                         for path in durations})
+
+            with timer.phase("index media library", nb_files):
+                for random_directory in random_directories:
+                    get_media_library().refresh_directory(random_directory)
+            with timer.phase("reindex unchanged library", nb_files):
+                for random_directory in random_directories:
+                    get_media_library().refresh_directory(random_directory)
+
+            def store_probe_result(path, duration, tracks):
+                get_media_library().set_probe_result(path, duration, tracks)
+            with timer.phase("probe media", nb_files):
+                prober = MediaProber(backend, on_probed_cb=store_probe_result)
+                requests = [prober.probe(path) for path in durations]
+                for request in requests:
+                    request.wait()
+                prober.stop()
+
+            with timer.phase("compile sequence plan", nb_blocks):
+                load_sequence_plan(sequence_path, metadata_path)
+            with timer.phase("load cached sequence plan", nb_blocks):
+                load_sequence_plan(sequence_path, metadata_path)
+
+            with timer.phase("load metadata", nb_files):
+                metadata_manager = MetaDataManager(metadata_path)
+            manager = SequenceManager(backend, None, sequence_path,
+                                      metadata_manager, PluginManager())
+            with timer.phase("load sequence", nb_blocks):
+                manager.load_sequence()
+
+            sequence_length = len(manager.sequence_model)
+            with timer.phase("flatten sequence", sequence_length):
+                LazySequence(manager.sequence_data)
+                for _ in zip(range(sequence_length),
+                             manager.sequence_model.iter_from(0)):
+                    pass
+
+            with timer.phase("resolve blocks", sequence_length):
+                blocks = manager._resolve_blocks(  # pylint: disable=protected-access
+                    0, sequence_length, backend.get_clock().time())
+            with timer.phase("append resolved blocks", sequence_length):
+                manager._append_blocks(blocks)  # pylint: disable=protected-access
+
+            pool_directory = manager.sequence_plan.directories and \
+                next(iter(manager.sequence_plan.directories))
+            # The modes share the last playbacks of the directory
+            time_s = backend.get_clock().time()
+            for mode in RANDOM_VIDEO_MODES:
+                with timer.phase("pick random video, " + mode, NB_PICKS):
+                    if pool_directory:
+                        for _ in range(NB_PICKS):
+                            manager._find_random_video(  # pylint: disable=protected-access
+                                pool_directory, 30, time_s, mode)
+                            time_s = time_s + 60
+
+            manager.index_playing_video = len(manager.sequence_window) // 2
+            with timer.phase("reconfigure timestamps", NB_RECONFIGURES):
+                for _ in range(NB_RECONFIGURES):
+                    manager._reconfigure_timestamps(  # pylint: disable=protected-access
+                        manager.index_playing_video)
+
+            manager.is_running_flag = False
+            manager.media_prober.stop()
+        finally:
+            # Each run starts with an empty library
+            get_media_library().close()
+            media_library._MEDIA_LIBRARY = None  # pylint: disable=protected-access
+            os.chdir(working_directory)
+            if cache_directory is None:
+                del os.environ[CACHE_DIRECTORY_VARIABLE]
+            else:
+                os.environ[CACHE_DIRECTORY_VARIABLE] = cache_directory
+    return timer.results
+
+
+def compare_to_baseline(results, baseline):
+    """! Marks the results slower than the baseline
+        @return the number of regressions
+    """
+    baseline_seconds = {(result["config"], result["phase"]): result["seconds"]
+                        for result in baseline}
+    nb_regressions = 0
+    for result in results:
+        reference_s = baseline_seconds.get((result["config"], result["phase"]))
+        result["baseline_ratio"] = None
+        result["is_regression"] = False
+        if reference_s is None:
+            continue
+        result["baseline_ratio"] = result["seconds"] / reference_s \
+            if reference_s > 0 else None
+        if result["seconds"] > reference_s * (1 + REGRESSION_RATIO) and \
+           result["seconds"] - reference_s > REGRESSION_MIN_S:
+            result["is_regression"] = True
+            nb_regressions = nb_regressions + 1
+    return nb_regressions
+
+
+def print_report(results):
+    """! Prints the results as a table """
+    print(f"{'phase':<28}{'items':>9}{'seconds':>10}{'items/s':>12}"
+          f"{'peak MB':>9}{'baseline':>10}")
+    config = None
+    for result in results:
+        if result["config"] != config:
+            config = result["config"]
+            print("--- " + config)
+        ratio = result.get("baseline_ratio")
+        comparison = "" if ratio is None else f"{ratio:.2f}x"
+        if result.get("is_regression"):
+            comparison = comparison + " !"
+        print(f"{result['phase']:<28}{result['items']:>9}"
+              f"{result['seconds']:>10.4f}{result['items_per_s']:>12.0f}"
+              f"{result['peak_memory_mb']:>9.2f}{comparison:>10}")
+
+
+def main():
+    """! Runs the benchmarks
+        @return the exit code : 1 if a phase regressed, 0 otherwise
+    """
+    parser = argparse.ArgumentParser(prog="bench_sequencer")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="medium",
+                        help="Sizes of the synthetic sequences")
+    parser.add_argument("--files", type=int,
+                        help="Number of media files, instead of a preset")
+    parser.add_argument("--blocks", type=int,
+                        help="Number of blocks, instead of a preset")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="Path of the baseline results")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results as the new baseline")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Report the exact peak allocations of each "
+                             "phase, the timings are then much slower")
+    parser.add_argument("--output",
+                        help="Path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    configs = PRESETS[args.preset]
+    if args.files is not None or args.blocks is not None:
+        configs = [(args.files or 1000, args.blocks or 1000)]
+
+    if args.trace_memory:
+        tracemalloc.start()
+    results = []
+    for nb_files, nb_blocks in configs:
+        results.extend(run_config(nb_files, nb_blocks, args.trace_memory))
+    tracemalloc.stop()
+
+    nb_regressions = 0
+    if not args.save_baseline and os.path.isfile(args.baseline):
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            nb_regressions = compare_to_baseline(results,
+                                                 json.load(baseline_file))
+    print_report(results)
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.save_baseline:
+        baseline = results
+        if os.path.isfile(args.baseline):
+            # Keep the baseline of the configurations not run this time
+            with open(args.baseline, encoding="utf-8") as baseline_file:
+                configs_run = {result["config"] for result in results}
+                baseline = [result for result in json.load(baseline_file)
+                            if result["config"] not in configs_run] + results
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+        print("Baseline stored in " + args.baseline)
+    elif nb_regressions:
+        print(f"{nb_regressions} phase(s) slower than the baseline")
+    return 1 if nb_regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Audio analysis module
+     Loudness and silences of the clips, measured in the background,
+     giving the volume equalizing them and their default trim points
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import subprocess
+import threading
+
+from logger import print_trace_in_ui
+from media_library import get_media_library
+
+try:
+    import numpy
+except ImportError:
+    # Without numpy, the clips are played at full volume and untrimmed
+    numpy = None
+
+# Rate of the audio decoded for the analysis, mono
+SAMPLE_RATE = 11025
+# Duration of the blocks the silences are detected on, in seconds
+SILENCE_BLOCK_S = 0.05
+# Number of silence blocks decoded at a time
+DECODE_CHUNK_BLOCKS = 200
+# Level under which a block is silent, in dB full scale
+SILENCE_THRESHOLD_DB = -50
+# The loudness is gated on 400 ms windows overlapping by 75 %,
+# in numbers of silence blocks
+GATE_WINDOW_BLOCKS = 8
+GATE_STEP_BLOCKS = 2
+# Windows quieter than this are not part of the loudness
+ABSOLUTE_GATE_DB = -70
+# Nor the windows that much quieter than the loudness of the others
+RELATIVE_GATE_DB = -10
+
+# Loudness the clips are equalized to, in dB full scale
+TARGET_LOUDNESS_DB = -18
+# Bounds of the gain applied to a clip
+MIN_GAIN_DB = -15
+MAX_GAIN_DB = 3
+# Player volume of a clip at the target loudness
+FULL_VOLUME = 100
+
+# Shorter silences are not trimmed, in seconds
+MIN_TRIM_S = 0.5
+# Silence kept before and after the sound when trimming
+TRIM_MARGIN_S = 0.1
+
+
+def get_block_powers(samples, sample_rate=SAMPLE_RATE):
+    """! Returns the mean power of the silence blocks of audio samples,
+         the samples after the last whole block are left out
+        @param samples : numpy array of the samples, between -1 and 1
+        @param sample_rate : number of samples per second
+    """
+    block_size = int(SILENCE_BLOCK_S * sample_rate)
+    nb_blocks = len(samples) // block_size
+    return numpy.mean(numpy.square(
+        samples[:nb_blocks * block_size].reshape(nb_blocks, block_size)),
+                      axis=1)
+
+
+def decode_block_powers(path):
+    """! Decodes the audio of a file with ffmpeg, a chunk at a time
+        @param path : path of the media file
+        @return the numpy array of get_block_powers of the mono samples
+                at SAMPLE_RATE, empty if the file has no audio samples.
+                None if ffmpeg failed
+        @raise OSError if ffmpeg cannot be run
+    """
+    # 16 bits samples
+    chunk_size = int(SILENCE_BLOCK_S * SAMPLE_RATE) * DECODE_CHUNK_BLOCKS * 2
+    chunk_powers = []
+    with subprocess.Popen(
+            ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-vn",
+             "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+        # The reads return whole blocks, but the last one
+        data = process.stdout.read(chunk_size)
+        while data:
+            samples = numpy.frombuffer(data[:len(data) // 2 * 2],
+                                       dtype=numpy.int16) \
+                .astype(numpy.float32) / 32768
+            chunk_powers.append(get_block_powers(samples))
+            data = process.stdout.read(chunk_size)
+    if process.returncode != 0:
+        return None
+    if not chunk_powers:
+        return numpy.zeros(0, dtype=numpy.float32)
+    return numpy.concatenate(chunk_powers)
+
+
+def analyze_samples(samples, sample_rate=SAMPLE_RATE):
+    """! Measures the loudness and the silences of audio samples
+        @param samples : numpy array of the samples, between -1 and 1
+        @param sample_rate : number of samples per second
+        @return the dictionary of analyze_block_powers
+    """
+    return analyze_block_powers(get_block_powers(samples, sample_rate))
+
+
+def analyze_block_powers(powers):
+    """! Measures the loudness and the silences of audio, from the mean
+         power of its silence blocks
+
+        The loudness is gated as the EBU R128 integrated loudness, but
+        without its K-weighting filter : it is the mean power of the
+        windows that are not silent, in dB full scale.
+
+        @param powers : numpy array of get_block_powers
+        @return a dictionary with the loudness_db, None if the audio is
+                silent, the silence_begin_s timestamp where the leading
+                silence ends and the silence_end_s timestamp where the
+                trailing silence begins. Empty if there is no audio
+    """
+    nb_blocks = len(powers)
+    if nb_blocks == 0:
+        return {}
+    # Avoids the log of 0 for digital silence
+    powers_db = 10 * numpy.log10(powers + 1e-12)
+
+    sound_blocks = numpy.flatnonzero(powers_db > SILENCE_THRESHOLD_DB)
+    if sound_blocks.size == 0:
+        return {"loudness_db": None,
+                "silence_begin_s": 0,
+                "silence_end_s": 0}
+
+    # Mean power of the gating windows, from the sums of the blocks
+    cumulated_powers = numpy.concatenate(([0], numpy.cumsum(powers)))
+    starts = numpy.arange(0, max(nb_blocks - GATE_WINDOW_BLOCKS, 0) + 1,
+                          GATE_STEP_BLOCKS)
+    ends = numpy.minimum(starts + GATE_WINDOW_BLOCKS, nb_blocks)
+    window_powers = (cumulated_powers[ends] - cumulated_powers[starts]) / \
+        (ends - starts)
+    window_powers = window_powers[
+        10 * numpy.log10(window_powers + 1e-12) > ABSOLUTE_GATE_DB]
+    loudness_db = None
+    if window_powers.size > 0:
+        relative_gate = numpy.mean(window_powers) * \
+            10 ** (RELATIVE_GATE_DB / 10)
+        window_powers = window_powers[window_powers > relative_gate]
+        loudness_db = float(10 * numpy.log10(numpy.mean(window_powers)))
+
+    return {"loudness_db": loudness_db,
+            "silence_begin_s": float(sound_blocks[0] * SILENCE_BLOCK_S),
+            "silence_end_s": float((sound_blocks[-1] + 1) * SILENCE_BLOCK_S)}
+
+
+def analyze_file(path):
+    """! Decodes and analyzes the audio of a file, in a worker process
+        @return the dictionary of analyze_block_powers,
+                None if the file could not be decoded
+        @raise OSError if ffmpeg cannot be run
+    """
+    powers = decode_block_powers(path)
+    if powers is None:
+        return None
+    return analyze_block_powers(powers)
+
+
+def _init_worker():
+    """! Lowers the priority of the workers, the playback goes first """
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+
+def get_gain_volume(audio_analysis):
+    """! Returns the player volume equalizing a clip
+        @param audio_analysis : dictionary of analyze_block_powers,
+                                None if not analyzed
+        @return the volume, FULL_VOLUME for the clips not analyzed
+    """
+    if not audio_analysis or audio_analysis.get("loudness_db") is None:
+        return FULL_VOLUME
+    gain_db = min(max(TARGET_LOUDNESS_DB - audio_analysis["loudness_db"],
+                      MIN_GAIN_DB), MAX_GAIN_DB)
+    return int(round(FULL_VOLUME * 10 ** (gain_db / 20)))
+
+
+def get_trim_points(path, metadata=None):
+    """! Returns the timestamps a video is played between : the ones of
+         its metadata, or by default the ones cutting its leading and
+         trailing silences
+        @param path : full path of the video
+        @param metadata : MetaDataEntry of the video, None if none
+        @return (begin timestamp, end timestamp) in seconds,
+                the end is 0 to play the video until its end
+    """
+    if metadata is not None and \
+       (metadata.timestamp_begin != 0 or metadata.timestamp_end != 0):
+        return (metadata.timestamp_begin, metadata.timestamp_end)
+    entry = get_media_library().get_entry(path)
+    if entry is None or not entry.audio_analysis or \
+       entry.audio_analysis.get("loudness_db") is None:
+        return (0, 0)
+    begin_s = entry.audio_analysis["silence_begin_s"]
+    begin_s = round(begin_s - TRIM_MARGIN_S, 2) \
+        if begin_s >= MIN_TRIM_S else 0
+    end_s = entry.audio_analysis["silence_end_s"]
+    end_s = round(end_s + TRIM_MARGIN_S, 2) \
+        if 0 < entry.duration and entry.duration - end_s >= MIN_TRIM_S \
+        else 0
+    return (begin_s, end_s)
+
+
+class AudioAnalyzer:
+    """! Analyzes the audio of the clips in the background
+
+        The clips are decoded by ffmpeg and analyzed in a pool of
+        processes with a lower priority, and the results are stored in
+        the media library : a clip is analyzed again only if it changed.
+        Needs numpy and ffmpeg, otherwise nothing is analyzed.
+    """
+    nb_workers = 1
+    is_running = False
+    # Thread of the running analysis, None if none
+    _thread = None
+
+    def __init__(self, nb_workers=None):
+        """! Creates the analyzer
+            @param nb_workers : number of processes,
+                                all the cpus but one by default
+        """
+        self.nb_workers = nb_workers or max((os.cpu_count() or 1) - 1, 1)
+        self.is_running = True
+        self._thread = None
+
+    def analyze(self, paths):
+        """! Analyzes the clips not analyzed yet, after the ones queued
+            @param paths : paths of the media files
+        """
+        if numpy is None:
+            print_trace_in_ui("numpy is not installed, the audio of the "
+                              "clips is not analyzed")
+            return
+        previous_thread = self._thread
+        self._thread = threading.Thread(name="Audio Analysis Thread",
+                                        target=self._analysis_thread,
+                                        args=(previous_thread,
+                                              list(dict.fromkeys(paths))),
+                                        daemon=True)
+        self._thread.start()
+
+    def _analysis_thread(self, previous_thread, paths):
+        """! Analyzes the clips in the pool, then stores the results """
+        if previous_thread is not None:
+            previous_thread.join()
+        library = get_media_library()
+        paths = [path for path in paths
+                 if library.get_entry(path) is not None and
+                 library.get_entry(path).audio_analysis is None]
+        if not paths or not self.is_running:
+            return
+        print_trace_in_ui("Analyzing the audio of ", len(paths), " clips")
+        try:
+            # The workers are spawned : forking the threads
+            # of the application is not safe
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.nb_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker) as executor:
+                futures = {executor.submit(analyze_file, path): path
+                           for path in paths}
+                for future in concurrent.futures.as_completed(futures):
+                    if not self.is_running:
+                        break
+                    path = futures[future]
+                    try:
+                        audio_analysis = future.result()
+                    except (OSError, concurrent.futures.BrokenExecutor):
+                        raise
+                    except Exception as error: # pylint: disable=broad-except
+                        # A bad file doesnt stop the analysis of the others
+                        print_trace_in_ui("ERR ! The audio analysis of ",
+                                          path, " failed : ", error)
+                        continue
+                    if audio_analysis is None:
+                        # Not stored, so that the next reindexing retries
+                        print_trace_in_ui("ERR ! The audio of ", path,
+                                          " could not be decoded")
+                        continue
+                    library.set_audio_analysis(path, audio_analysis)
+                    print_trace_in_ui("Audio of ", path, " : ",
+                                      audio_analysis)
+                for future in futures:
+                    future.cancel()
+        except (OSError, concurrent.futures.BrokenExecutor) as error:
+            print_trace_in_ui("ERR ! The audio analysis failed,"
+                              " is ffmpeg installed ? ", error)
+
+    def stop(self):
+        """! Stops the analysis, after the clips being decoded """
+        self.is_running = False
+        if self._thread is not None:
+            self._thread.join()
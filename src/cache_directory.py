@@ -0,0 +1,46 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Cache directory module
+     Directory of the caches of the application, in the cache
+     directory of the user
+"""
+import os
+
+# Environment variable replacing the cache directory, for the
+# benchmarks and the tests
+CACHE_DIRECTORY_VARIABLE = "VLCSEQUENCER_CACHE_DIR"
+CACHE_DIRECTORY_NAME = "VLCSequencer"
+
+
+def get_cache_directory():
+    """! Returns the cache directory of the application, created if needed :
+         VLCSequencer in %LOCALAPPDATA% on Windows, in $XDG_CACHE_HOME or
+         ~/.cache otherwise, unless VLCSEQUENCER_CACHE_DIR gives another
+    """
+    directory = os.environ.get(CACHE_DIRECTORY_VARIABLE)
+    if not directory:
+        if os.name == "nt":
+            base_directory = os.environ.get("LOCALAPPDATA") or \
+                os.path.expanduser("~/AppData/Local")
+        else:
+            base_directory = os.environ.get("XDG_CACHE_HOME") or \
+                os.path.expanduser("~/.cache")
+        directory = base_directory + "/" + CACHE_DIRECTORY_NAME
+    os.makedirs(directory, exist_ok=True)
+    return directory
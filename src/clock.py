@@ -0,0 +1,219 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Clock module
+     Source of the current time and of the waits of the application,
+     either the system clock or a virtual one for the simulations
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class SystemClock:
+    """! The wall clock : real time and real sleeps """
+
+    def time(self):
+        """! Returns the current timestamp in seconds """
+        return time.time()
+
+    def sleep(self, duration_s):
+        """! Blocks the calling thread for duration_s seconds """
+        time.sleep(duration_s)
+
+    def wait_until(self, time_s):
+        """! Blocks the calling thread until the timestamp time_s """
+        self.sleep(max(time_s - time.time(), 0))
+
+    def take_part(self):
+        """! Nothing to do on the wall clock """
+
+    def new_event(self):
+        """! Returns a new event to wait for with wait_event """
+        return threading.Event()
+
+    def wait_event(self, event, timeout_s=None):
+        """! Blocks the calling thread until the event is set,
+             for timeout_s seconds at most
+            @param event : event returned by new_event
+            @param timeout_s : maximum wait, None to wait without limit
+            @return True if the event is set
+        """
+        return event.wait(timeout_s)
+
+
+class VirtualClock:
+    """! Simulated clock, jumping from a wake-up to the next
+
+        The threads that sleep on the clock take part in the simulation.
+        Once all of them sleep, the virtual time jumps to the earliest
+        wake-up time : the threads wake up in order, and the computations
+        between the sleeps take no virtual time at all.
+
+        A thread waiting for an event without timeout leaves the
+        simulation until the event is set.
+        A thread blocked on something else than the clock holds the
+        virtual time. If it does not come back for a while, the time
+        jumps anyway, so that it cannot wait forever for a sleeping one.
+    """
+    # Current virtual timestamp in seconds
+    _now_s = 0
+    # Heap of (wake-up time, counter, thread) of the sleeping threads
+    _wake_ups = []
+    # Threads that took part in the simulation
+    _threads = set()
+    # Real time after which a stalled thread stops holding the virtual time
+    stall_timeout_s = 0
+
+    class Event:
+        """! Event set by any thread, waited for on the virtual clock """
+        _is_set = False
+
+        def __init__(self, condition):
+            self._condition = condition
+            self._is_set = False
+
+        def set(self):
+            """! Sets the event, waking up the threads waiting for it """
+            with self._condition:
+                self._is_set = True
+                self._condition.notify_all()
+
+        def clear(self):
+            """! Resets the event """
+            with self._condition:
+                self._is_set = False
+
+        def is_set(self):
+            """! Returns True if the event is set """
+            return self._is_set
+
+    def __init__(self, start_time_s=None, stall_timeout_s=0.1):
+        """! Creates the clock
+            @param start_time_s : initial timestamp, now by default
+            @param stall_timeout_s : real time waited for a thread
+                                     that is not sleeping on the clock
+        """
+        self._now_s = time.time() if start_time_s is None else start_time_s
+        self.stall_timeout_s = stall_timeout_s
+        self._wake_ups = []
+        self._threads = set()
+        # Unique counter, orders the threads waking up at the same time
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def time(self):
+        """! Returns the current virtual timestamp in seconds """
+        with self._condition:
+            return self._now_s
+
+    def _is_everyone_sleeping(self):
+        """! Returns True if every live thread of the simulation sleeps """
+        self._threads = {thread for thread in self._threads
+                         if thread.is_alive()}
+        return len(self._wake_ups) >= len(self._threads)
+
+    def sleep(self, duration_s):
+        """! Blocks the calling thread until the virtual time
+             has moved forward by duration_s seconds
+        """
+        self._wait(duration_s, None)
+
+    def take_part(self):
+        """! Makes the calling thread take part in the simulation before
+             its first sleep : the virtual time waits for it from now
+        """
+        with self._condition:
+            self._threads.add(threading.current_thread())
+
+    def new_event(self):
+        """! Returns a new event to wait for with wait_event """
+        return self.Event(self._condition)
+
+    def wait_event(self, event, timeout_s=None):
+        """! Blocks the calling thread until the event is set,
+             for timeout_s seconds of virtual time at most
+            @param event : event returned by new_event
+            @param timeout_s : maximum wait, None to wait without limit
+            @return True if the event is set
+        """
+        if timeout_s is not None:
+            return self._wait(timeout_s, event)
+        with self._condition:
+            thread = threading.current_thread()
+            is_participant = thread in self._threads
+            self._threads.discard(thread)
+            # The others may all be sleeping now
+            self._condition.notify_all()
+            while not event.is_set():
+                self._condition.wait()
+            if is_participant:
+                self._threads.add(thread)
+            return True
+
+    def _wait(self, duration_s, event):
+        """! Sleeps on the virtual clock, until the event is set if any
+            @return True if the event is set
+        """
+        with self._condition:
+            thread = threading.current_thread()
+            self._threads.add(thread)
+            wake_up = (self._now_s + max(duration_s, 0),
+                       next(self._counter), thread)
+            heapq.heappush(self._wake_ups, wake_up)
+            self._condition.notify_all()
+            while self._now_s < wake_up[0] and \
+                    (event is None or not event.is_set()):
+                if self._wake_ups[0] is wake_up and \
+                   self._is_everyone_sleeping():
+                    self._now_s = wake_up[0]
+                elif not self._condition.wait(self.stall_timeout_s) and \
+                        self._wake_ups[0] is wake_up:
+                    # Nothing moved for a while : another thread is
+                    # blocked outside of the clock
+                    self._now_s = wake_up[0]
+            self._wake_ups.remove(wake_up)
+            heapq.heapify(self._wake_ups)
+            self._condition.notify_all()
+            return event is not None and event.is_set()
+
+    def wait_until(self, time_s):
+        """! Blocks the calling thread until the virtual time reaches
+             time_s, without taking part in the simulation : the time
+             moves at the pace of the sleeping threads
+        """
+        with self._condition:
+            self._threads.discard(threading.current_thread())
+            self._condition.notify_all()
+            while self._now_s < time_s:
+                if self._threads and not self._wake_ups and \
+                   self._is_everyone_sleeping():
+                    # Every thread of the simulation ended,
+                    # no thread is left to move the time
+                    self._now_s = time_s
+                else:
+                    self._condition.wait(self.stall_timeout_s)
+
+    def advance(self, duration_s):
+        """! Moves the virtual time forward, waking up the sleeping
+             threads whose wake-up time is reached
+        """
+        with self._condition:
+            self._now_s = self._now_s + duration_s
+            self._condition.notify_all()
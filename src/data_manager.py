@@ -22,7 +22,7 @@
 
 import sqlite3
 from threading import Thread
-import time
+import queue
 import copy
 
 from logger import print_trace_in_ui
@@ -40,6 +40,15 @@ def get_data_manager():
     return _DATA_MANAGER
 
 
+def kill_data_manager():
+    """! Kills the DataManager instance, if it was created """
+    # pylint: disable=global-statement
+    global _DATA_MANAGER
+    if _DATA_MANAGER is not None:
+        _DATA_MANAGER.kill()
+        _DATA_MANAGER = None
+
+
 class DataManager:
     """! Data Manager modules
         Connects with a sqlite db for internal
@@ -56,43 +65,42 @@ class DataManager:
     _db_connection = None
     _db_cursor = None
     _is_running = True
-    _fifo_messages = []
+    # Queue of the requests to the data thread : lists of the request
+    # type, the query, and the entries or the queue of the result
+    _fifo_messages = None
     _data_thread = None
-    _results_from_thread = []
 
     def _thread_runtime(self):
         self._db_connection = sqlite3.connect(self.path)
         self._db_cursor = self._db_connection.cursor()
 
-        while self._is_running:
-            if self._fifo_messages:
-                fifo_messages = copy.copy(self._fifo_messages)
-                self._fifo_messages = []
-                for message in fifo_messages:
-                    if message[0] == "CREATE":
-                        # Create
-                        self._db_cursor.execute(message[1])
-                    if message[0] == "INSERT":
-                        self._db_cursor.executemany(message[1], message[2])
-                        self._db_connection.commit()
-                    if message[0] == "IS_EXIST":
-                        result = False
-                        list_of_tables = self._db_cursor. \
-                            execute(message[1]).fetchall()
-                        if list_of_tables:
-                            result = True
-                        self._results_from_thread.append(result)
-                    if message[0] == "SELECT":
-                        res = self._db_cursor.execute(message[1])
-                        self._results_from_thread. \
-                            append(copy.copy(res.fetchall()))
-            # Argh.. not very efficient
-            time.sleep(0.2)
+        while True:
+            message = self._fifo_messages.get()
+            if message is None:
+                # Sent by kill
+                break
+            if message[0] in ("CREATE", "ALTER"):
+                # Create, alter
+                self._db_cursor.execute(message[1])
+            if message[0] == "INSERT":
+                self._db_cursor.executemany(message[1], message[2])
+                self._db_connection.commit()
+            if message[0] == "IS_EXIST":
+                result = False
+                list_of_tables = self._db_cursor. \
+                    execute(message[1]).fetchall()
+                if list_of_tables:
+                    result = True
+                message[2].put(result)
+            if message[0] == "SELECT":
+                res = self._db_cursor.execute(message[1])
+                message[2].put(copy.copy(res.fetchall()))
 
     def __init__(self, path):
         """! Initializes the data manager module"""
         self.path = path
         self._is_running = True
+        self._fifo_messages = queue.Queue()
         self._data_thread = Thread(target=self._thread_runtime)
         self._data_thread.start()
 
@@ -100,8 +108,20 @@ class DataManager:
         """! Kills the data manager module"""
         print_trace_in_ui("Killing the data manager")
         self._is_running = False
+        # The requests already queued are handled first
+        self._fifo_messages.put(None)
         self._data_thread.join()
 
+    def _request_result(self, message_type, query_str):
+        """! Queues a request and waits for its result
+            @return the result, None if the module is killed
+        """
+        if not self._is_running:
+            return None
+        result_queue = queue.Queue(maxsize=1)
+        self._fifo_messages.put([message_type, query_str, result_queue])
+        return result_queue.get()
+
     def create_table(self, table_name, table_columns_list):
         """! Creates a sqlite table
             @param table_name    name of the table to be created
@@ -119,7 +139,7 @@ class DataManager:
         query_str = query_str + columns_str
         print_trace_in_ui(f"Query str = {query_str}")
         # self._db_cursor.execute(query_str)
-        self._fifo_messages.append((["CREATE", query_str]))
+        self._fifo_messages.put(["CREATE", query_str])
 
     def is_table_exists(self, table_name):
         """! Returns true if a table exist
@@ -128,18 +148,28 @@ class DataManager:
         """
         query_str = f"SELECT name FROM sqlite_master \
             WHERE type='table' AND name='{table_name}';"
-        self._fifo_messages.append((["IS_EXIST", query_str]))
-        # Wait for _results_from_thread
-        while not self._results_from_thread and self._is_running:
-            time.sleep(0.1)
-        if self._results_from_thread:
-            # TODO Check if the result is made for us
-            result = self._results_from_thread.pop()
-            self._results_from_thread = []
-            return result
-        return None  # Should be error management there
-
-    def insert_entries(self, table_name, entries_list):
+        return self._request_result("IS_EXIST", query_str)
+
+    def get_table_columns(self, table_name):
+        """! Returns the columns of a table
+            @param table_name the name of the table
+            @return the list of the column names,
+                    empty if the table doesnt exist
+        """
+        query_str = f"PRAGMA table_info({table_name})"
+        return [row[1] for row in
+                self._request_result("SELECT", query_str) or []]
+
+    def rename_table(self, table_name, new_table_name):
+        """! Renames a sqlite table
+            @param table_name the name of the table
+            @param new_table_name the new name of the table
+        """
+        query_str = f"ALTER TABLE {table_name} RENAME TO {new_table_name}"
+        print_trace_in_ui(f"Query str = {query_str}")
+        self._fifo_messages.put(["ALTER", query_str])
+
+    def insert_entries(self, table_name, entries_list, check_table=True):
         """! Insert lines in a sqlite table
             @param table_name the name of the table to add entry to
             @param entries_list the list of
@@ -148,10 +178,13 @@ class DataManager:
                           ('John Doe', 4),
                           ('Toto', 6),
                          ]
+            @param check_table False to queue the lines without waiting
+                   for the check of the table, created beforehand
+                   by the caller
             @return True if ok, False if there was an error
         """
 
-        if not self.is_table_exists(table_name):
+        if check_table and not self.is_table_exists(table_name):
             print_trace_in_ui(f"The table {table_name} does NOT exist !")
             return False
 
@@ -167,7 +200,7 @@ class DataManager:
                 columns_str = columns_str + "?)"
         query_str = query_str + columns_str
         print_trace_in_ui(f"Query str = {query_str}")
-        self._fifo_messages.append((["INSERT", query_str, entries_list]))
+        self._fifo_messages.put(["INSERT", query_str, entries_list])
         return True
 
     def select_entries(self, table_name, columns,  **kwargs):
@@ -183,13 +216,4 @@ class DataManager:
             query_str = query_str + " ORDER BY " + kwargs["order_by"]
 
         print_trace_in_ui(f"Query str = {query_str}")
-        self._fifo_messages.append(["SELECT", query_str])
-        # Wait for _results_from_thread
-        while not self._results_from_thread and self._is_running:
-            time.sleep(0.1)
-        if self._results_from_thread:
-            # TODO Check if the result is made for us
-            result = self._results_from_thread.pop()
-            self._results_from_thread = []
-            return result
-        return None
+        return self._request_result("SELECT", query_str)
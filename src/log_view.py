@@ -25,11 +25,13 @@ from listboxes_base import BaseListbox
 class LogListbox(BaseListbox):
     """! The logging listbox"""
 
-    def __init__(self, tk_notebook, nb_elements=10):
+    def __init__(self, tk_notebook, nb_elements=10, ui_dispatcher=None):
         """! Initialize the listbox
             @param tk_notebook : the tk notebook in which add the listbox
             @param nb_elements : the max nb_elements to be displayed at once
+            @param ui_dispatcher : UiDispatcher adding the logs
+                                   from the main loop
         """
         super().__init__(tk_notebook, "Logs", nb_elements)
         tk_notebook.add(super().get_view(), text="Logs")
-        logger_subscribe_ui(super().get_listbox())
+        logger_subscribe_ui(super().get_listbox(), ui_dispatcher)
@@ -18,6 +18,7 @@
 #
 """! The LOGGER module """
 import inspect
+import threading
 import time
 import tkinter as tk
 
@@ -34,30 +35,59 @@ class Logger():
     """
     # Reference to the tkinter listbox used to gather the logs
     ui_trace_listbox = None
+    # UiDispatcher adding the logs to the listbox, None to add them now
+    ui_dispatcher = None
+    # Traces waiting for the dispatcher
+    _pending_traces = []
 
     def __init__(self):
         """! Logging module initialization """
+        self._pending_traces = []
+        self._lock = threading.Lock()
 
-    def set_ui_listbox(self, ui_trace_listbox):
+    def set_ui_listbox(self, ui_trace_listbox, ui_dispatcher=None):
         """! Set the UI listbox to be printing logs into"""
         self.ui_trace_listbox = ui_trace_listbox
+        self.ui_dispatcher = ui_dispatcher
 
     def log(self, trace):
+        if self.ui_trace_listbox is None:
+            return
+        if self.ui_dispatcher is None:
+            self._add_traces([trace])
+            return
+        # The traces of a frame are added to the listbox together
+        with self._lock:
+            self._pending_traces.append(trace)
+        self.ui_dispatcher.call(self._flush_traces, key=self)
+
+    def _flush_traces(self):
+        """! Adds the pending traces, from the dispatcher """
+        with self._lock:
+            traces = self._pending_traces
+            self._pending_traces = []
+        self._add_traces(traces)
+
+    def _add_traces(self, traces):
+        """! Adds traces to the listbox, scrolled to the last one """
         try:
-            if self.ui_trace_listbox is not None:
-                self.ui_trace_listbox.insert(tk.END, " " + trace)
-                self.ui_trace_listbox.yview(tk.END)
+            self.ui_trace_listbox.insert(
+                tk.END, *[" " + trace for trace in traces])
+            self.ui_trace_listbox.yview(tk.END)
         except:
             print("Log listbox incorrect !")
 
 
-def logger_subscribe_ui(ui_trace_listbox):
-    """! Subscribe a ui listbox into the logger singleton """
+def logger_subscribe_ui(ui_trace_listbox, ui_dispatcher=None):
+    """! Subscribe a ui listbox into the logger singleton
+        @param ui_dispatcher : UiDispatcher adding the traces from the
+                               main loop, None to add them from the caller
+    """
     global LOGGER
     # Logger is a singleton
     if LOGGER is None:
         LOGGER = Logger()
-    LOGGER.set_ui_listbox(ui_trace_listbox)
+    LOGGER.set_ui_listbox(ui_trace_listbox, ui_dispatcher)
 
 
 def logger_set_is_stopping():
@@ -70,7 +100,9 @@ def print_trace_in_ui(*args):
     """! Prints a trace both in the UI and in the console"""
     global LOGGER
 
-    function_caller_name = inspect.stack()[1].function
+    # Only the caller frame is needed, inspect.stack() would read
+    # the source of every frame of the stack
+    function_caller_name = inspect.currentframe().f_back.f_code.co_name
     trace = time.strftime('%H:%M:%S') + " " + function_caller_name + "() : "
     for arg in args:
         trace = trace + arg.__str__()
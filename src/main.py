@@ -23,7 +23,7 @@ from tkinter import filedialog
 import os
 import sys
 import argparse
-import vlc
+import json
 
 # Application related imports
 from colors import UI_BACKGROUND_COLOR, \
@@ -31,8 +31,15 @@ from colors import UI_BACKGROUND_COLOR, \
                    UI_BLOCK_SELECTED_VIDEO_FRAME_COLOR
 from metadata_manager import MetaDataManager
 from plugin_manager import PluginManager
-from ui_player import UiPlayer
-from sequencer import UiSequenceManager, MainSequencer
+from player_backend import VlcBackend
+from scheduler import Scheduler
+from ui_dispatcher import UiDispatcher
+from transition_telemetry import TransitionTelemetry
+from data_manager import get_data_manager
+from ui_player import UiPlayer, FADE_DURATION_S
+from volume_automation import CURVES, CURVE_EQUAL_POWER
+from sequencer import UiSequenceManager, MainSequencer, PROGRAM_GUIDE_HOURS
+from simulation import Simulation, DEFAULT_CLIP_DURATION_S
 
 
 class MainManager:
@@ -46,13 +53,24 @@ class MainManager:
     metadata_path = ""
     sequence_button = None
     sequence_path = ""
+    guide_path = None
+    guide_hours = 0
+    fade_duration_s = 0
+    fade_curve = None
 
-    def __init__(self, sequence_file, metadata_file, launch_now):
+    def __init__(self, sequence_file, metadata_file, launch_now,
+                 guide_file=None, guide_hours=PROGRAM_GUIDE_HOURS,
+                 fade_duration_s=FADE_DURATION_S,
+                 fade_curve=CURVE_EQUAL_POWER):
         """! The main manager initializer, handles the welcome screen to
             select a sequence file and metadata
         """
         self.sequence_path = sequence_file
         self.metadata_path = metadata_file
+        self.guide_path = guide_file
+        self.guide_hours = guide_hours
+        self.fade_duration_s = fade_duration_s
+        self.fade_curve = fade_curve
         self.root = tk.Tk()
 
         if launch_now:
@@ -151,8 +169,7 @@ class MainManager:
     def start_ui(self):
         """! Start the sequence and player UI """
         # Directsound allow audio crossfading : each player has an individual sound
-        instance = vlc.Instance(['--aout=directsound', '--quiet', '--no-xlib'])
-        assert instance is not None
+        backend = VlcBackend(['--aout=directsound', '--quiet', '--no-xlib'])
 
         # Clean up window for letting space for playback
         for child in self.root.winfo_children():
@@ -162,23 +179,39 @@ class MainManager:
         if os.path.isfile(self.metadata_path):
             metadata_manager = MetaDataManager(path=self.metadata_path)
 
-        plugin_manager = PluginManager()
+        # All the timers of the application run in the Tk main loop
+        scheduler = Scheduler(backend.get_clock(), tk_root=self.root)
+        # And the UI updates of the other threads too
+        ui_dispatcher = UiDispatcher(scheduler)
+        plugin_manager = PluginManager(clock=backend.get_clock(),
+                                       scheduler=scheduler)
 
         player = UiPlayer(tkroot=self.root,
-                          vlc_instance=instance,
+                          backend=backend,
                           metadata_manager=metadata_manager,
-                          plugin_manager=plugin_manager)
+                          plugin_manager=plugin_manager,
+                          scheduler=scheduler,
+                          ui_dispatcher=ui_dispatcher)
+        player.set_fades(self.fade_duration_s, self.fade_curve)
+        # The transitions are stored with the internal data
+        telemetry = TransitionTelemetry(data_manager=get_data_manager())
         self.sequence_manager = UiSequenceManager(
             tkroot=self.root,
-            vlc_instance=instance,
+            backend=backend,
             ui_player=player,
             path=self.sequence_path,
             metadata_manager=metadata_manager,
-            plugin_manager=plugin_manager)
+            plugin_manager=plugin_manager,
+            program_guide_path=self.guide_path,
+            program_guide_hours=self.guide_hours,
+            scheduler=scheduler,
+            ui_dispatcher=ui_dispatcher,
+            telemetry=telemetry)
         self.sequence_manager.load_sequence()
 
         self.sequencer = MainSequencer(
-            ui_player=player, ui_sequencer=self.sequence_manager)
+            ui_player=player, ui_sequencer=self.sequence_manager,
+            telemetry=telemetry)
         self.sequencer.launch_sequencer()
 
         self.sequence_manager.set_main_sequencer_stop_cb(self.sequencer.kill)
@@ -212,8 +245,64 @@ if __name__ == '__main__':
                         help="Set if you want to launch directly without\
                               going through the main menu",
                         action="store_true")
+    parser.add_argument('-g',
+                        '--guide',
+                        help="Path of the program guide to export after each\
+                              video, XMLTV if it ends with .xml, JSON otherwise",
+                        action="store")
+    parser.add_argument('--guide-hours',
+                        help="Duration of the program guide, in hours",
+                        type=float,
+                        default=PROGRAM_GUIDE_HOURS,
+                        action="store")
+    parser.add_argument('--fade-duration',
+                        help="Duration of the fades in and out, in seconds",
+                        type=float,
+                        default=FADE_DURATION_S,
+                        action="store")
+    parser.add_argument('--fade-curve',
+                        help="Shape of the fades in and out",
+                        choices=CURVES,
+                        default=CURVE_EQUAL_POWER,
+                        action="store")
+    parser.add_argument('--simulate',
+                        help="Simulates the given number of hours of the\
+                              sequence on a virtual clock, without display,\
+                              and prints what aired",
+                        type=float,
+                        metavar="HOURS",
+                        action="store")
+    parser.add_argument('--simulate-clip-duration',
+                        help="Duration in seconds of the clips never probed,\
+                              for the simulation",
+                        type=float,
+                        default=DEFAULT_CLIP_DURATION_S,
+                        action="store")
+    parser.add_argument('--simulate-report',
+                        help="Path of the JSON report of the simulation",
+                        action="store")
     args = parser.parse_args()
 
+    if args.simulate is not None:
+        if args.sequence is None or not os.path.isfile(args.sequence):
+            print("ERROR ", args.sequence, " IS NOT A VALID FILE")
+            sys.exit(1)
+        report = Simulation(
+            sequence_file=args.sequence,
+            metadata_file=args.metadata,
+            default_clip_duration_s=args.simulate_clip_duration
+        ).run(args.simulate * 3600)
+        print(report)
+        if args.simulate_report is not None:
+            with open(args.simulate_report, "w",
+                      encoding="utf-8") as report_file:
+                json.dump(report.to_dict(), report_file, indent=1)
+        sys.exit(0)
+
     MainManager(sequence_file=args.sequence,
                 metadata_file=args.metadata,
-                launch_now=args.launch).main_loop()
+                launch_now=args.launch,
+                guide_file=args.guide,
+                guide_hours=args.guide_hours,
+                fade_duration_s=args.fade_duration,
+                fade_curve=args.fade_curve).main_loop()
@@ -0,0 +1,445 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Media library module
+     Persistent index of the media files and of their probe results,
+     stored in a sqlite db so that random picks never scan the filesystem
+     or call libmagic at air time, and known videos are never parsed again
+"""
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import magic
+
+from cache_directory import get_cache_directory
+from logger import print_trace_in_ui
+
+# Name of the media library db of the application, in the cache directory
+MEDIA_LIBRARY_FILE_NAME = "media_library.dat"
+# Number of files from which they are classified in a pool of processes
+PARALLEL_CLASSIFY_MIN_FILES = 2000
+# Type of the files that could not be read
+UNREADABLE_MEDIA_TYPE = "unreadable"
+
+_MEDIA_LIBRARY = None
+
+
+def get_media_library():
+    # global is necessary for singleton management
+    # pylint: disable=global-statement
+    """! Returns the MediaLibrary instance"""
+    global _MEDIA_LIBRARY
+    if _MEDIA_LIBRARY is None:
+        _MEDIA_LIBRARY = MediaLibrary(get_media_library_path())
+    return _MEDIA_LIBRARY
+
+
+def get_media_library_path():
+    """! Returns the path of the media library db of the application """
+    return get_cache_directory() + "/" + MEDIA_LIBRARY_FILE_NAME
+
+
+def set_media_library(library):
+    # global is necessary for singleton management
+    # pylint: disable=global-statement
+    """! Replaces the MediaLibrary instance, for the simulations
+        @param library : the new MediaLibrary, None to open
+                         the application one on next use
+    """
+    global _MEDIA_LIBRARY
+    _MEDIA_LIBRARY = library
+
+
+def classify_file(path):
+    """! Returns the libmagic type of a file,
+         UNREADABLE_MEDIA_TYPE if it cannot be read
+        @param path : path of the file
+    """
+    try:
+        return magic.from_file(path)
+    except (OSError, magic.MagicException):
+        return UNREADABLE_MEDIA_TYPE
+
+
+def classify_files(paths, nb_workers=None):
+    """! Returns the libmagic types of files, classified in a pool
+         of processes if there are many of them
+        @param paths : list of the paths of the files
+        @param nb_workers : number of processes, one per cpu by default
+        @return the list of the types, in the order of the paths
+    """
+    nb_workers = nb_workers or os.cpu_count() or 1
+    if nb_workers > 1 and len(paths) >= PARALLEL_CLASSIFY_MIN_FILES:
+        print_trace_in_ui("Classifying ", len(paths), " files in ",
+                          nb_workers, " processes")
+        try:
+            # The workers are spawned : forking the threads
+            # of the application is not safe
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=nb_workers,
+                    mp_context=multiprocessing.get_context("spawn")) \
+                    as executor:
+                return list(executor.map(
+                    classify_file, paths,
+                    chunksize=max(1, len(paths) // (nb_workers * 4))))
+        except (OSError, concurrent.futures.BrokenExecutor) as error:
+            print_trace_in_ui("ERR ! The classification processes failed,"
+                              " classifying in this one : ", error)
+    return [classify_file(path) for path in paths]
+
+
+class MediaLibrary:
+    """! Index of the media files used by the sequences
+
+        Each file is stored with its size, modification time,
+        libmagic type, the duration and tracks read by the media prober,
+        and the loudness and silences found by the audio analysis.
+        An entry is valid as long as the size and mtime of the file
+        are unchanged, otherwise the file is classified again
+        and has to be probed again.
+
+        A directory is indexed once, then refreshed incrementally :
+        only the new or modified files are classified.
+        The entries are kept in memory after the first lookup, so the
+        lookups done by the sequencer never touch the disk.
+    """
+    class MediaEntry:
+        """! An entry in the media library """
+        path = ""
+        size = 0
+        mtime = 0
+        media_type = ""
+        # Duration in seconds, 0 if not probed yet
+        duration = 0
+        # List of the tracks, as dictionaries with a type and a codec
+        tracks = []
+        # Result of the audio analysis, as a dictionary,
+        # None if not analyzed yet
+        audio_analysis = None
+
+        def __init__(self, path, size, mtime, media_type,
+                     duration=0, tracks=None, audio_analysis=None):
+            """! Initialize the entry """
+            self.path = path
+            self.size = size
+            self.mtime = mtime
+            self.media_type = media_type
+            self.duration = duration
+            self.tracks = tracks if tracks is not None else []
+            self.audio_analysis = audio_analysis
+
+        def is_media(self):
+            """! Returns True if libmagic recognized a media file """
+            return "Media" in self.media_type
+
+        def is_readable(self):
+            """! Returns False if the file could not be read """
+            return self.media_type != UNREADABLE_MEDIA_TYPE
+
+        def is_valid(self, stat):
+            """! Returns True if the entry still describes the file
+                @param stat : current os.stat_result of the file
+            """
+            return self.size == stat.st_size and self.mtime == stat.st_mtime
+
+    path = ""
+    _db_connection = None
+    # Protects the db connection, used from the UI and sequencer threads
+    _lock = None
+    # Entries looked up in this session : file path -> MediaEntry
+    _entries = {}
+    # Indexed directories : directory path -> list of file paths
+    _directories = {}
+
+    def __init__(self, path):
+        """! Opens (or creates) the media library db
+            @param path : path of the sqlite file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._directories = {}
+        self._db_connection = sqlite3.connect(self.path,
+                                              check_same_thread=False)
+        self._db_connection.execute(
+            "CREATE TABLE IF NOT EXISTS MEDIA_LIBRARY("
+            "PATH TEXT PRIMARY KEY, DIRECTORY TEXT, SIZE INTEGER, "
+            "MTIME REAL, MEDIA_TYPE TEXT, DURATION REAL, TRACKS TEXT, "
+            "AUDIO_ANALYSIS TEXT)")
+        columns = [column[1] for column in self._db_connection.execute(
+            "PRAGMA table_info(MEDIA_LIBRARY)").fetchall()]
+        if "TRACKS" not in columns:
+            # Library created before the tracks were stored
+            self._db_connection.execute(
+                "ALTER TABLE MEDIA_LIBRARY ADD COLUMN TRACKS TEXT")
+        if "AUDIO_ANALYSIS" not in columns:
+            # Library created before the audio was analyzed
+            self._db_connection.execute(
+                "ALTER TABLE MEDIA_LIBRARY ADD COLUMN AUDIO_ANALYSIS TEXT")
+        self._db_connection.execute(
+            "CREATE INDEX IF NOT EXISTS MEDIA_LIBRARY_DIRECTORY "
+            "ON MEDIA_LIBRARY(DIRECTORY)")
+        self._db_connection.execute(
+            "CREATE TABLE IF NOT EXISTS SHUFFLE_BAGS("
+            "DIRECTORY TEXT PRIMARY KEY, PATHS TEXT, NEXT_INDEX INTEGER)")
+        self._db_connection.commit()
+
+    def _entry_from_row(self, row):
+        """! Builds an entry from a db row """
+        tracks = json.loads(row[5]) if row[5] else []
+        audio_analysis = json.loads(row[6]) if row[6] else None
+        return self.MediaEntry(row[0], row[1], row[2], row[3], row[4], tracks,
+                               audio_analysis)
+
+    def _classify(self, path, stat):
+        """! Builds a new entry for a new or modified file """
+        print_trace_in_ui("Indexing " + path)
+        return self.MediaEntry(path, stat.st_size, stat.st_mtime,
+                               classify_file(path))
+
+    def _store_entries(self, entries):
+        """! Writes entries in the db """
+        with self._lock:
+            self._db_connection.executemany(
+                "INSERT OR REPLACE INTO MEDIA_LIBRARY "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(entry.path, os.path.dirname(entry.path), entry.size,
+                  entry.mtime, entry.media_type, entry.duration,
+                  json.dumps(entry.tracks), json.dumps(entry.audio_analysis))
+                 for entry in entries])
+            self._db_connection.commit()
+
+    def _load_directory(self, directory):
+        """! Loads the stored entries of a directory from the db """
+        with self._lock:
+            rows = self._db_connection.execute(
+                "SELECT PATH, SIZE, MTIME, MEDIA_TYPE, DURATION, TRACKS, "
+                "AUDIO_ANALYSIS "
+                "FROM MEDIA_LIBRARY WHERE DIRECTORY = ?",
+                (directory,)).fetchall()
+        return {row[0]: self._entry_from_row(row) for row in rows}
+
+    def refresh_directory(self, directory):
+        """! Indexes a directory, classifying only new or modified files
+            @param directory : path of the directory to index
+            @return the number of files that needed to be classified
+        """
+        return self.refresh_directories([directory])
+
+    def refresh_directories(self, directories):
+        """! Indexes directories, classifying only new or modified files,
+             all of them at once in a pool of processes if there are many
+            @param directories : paths of the directories to index
+            @return the number of files that needed to be classified
+        """
+        # Directory -> (stored entries, entries of the files,
+        # None for the files to classify)
+        scans = {}
+        files_to_classify = []
+        for directory in dict.fromkeys(directories):
+            with self._lock:
+                stored_entries = None
+                if directory in self._directories:
+                    stored_entries = {
+                        path: self._entries[path]
+                        for path in self._directories[directory]}
+            if stored_entries is None:
+                stored_entries = self._load_directory(directory)
+
+            entries = {}
+            with os.scandir(directory) as dir_iterator:
+                for dir_entry in dir_iterator:
+                    if not dir_entry.is_file():
+                        continue
+                    complete_path = directory + "/" + dir_entry.name
+                    stat = dir_entry.stat()
+                    entry = stored_entries.get(complete_path)
+                    if entry is None or not entry.is_valid(stat):
+                        files_to_classify.append((complete_path, stat))
+                        entry = None
+                    entries[complete_path] = entry
+            scans[directory] = (stored_entries, entries)
+
+        media_types = classify_files([path for path, _ in files_to_classify])
+        changed_entries = {
+            path: self.MediaEntry(path, stat.st_size, stat.st_mtime,
+                                  media_type)
+            for (path, stat), media_type in zip(files_to_classify,
+                                                media_types)}
+        self._store_entries(changed_entries.values())
+
+        for directory, (stored_entries, entries) in scans.items():
+            nb_changed = 0
+            for path, entry in entries.items():
+                if entry is None:
+                    entries[path] = changed_entries[path]
+                    nb_changed = nb_changed + 1
+            removed_paths = [(path,) for path in stored_entries
+                             if path not in entries]
+            # The entries and the file list of the directory are swapped
+            # together, get_media_files reads them under the same lock
+            with self._lock:
+                self._db_connection.executemany(
+                    "DELETE FROM MEDIA_LIBRARY WHERE PATH = ?", removed_paths)
+                self._db_connection.commit()
+                self._entries.update(entries)
+                self._directories[directory] = list(entries)
+                for (path,) in removed_paths:
+                    self._entries.pop(path, None)
+            print_trace_in_ui(f"Media library : {directory} indexed, ",
+                              len(entries), " files, ",
+                              nb_changed, " new or modified, ",
+                              len(removed_paths), " removed")
+        return len(changed_entries)
+
+    def get_media_files(self, directory):
+        """! Returns the readable media files of a directory
+            The directory is indexed on first use only
+            @param directory : path of the directory
+            @return a list of MediaEntry
+        """
+        if directory not in self._directories:
+            self.refresh_directory(directory)
+        with self._lock:
+            return [self._entries[path]
+                    for path in self._directories[directory]
+                    if self._entries[path].is_media()]
+
+    def get_entry(self, path):
+        """! Returns the entry of a file already looked up in this session,
+             without checking the file
+            @return the MediaEntry, None if unknown
+        """
+        return self._entries.get(path)
+
+    def lookup(self, path):
+        """! Returns the entry of a file, validated against the file
+             the first time it is looked up in this session
+            @param path : path of the file
+            @return the MediaEntry, None if the file doesnt exist
+        """
+        entry = self._entries.get(path)
+        if entry is not None:
+            return entry
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._db_connection.execute(
+                "SELECT PATH, SIZE, MTIME, MEDIA_TYPE, DURATION, TRACKS, "
+                "AUDIO_ANALYSIS "
+                "FROM MEDIA_LIBRARY WHERE PATH = ?", (path,)).fetchone()
+        if row is not None:
+            entry = self._entry_from_row(row)
+        if entry is None or not entry.is_valid(stat):
+            entry = self._classify(path, stat)
+            self._store_entries([entry])
+        self._entries[path] = entry
+        return entry
+
+    def set_probe_result(self, path, duration, tracks):
+        """! Stores the probe result of a file
+            @param path : path of the file
+            @param duration : duration in seconds
+            @param tracks : list of the tracks of the file
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return
+        entry.duration = duration
+        entry.tracks = tracks
+        with self._lock:
+            self._db_connection.execute(
+                "UPDATE MEDIA_LIBRARY SET DURATION = ?, TRACKS = ? "
+                "WHERE PATH = ?",
+                (duration, json.dumps(tracks), path))
+            self._db_connection.commit()
+
+    def set_audio_analysis(self, path, audio_analysis):
+        """! Stores the audio analysis of a file
+            @param path : path of the file
+            @param audio_analysis : dictionary returned by analyze_file
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return
+        entry.audio_analysis = audio_analysis
+        with self._lock:
+            self._db_connection.execute(
+                "UPDATE MEDIA_LIBRARY SET AUDIO_ANALYSIS = ? WHERE PATH = ?",
+                (json.dumps(audio_analysis), path))
+            self._db_connection.commit()
+
+    def get_shuffle_bag(self, directory):
+        """! Returns the stored shuffle bag of a directory
+            @param directory : path of the directory
+            @return (list of the paths in the bag order, index of the next
+                    video to play), None if no bag is stored
+        """
+        with self._lock:
+            row = self._db_connection.execute(
+                "SELECT PATHS, NEXT_INDEX FROM SHUFFLE_BAGS "
+                "WHERE DIRECTORY = ?", (directory,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def store_shuffle_bag(self, directory, paths, next_index):
+        """! Stores the shuffle bag of a directory
+            @param directory : path of the directory
+            @param paths : list of the paths in the bag order,
+                           None if only the position changed
+            @param next_index : index of the next video to play
+        """
+        with self._lock:
+            if paths is None:
+                # Written on the next commit, at the latest when the
+                # library is closed : a pick doesnt wait for the disk
+                self._db_connection.execute(
+                    "UPDATE SHUFFLE_BAGS SET NEXT_INDEX = ? "
+                    "WHERE DIRECTORY = ?", (next_index, directory))
+            else:
+                self._db_connection.execute(
+                    "INSERT OR REPLACE INTO SHUFFLE_BAGS VALUES (?, ?, ?)",
+                    (directory, json.dumps(paths), next_index))
+                self._db_connection.commit()
+
+    def get_probed_durations(self):
+        """! Returns the durations stored by the media prober
+            @return a dictionary of the file paths and their duration
+                    in seconds, for the probed files only
+        """
+        with self._lock:
+            rows = self._db_connection.execute(
+                "SELECT PATH, DURATION FROM MEDIA_LIBRARY "
+                "WHERE DURATION > 0").fetchall()
+        return dict(rows)
+
+    def close(self):
+        """! Closes the media library db """
+        print_trace_in_ui("Closing the media library")
+        with self._lock:
+            if self._db_connection is not None:
+                self._db_connection.commit()
+                self._db_connection.close()
+                self._db_connection = None
@@ -0,0 +1,209 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Media prober module
+     Reads the duration and tracks of media files with a pool of workers,
+     waiting for the parsing events of the player backend instead of polling
+"""
+import itertools
+import queue
+import threading
+
+from logger import print_trace_in_ui
+
+# Probes needed right now by the sequencer
+PRIORITY_NOW = 0
+# Probes prefetched at startup
+PRIORITY_BACKGROUND = 1
+# Reserved to the stop requests of the workers
+_PRIORITY_STOP = -1
+
+
+class MediaProber:
+    """! Probes the duration and tracks of media files
+
+        Probe requests are queued by priority and handled by a
+        bounded pool of worker threads. Each worker asks the player
+        backend to parse the media, which sleeps until the parsing event
+        is received, or until the probe times out or is cancelled.
+    """
+    class ProbeRequest:
+        """! A probe request, shared between the caller and the worker """
+        path = ""
+        priority = PRIORITY_BACKGROUND
+        # Duration in seconds, None until successfully probed
+        duration = None
+        # Tracks of the media, as dictionaries with a type and a codec
+        tracks = []
+        is_started = False
+        is_cancelled = False
+        media = None
+
+        def __init__(self, path, priority):
+            self.path = path
+            self.priority = priority
+            self.duration = None
+            self.tracks = []
+            self.is_started = False
+            self.is_cancelled = False
+            self.media = None
+            self.done_event = threading.Event()
+
+        def wait(self, timeout=None):
+            """! Waits for the end of the probe
+                @param timeout : maximum time to wait in seconds,
+                                 None to wait until the end
+                @return the duration in seconds, None if the probe failed,
+                        timed out or was cancelled
+            """
+            self.done_event.wait(timeout)
+            return self.duration
+
+    backend = None
+    timeout_s = 0
+    # Called with (path, duration, tracks) for each successful probe
+    on_probed_cb = None
+
+    def __init__(self, backend, nb_workers=4, timeout_s=10,
+                 on_probed_cb=None):
+        """! Starts the probing workers
+            @param backend : the PlayerBackend used to parse the media
+            @param nb_workers : number of media parsed concurrently
+            @param timeout_s : maximum parsing time of a media
+            @param on_probed_cb : called with (path, duration, tracks)
+                                  for each successful probe
+        """
+        self.backend = backend
+        self.timeout_s = timeout_s
+        self.on_probed_cb = on_probed_cb
+        self._queue = queue.PriorityQueue()
+        # Unique counter, keeps the queue FIFO for a same priority
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # Pending requests, by path
+        self._requests = {}
+        self._workers = []
+        for i in range(nb_workers):
+            worker = threading.Thread(name=f"MediaProber Thread {i}",
+                                      target=self._worker_runtime)
+            worker.start()
+            self._workers.append(worker)
+
+    def probe(self, path, priority=PRIORITY_BACKGROUND):
+        """! Queues a probe of a media file
+             A pending probe of the same file is reused, and moved
+             up in the queue if the new priority is higher
+            @param path : path of the media file
+            @param priority : PRIORITY_NOW or PRIORITY_BACKGROUND
+            @return the ProbeRequest
+        """
+        with self._lock:
+            request = self._requests.get(path)
+            if request is None:
+                request = self.ProbeRequest(path, priority)
+                self._requests[path] = request
+            elif request.is_started or request.priority <= priority:
+                return request
+            request.priority = priority
+            self._queue.put((priority, next(self._counter), request))
+        return request
+
+    def probe_now(self, path):
+        """! Probes a media file before any background probe
+            @param path : path of the media file
+            @return the duration in seconds, None if the probe failed
+        """
+        return self.probe(path, PRIORITY_NOW).wait()
+
+    def cancel(self, path):
+        """! Cancels the probe of a media file, queued or running
+            @param path : path of the media file
+        """
+        with self._lock:
+            request = self._requests.pop(path, None)
+            if request is None:
+                return
+            request.is_cancelled = True
+            if not request.is_started:
+                request.done_event.set()
+            # The worker releases the media under the lock
+            if request.media is not None:
+                self.backend.parse_stop(request.media)
+
+    def stop(self):
+        """! Cancels every pending probe and stops the workers """
+        print_trace_in_ui("Stopping the media prober")
+        with self._lock:
+            paths = list(self._requests)
+        for path in paths:
+            self.cancel(path)
+        for _ in self._workers:
+            self._queue.put((_PRIORITY_STOP, next(self._counter), None))
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def _worker_runtime(self):
+        """! Worker thread : handles the probe requests by priority """
+        while True:
+            _, _, request = self._queue.get()
+            if request is None:
+                break
+            with self._lock:
+                # The request may have been queued again with a
+                # higher priority, or cancelled meanwhile
+                if request.is_started or request.is_cancelled:
+                    continue
+                request.is_started = True
+
+            try:
+                self._parse(request)
+                if request.duration is not None \
+                   and self.on_probed_cb is not None:
+                    self.on_probed_cb(request.path, request.duration,
+                                      request.tracks)
+            finally:
+                # The caller must never wait forever, even if
+                # the backend failed on this media
+                with self._lock:
+                    if self._requests.get(request.path) is request:
+                        del self._requests[request.path]
+                request.done_event.set()
+
+    def _parse(self, request):
+        """! Parses a media through the backend,
+             then fills the duration and tracks of the request
+        """
+        print_trace_in_ui(request.path + " : New video, reading attributes ")
+        media = self.backend.media_new(request.path)
+        with self._lock:
+            request.media = media
+            is_cancelled = request.is_cancelled
+
+        duration = None
+        if not is_cancelled:
+            duration, request.tracks = self.backend.parse(media,
+                                                          self.timeout_s)
+        if duration is None and not request.is_cancelled:
+            print_trace_in_ui("ERR ! Could not parse ", request.path)
+
+        with self._lock:
+            request.media = None
+        # We do not need this media anymore
+        self.backend.media_release(media)
+        request.duration = duration
@@ -31,6 +31,9 @@ class MetaDataManager:
          Gives the Player some data about start and end of video playbacks
          and fade in/out options
          Gives also the volume to be set by video in order to have an equalized output
+         An optional eighth column gives the selection weight of the video
+         in the weighted RandomVideo blocks
+         The timestamps are M:SS, or M:SS.mmm to the millisecond
     """
     class MetaDataEntry:
         """! An entry in the metadata list """
@@ -41,6 +44,8 @@ class MetaDataManager:
         fade_out = False
         artist = None
         song = None
+        # Selection weight, None if not given
+        weight = None
 
         def __init__(self,
                      video_name,
@@ -49,7 +54,8 @@ class MetaDataManager:
                      fade_in,
                      fade_out,
                      artist,
-                     song):
+                     song,
+                     weight=None):
             """! Initialize the entry """
             self.video_name = video_name
             self.timestamp_begin = timestamp_begin
@@ -58,8 +64,11 @@ class MetaDataManager:
             self.fade_out = fade_out
             self.artist = artist
             self.song = song
+            self.weight = weight
 
     metadata_list = []
+    # Entries of the metadata list, by video name
+    _metadata_by_name = {}
     path = None
 
     def __init__(self, path=None):
@@ -68,6 +77,7 @@ class MetaDataManager:
             @return An instance of a MetaDataManager
         """
         self.metadata_list = []
+        self._metadata_by_name = {}
         if path is not None:
             self.open(path)
 
@@ -78,25 +88,34 @@ class MetaDataManager:
             csvdata = csv.reader(csvfile, delimiter=',')
             for line in csvdata:
                 # The csv has to be well formed
-                assert len(line) == 7
+                assert len(line) in (7, 8)
 
-                # Format the timestamps in seconds
+                # Format the timestamps in seconds, as M:SS or M:SS.mmm
+                # for the cuts to the millisecond
                 def get_sec(time_str):
                     minute, second = time_str.split(':')
+                    if '.' in second:
+                        return round(int(minute) * 60 + float(second), 3)
                     return int(minute) * 60 + int(second)
 
-                self.metadata_list.append(
-                    self.MetaDataEntry(video_name=line[0],
-                                       timestamp_begin=get_sec(line[1]),
-                                       timestamp_end=get_sec(line[2]),
-                                       fade_in=line[3] == 'y',
-                                       fade_out=line[4] == 'y',
-                                       artist=line[5],
-                                       song=line[6]))
+                entry = self.MetaDataEntry(video_name=line[0],
+                                           timestamp_begin=get_sec(line[1]),
+                                           timestamp_end=get_sec(line[2]),
+                                           fade_in=line[3] == 'y',
+                                           fade_out=line[4] == 'y',
+                                           artist=line[5],
+                                           song=line[6],
+                                           weight=float(line[7])
+                                           if len(line) == 8 and line[7]
+                                           else None)
+                self.metadata_list.append(entry)
+                self._metadata_by_name.setdefault(
+                    entry.video_name, []).append(entry)
 
     def reload(self):
         """! Reloads the metadata info from the file """
         self.metadata_list.clear()
+        self._metadata_by_name.clear()
         self.open(self.path)
 
     def get_metadata(self, video_name):
@@ -104,8 +123,7 @@ class MetaDataManager:
             @param video_name : name of the video (as stored in the metadata csv)
             @return a MetaDataEntry structure
         """
-        filtered_list = list(filter(lambda meta: (
-            meta.video_name == video_name), self.metadata_list))
+        filtered_list = self._metadata_by_name.get(video_name, [])
         if len(filtered_list) == 0:
             print_trace_in_ui(
                 "ERROR ! No metadata entries found for video " + video_name)
@@ -117,3 +135,13 @@ class MetaDataManager:
             return filtered_list[0]
 
         return None  # Not found
+
+    def get_weight(self, video_name):
+        """! Get the selection weight of a video, silently
+            @param video_name : name of the video (as stored in the metadata csv)
+            @return the weight, None if the video has no weight
+        """
+        filtered_list = self._metadata_by_name.get(video_name)
+        if not filtered_list:
+            return None
+        return filtered_list[0].weight
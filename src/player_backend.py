@@ -0,0 +1,470 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Player backend module
+     Media creation, probing and playback, either through libvlc
+     or simulated for the runs without a display nor real media
+"""
+import sys
+import threading
+
+from clock import SystemClock, VirtualClock
+
+try:
+    import vlc
+except (ImportError, OSError):
+    # The simulated backend doesnt need libvlc
+    vlc = None
+
+# Player events
+EVENT_END_REACHED = "end_reached"
+EVENT_POSITION_CHANGED = "position_changed"
+EVENT_ERROR = "error"
+
+# Header of an empty MP4 file, enough for libmagic to classify it as media
+_MP4_HEADER = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+
+
+class PlayerBackend:
+    """! Interface of the media backends
+
+        A backend creates the media and the media players, probes
+        the media, and gives the clock the playback is timed with.
+        The media players follow the subset of the libvlc
+        MediaPlayer API used by the application.
+    """
+
+    def get_clock(self):
+        """! Returns the clock the playback is timed with """
+        raise NotImplementedError
+
+    def media_new(self, path):
+        """! Returns a new media for a file
+            @param path : path of the media file
+        """
+        raise NotImplementedError
+
+    def media_player_new(self):
+        """! Returns a new media player, without media """
+        raise NotImplementedError
+
+    def parse(self, media, timeout_s):
+        """! Reads the duration and tracks of a media, blocking
+            @param media : media returned by media_new
+            @param timeout_s : maximum parsing time
+            @return (duration in seconds, list of the tracks as dictionaries
+                    with a type and a codec), duration being None if
+                    the media could not be parsed
+        """
+        raise NotImplementedError
+
+    def parse_stop(self, media):
+        """! Cancels a running parse, which returns right away
+            @param media : media being parsed
+        """
+        raise NotImplementedError
+
+    def media_release(self, media):
+        """! Releases a media that is not used anymore """
+
+    def release(self):
+        """! Releases the backend """
+
+
+class VlcBackend(PlayerBackend):
+    """! Backend playing the media with libvlc """
+    vlc_instance = None
+    _clock = None
+
+    class VlcMediaPlayer:
+        """! libvlc media player, with the events of the backend """
+        media_player = None
+
+        def __init__(self, media_player):
+            self.media_player = media_player
+
+        def __getattr__(self, name):
+            # Everything else is the libvlc API
+            return getattr(self.media_player, name)
+
+        def set_window(self, window_handle):
+            """! Renders the video in a window
+                @param window_handle : native handle of the window
+            """
+            if sys.platform.startswith('win'):
+                self.media_player.set_hwnd(window_handle)
+            else:
+                self.media_player.set_xwindow(window_handle)
+
+        def event_attach(self, event, callback):
+            """! Calls callback() on a player event
+                @param event : EVENT_END_REACHED, EVENT_POSITION_CHANGED
+                               or EVENT_ERROR
+            """
+            vlc_event = {
+                EVENT_END_REACHED: vlc.EventType.MediaPlayerEndReached,
+                EVENT_POSITION_CHANGED:
+                    vlc.EventType.MediaPlayerPositionChanged,
+                EVENT_ERROR: vlc.EventType.MediaPlayerEncounteredError
+            }[event]
+            self.media_player.event_manager().event_attach(
+                vlc_event, lambda _: callback())
+
+    def __init__(self, vlc_args=None):
+        """! Creates the libvlc instance
+            @param vlc_args : list of the libvlc arguments
+        """
+        self.vlc_instance = vlc.Instance(vlc_args or [])
+        assert self.vlc_instance is not None
+        self._clock = SystemClock()
+
+    def get_clock(self):
+        return self._clock
+
+    def media_new(self, path):
+        return self.vlc_instance.media_new(path)
+
+    def media_player_new(self):
+        return self.VlcMediaPlayer(self.vlc_instance.media_player_new())
+
+    def parse(self, media, timeout_s):
+        parsed_event = threading.Event()
+        event_manager = media.event_manager()
+        event_manager.event_attach(vlc.EventType.MediaParsedChanged,
+                                   lambda _: parsed_event.set())
+        duration = None
+        tracks = []
+        if media.parse_with_options(vlc.MediaParseFlag.network,
+                                    int(timeout_s * 1000)) == 0:
+            # Libvlc sends the event itself on timeout,
+            # a margin is kept in case it never comes
+            if not parsed_event.wait(timeout_s + 1):
+                media.parse_stop()
+            if media.get_parsed_status() == vlc.MediaParsedStatus.done \
+               and media.get_duration() > 0:
+                duration = media.get_duration() / 1000
+                tracks = self._get_tracks(media)
+        event_manager.event_detach(vlc.EventType.MediaParsedChanged)
+        return duration, tracks
+
+    def parse_stop(self, media):
+        # Libvlc sends the parsing event, which ends the parse
+        media.parse_stop()
+
+    def media_release(self, media):
+        media.release()
+
+    def release(self):
+        if self.vlc_instance is not None:
+            self.vlc_instance.release()
+            self.vlc_instance = None
+
+    @staticmethod
+    def _get_tracks(media):
+        """! Returns the tracks of a parsed media
+            @return a list of dictionaries with the type and codec
+                    (fourcc) of each track
+        """
+        tracks = []
+        for track in media.tracks_get() or []:
+            tracks.append({
+                "type": str(track.type).split(".").pop(),
+                "codec": track.codec.to_bytes(4, "little")
+                                    .decode("ascii", "replace")
+                                    .strip()})
+        return tracks
+
+
+class SimulatedBackend(PlayerBackend):
+    """! Backend simulating the playback of media of declared durations
+
+        Nothing is decoded nor displayed : a media player only computes
+        its position from the clock, a virtual one by default, so
+        that hours of playback are simulated in seconds.
+        The media whose duration is not declared cannot be parsed
+        nor played, like a corrupted file, unless a default duration
+        is given.
+    """
+    # Media file path -> duration in seconds
+    durations = {}
+    # Duration of the media not declared, None if they cannot be played
+    default_duration = None
+    _clock = None
+
+    class SimulatedMedia:
+        """! A media of the simulated backend """
+        path = ""
+        # Duration in seconds, None if not declared
+        duration = None
+        # Playback time the media starts at, in seconds
+        start_time_s = 0
+        # Playback time the media stops at, None for its end
+        stop_time_s = None
+        # True if the media starts paused, buffered
+        is_start_paused = False
+
+        def __init__(self, path, duration):
+            self.path = path
+            self.duration = duration
+            self.start_time_s = 0
+            self.stop_time_s = None
+            self.is_start_paused = False
+
+        def get_mrl(self):
+            """! Returns the path of the media """
+            return self.path
+
+        def add_option(self, option):
+            """! Adds a libvlc option to the media, only :start-time,
+                 :stop-time and :start-paused are simulated
+            """
+            if option == ":start-paused":
+                self.is_start_paused = True
+            elif option.startswith(":start-time="):
+                self.start_time_s = float(option.split("=", 1)[1])
+            elif option.startswith(":stop-time="):
+                self.stop_time_s = float(option.split("=", 1)[1])
+
+        def get_end_s(self):
+            """! Returns the playback time the media ends at, in seconds """
+            if self.stop_time_s is None:
+                return self.duration
+            return min(self.stop_time_s, self.duration)
+
+    class SimulatedMediaPlayer:
+        """! Media player computing its position from the clock """
+        media = None
+        # Playback time when the player was last started or paused
+        _time_s = 0
+        # Clock timestamp when the player was last started, None if stopped
+        _start_time_s = None
+        _volume = 100
+        is_paused = False
+        _is_end_reached = False
+        # Event -> callbacks
+        _callbacks = {}
+        # Incremented to cancel the pending end timer
+        _end_timer_generation = 0
+
+        def __init__(self, clock):
+            self._clock = clock
+            self._lock = threading.Lock()
+            self.media = None
+            self._time_s = 0
+            self._start_time_s = None
+            self._volume = 100
+            self.is_paused = False
+            self._is_end_reached = False
+            self._callbacks = {}
+            self._end_timer_generation = 0
+
+        def _get_time_s(self):
+            """! Returns the playback time of the media """
+            if self._start_time_s is None:
+                return self._time_s
+            return self._time_s + self._clock.time() - self._start_time_s
+
+        def _notify(self, event):
+            for callback in self._callbacks.get(event, []):
+                callback()
+
+        def _check_end(self, is_time_up=False):
+            """! Ends the playback if the end of the media is reached,
+                 notified once per playback, with the lock held
+                @param is_time_up : True if the end timer expired
+                @return True if the end has just been reached
+            """
+            if self._start_time_s is None or self._is_end_reached or \
+               (not is_time_up and self._get_time_s() < self.media.get_end_s()):
+                return False
+            self._is_end_reached = True
+            self._time_s = self.media.get_end_s()
+            self._start_time_s = None
+            return True
+
+        def _arm_end_timer(self):
+            """! Notifies the end of the media on time, as libvlc does,
+                 with the lock held
+            """
+            self._end_timer_generation = self._end_timer_generation + 1
+            if self._start_time_s is None:
+                return
+            generation = self._end_timer_generation
+            remaining_s = self.media.get_end_s() - self._get_time_s()
+
+            def end_timer():
+                self._clock.sleep(remaining_s)
+                with self._lock:
+                    is_end_reached = \
+                        generation == self._end_timer_generation and \
+                        self._check_end(is_time_up=True)
+                if is_end_reached:
+                    self._notify(EVENT_END_REACHED)
+
+            threading.Thread(name="SimulatedEnd Thread", target=end_timer,
+                             daemon=True).start()
+
+        def set_media(self, media):
+            """! Sets the media to play, stopping the current one """
+            self.stop()
+            self.media = media
+
+        def set_window(self, window_handle):
+            """! Nothing is displayed """
+
+        def play(self):
+            """! Starts or resumes the playback, a media starting paused
+                 is only opened until the next play
+                @return 0 on success, -1 if the media cannot be played
+            """
+            with self._lock:
+                if self.media is None or self.media.duration is None:
+                    is_error = True
+                else:
+                    is_error = False
+                    if self._start_time_s is None and \
+                       not self._is_end_reached:
+                        is_start_paused = False
+                        if not self.is_paused:
+                            # Not a resume : the options of the media apply
+                            self._time_s = self.media.start_time_s
+                            is_start_paused = self.media.is_start_paused
+                        if not is_start_paused:
+                            self._start_time_s = self._clock.time()
+                            self._arm_end_timer()
+                        self.is_paused = is_start_paused
+            if is_error:
+                self._notify(EVENT_ERROR)
+                return -1
+            return 0
+
+        def pause(self):
+            """! Toggles the pause """
+            with self._lock:
+                if self._start_time_s is not None:
+                    self._time_s = self._get_time_s()
+                    self._start_time_s = None
+                    self.is_paused = True
+                elif self.is_paused:
+                    self._start_time_s = self._clock.time()
+                    self.is_paused = False
+                self._arm_end_timer()
+
+        def stop(self):
+            """! Stops the playback and rewinds the media """
+            with self._lock:
+                self._time_s = 0
+                self._start_time_s = None
+                self.is_paused = False
+                self._is_end_reached = False
+                self._end_timer_generation = self._end_timer_generation + 1
+
+        def get_position(self):
+            """! Returns the playback position, between 0 and 1,
+                 -1 if there is no playable media
+            """
+            with self._lock:
+                if self.media is None or not self.media.duration:
+                    return -1
+                position = min(self._get_time_s() / self.media.duration, 1)
+                is_end_reached = self._check_end()
+            if is_end_reached:
+                self._notify(EVENT_END_REACHED)
+            return position
+
+        def set_position(self, position):
+            """! Seeks to a position between 0 and 1 """
+            with self._lock:
+                if self.media is None or not self.media.duration:
+                    return
+                self._time_s = position * self.media.duration
+                if self._start_time_s is not None:
+                    self._start_time_s = self._clock.time()
+                    self._arm_end_timer()
+            self._notify(EVENT_POSITION_CHANGED)
+
+        def get_time(self):
+            """! Returns the playback time in milliseconds """
+            with self._lock:
+                return int(self._get_time_s() * 1000)
+
+        def audio_get_volume(self):
+            """! Returns the volume, between 0 and 100 """
+            return self._volume
+
+        def audio_set_volume(self, volume):
+            """! Sets the volume, between 0 and 100 """
+            self._volume = volume
+            return 0
+
+        def event_attach(self, event, callback):
+            """! Calls callback() on a player event
+                @param event : EVENT_END_REACHED, EVENT_POSITION_CHANGED
+                               or EVENT_ERROR
+            """
+            self._callbacks.setdefault(event, []).append(callback)
+
+    def __init__(self, durations=None, clock=None, default_duration=None):
+        """! Creates the backend
+            @param durations : dictionary of the media file paths
+                               and their duration in seconds
+            @param clock : clock of the playback, a new VirtualClock
+                           by default
+            @param default_duration : duration in seconds of the media
+                                      not declared, None if they cannot
+                                      be played
+        """
+        self.durations = dict(durations or {})
+        self.default_duration = default_duration
+        self._clock = clock if clock is not None else VirtualClock()
+
+    def get_clock(self):
+        return self._clock
+
+    def declare_media(self, path, duration):
+        """! Declares the duration of a media file
+            @param path : path of the media file
+            @param duration : duration in seconds
+        """
+        self.durations[path] = duration
+
+    @staticmethod
+    def write_media_file(path):
+        """! Writes an empty media file that the media library
+             classifies as a video, for the simulations
+            @param path : path of the file to write
+        """
+        with open(path, "wb") as media_file:
+            media_file.write(_MP4_HEADER)
+
+    def media_new(self, path):
+        return self.SimulatedMedia(
+            path, self.durations.get(path, self.default_duration))
+
+    def media_player_new(self):
+        return self.SimulatedMediaPlayer(self._clock)
+
+    def parse(self, media, timeout_s):
+        if media.duration is None:
+            return None, []
+        return media.duration, [{"type": "video", "codec": "sim"},
+                                {"type": "audio", "codec": "sim"}]
+
+    def parse_stop(self, media):
+        # The parse never blocks
+        pass
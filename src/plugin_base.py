@@ -19,6 +19,8 @@
 """! Base module for plugin implementation """
 from enum import Enum
 
+from clock import SystemClock
+
 
 class PluginType(Enum):
     """! Plugin types
@@ -53,10 +55,18 @@ class PluginBase:
     # Reference to the maintenance frame in the sequencer window,
     # to add UI controls
     maintenance_frame = None
+    # Clock of the timestamps and the waits of the plugin,
+    # set by the plugin manager
+    clock = None
+    # Scheduler of the animations and timed activities of the plugin,
+    # set by the plugin manager
+    scheduler = None
 
     def __init__(self, params=None):
         self.params = params
         self.is_running = True
+        self.clock = SystemClock()
+        self.scheduler = None
 
     # Plugin interface
     def setup(self, **kwargs):
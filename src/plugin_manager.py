@@ -21,15 +21,28 @@ from plugins.song_info_plugin import SongInfoPlugin
 from plugins.messaging_plugin import MessagingPlugin
 from plugins.time_and_channel_plugin import TimeAndChannelPlugin
 from plugin_base import PluginType
+from clock import SystemClock
+from scheduler import Scheduler
 
 
 class PluginManager:
     """! Manages the active plugins """
     active_plugins = []
+    # Clock given to the plugins
+    clock = None
+    # Scheduler given to the plugins
+    scheduler = None
 
-    def __init__(self):
-        """! Creates the plugin manager """
+    def __init__(self, clock=None, scheduler=None):
+        """! Creates the plugin manager
+            @param clock : clock of the plugins, the system clock by default
+            @param scheduler : Scheduler of the plugins, a new one on
+                               the clock by default
+        """
         self.active_plugins = []
+        self.clock = clock if clock is not None else SystemClock()
+        self.scheduler = scheduler if scheduler is not None else \
+            Scheduler(self.clock)
 
     def get_plugins(self):
         """! Returns the active plugins list """
@@ -40,10 +53,15 @@ class PluginManager:
             @param type_of_plugin : enum of the plugin type, as defined in the PluginType definition
             @param params : reference to the parameters of the plugins
         """
+        plugin = None
         if type_of_plugin == PluginType.SONG_INFO_PLUGIN:
             # For now, no params in the song info plugin
-            self.active_plugins.append(SongInfoPlugin(params))
+            plugin = SongInfoPlugin(params)
         elif type_of_plugin == PluginType.MESSAGING_PLUGIN:
-            self.active_plugins.append(MessagingPlugin(params))
+            plugin = MessagingPlugin(params)
         elif type_of_plugin == PluginType.TIME_AND_CHANNEL_PLUGIN:
-            self.active_plugins.append(TimeAndChannelPlugin(params))
+            plugin = TimeAndChannelPlugin(params)
+        if plugin is not None:
+            plugin.clock = self.clock
+            plugin.scheduler = self.scheduler
+            self.active_plugins.append(plugin)
@@ -23,10 +23,10 @@
      messages
 """
 import http.server
+import socket
 import socketserver
 import threading
 import tkinter as tk
-from time import time, sleep
 from datetime import datetime
 from urllib import parse
 from functools import partial
@@ -49,6 +49,10 @@ DELETE_AFTER_MINUTES_PARAM_DEFAULT = "10"
 
 MESSAGE_FILE_PATH_PARAM = "MessageFilePath"
 
+# Period and step of the scrolling of the long messages
+SCROLL_PERIOD_S = 0.04
+SCROLL_STEP_PX = 8
+
 
 class MessagingPlugin(PluginBase):
     """! Plugin to show live messages under the video """
@@ -56,7 +60,8 @@ class MessagingPlugin(PluginBase):
     server_thread = None
 
     message_ui = None
-    message_ui_thread = None
+    # Scheduler timer of the message UI runtime
+    message_ui_task = None
 
     maintenance_listbox = None
     is_server_running = False
@@ -194,6 +199,14 @@ class MessagingPlugin(PluginBase):
         if self.is_server_running:
             print_trace_in_ui("Stopping http server")
             self.is_server_running = False
+            # Unblocks the request waited for
+            try:
+                with socket.create_connection(
+                        ("127.0.0.1", int(self.params[PORT_PARAM])),
+                        timeout=1):
+                    pass
+            except OSError:
+                print_trace_in_ui("ERR : Cannot reach the server")
             self.server_thread.join(timeout=2)
             if self.server_thread.is_alive():
                 print_trace_in_ui("ERR : Thread is still active !")
@@ -208,8 +221,8 @@ class MessagingPlugin(PluginBase):
                 that stops if the is_server_running method is stopped
         """
         print_trace_in_ui("HTTP Server Thread begin")
-        # Set an 1 second timeout for server handling request
-        self.http_server.timeout = 1
+        # Waits for the requests, stop_server sends one to stop
+        self.http_server.timeout = None
         while self.is_server_running:
             print_trace_in_ui("HTTP Server Thread Handling request")
             self.http_server.handle_request()
@@ -221,16 +234,18 @@ class MessagingPlugin(PluginBase):
             print_trace_in_ui("Link player window to us")
             super().setup(player_window=kwargs["player_window"])
 
-            self.message_ui = self.MessagingUiThread(
-                self.player_window, self.params)
-            self.message_ui_thread = threading.Thread(
-                name="MessageUI Thread", target=self.message_ui.runtime)
-            self.message_ui_thread.start()
+            self.message_ui = self.MessagingUi(
+                self.player_window, self.params, self.clock, self.scheduler)
+            self.message_ui_task = \
+                self.scheduler.start_task(self.message_ui.runtime())
 
+            # The messages are added in the scheduler, with the UI
             self.http_server = socketserver.TCPServer(
                 ("", int(self.params[PORT_PARAM])),
                 partial(self.MyHttpRequestHandler,
-                        self.message_ui.add_message))
+                        partial(self.scheduler.call_soon,
+                                self.message_ui.add_message),
+                        self.clock))
 
         if self.maintenance_frame is None and "maintenance_frame" in kwargs:
             print_trace_in_ui("Link maintenance window to us")
@@ -365,12 +380,13 @@ class MessagingPlugin(PluginBase):
         self.is_running = False
         if self.message_ui is not None:
             self.message_ui.stop()
+        if self.message_ui_task is not None:
+            self.message_ui_task.cancel()
         self.stop_server()
-        self.message_ui_thread.join()
         # FIXME Workaround to stop the tcp server
         # self.http_server._BaseServer__shutdown_request = True
         # self.http_server = None
-        get_data_manager().kill()
+        # The data manager is shared, it is killed with the sequence manager
 
     def is_maintenance_frame(self):
         """! Returns True if the plugin needs a maintenance frame,
@@ -389,9 +405,11 @@ class MessagingPlugin(PluginBase):
     class MyHttpRequestHandler(http.server.SimpleHTTPRequestHandler):
         """! Http request handler to add messages """
         cb_add_message = None
+        clock = None
 
-        def __init__(self, cb_add_message, *args, **kwargs):
+        def __init__(self, cb_add_message, clock, *args, **kwargs):
             self.cb_add_message = cb_add_message
+            self.clock = clock
             self.path = None
             super().__init__(*args, **kwargs)
 
@@ -426,7 +444,7 @@ class MessagingPlugin(PluginBase):
                     self.cb_add_message(
                         MessagingPlugin.Message(
                             fields["name"][0],
-                            message, time()))
+                            message, self.clock.time()))
                 else:
                     print_trace_in_ui(
                         "Message too long.. Not keeping this one")
@@ -436,12 +454,13 @@ class MessagingPlugin(PluginBase):
                 self.path = 'src/static/ko.html'
             return http.server.SimpleHTTPRequestHandler.do_GET(self)
 
-    class MessagingUiThread:
-        """! Thread class that handles the displaying of messages """
+    class MessagingUi:
+        """! Handles the displaying of messages, from scheduler tasks """
         message_list = []
         is_shown = False
         player_window = None
-        scroll_thread = None
+        # Scheduler timer of the scroll of a long message
+        scroll_task = None
         frame_messages = None
         maintenance_listbox = None
         active_label_author = ""
@@ -450,14 +469,20 @@ class MessagingPlugin(PluginBase):
 
         is_running = False
         params = {}
+        # Clock of the message expiry
+        clock = None
+        # Scheduler of the display times and of the scroll
+        scheduler = None
 
-        def __init__(self, tk_root, params):
+        def __init__(self, tk_root, params, clock, scheduler):
             """! Init """
             self.player_window = tk_root
             self.params = params
+            self.clock = clock
+            self.scheduler = scheduler
             self.is_shown = False
             self.maintenance_listbox = None
-            self.scroll_thread = None
+            self.scroll_task = None
             self.is_running = True
             self.frame_messages = tk.Frame(self.player_window,
                                            bg=UI_BACKGROUND_COLOR)
@@ -484,8 +509,10 @@ class MessagingPlugin(PluginBase):
             self.active_label_author .pack(side=tk.LEFT, anchor=tk.CENTER)
             self.active_label_message.pack(side=tk.LEFT, anchor=tk.CENTER)
 
-        def runtime_display_message(self):
-            """! Displays the current message in the player UI"""
+        def _display_message_task(self):
+            """! Displays the current message in the player UI,
+                 as a step of the runtime task
+            """
             print_trace_in_ui(
                 "Index of current message = ",
                 self.index_sequence_message,
@@ -494,6 +521,10 @@ class MessagingPlugin(PluginBase):
                 " Message ",
                 self.message_list[self.index_sequence_message].message)
 
+            # The scroll of the previous message stops here
+            if self.scroll_task is not None:
+                self.scroll_task.cancel()
+                self.scroll_task = None
             self.message_list[self.index_sequence_message].set_current_message()
             font_size = int(self.player_window.winfo_height() / 20)
             print_trace_in_ui("FontSize ", font_size)
@@ -502,9 +533,9 @@ class MessagingPlugin(PluginBase):
                 font=('calibri', font_size, 'bold'))
             self.active_label_message.configure(
                 text=self.message_list[self.index_sequence_message].message,
-                font=('calibri', font_size))
+                font=('calibri', font_size), padx=10)
             # Let time to recalculate the message size
-            sleep(0.1)
+            yield 0.1
             print_trace_in_ui("Message size ",
                               self.active_label_message.winfo_width())
             print_trace_in_ui(
@@ -517,80 +548,72 @@ class MessagingPlugin(PluginBase):
                self.active_label_author.winfo_width():
                 print_trace_in_ui(
                     "Message is too long, we need to make it scroll")
-                # A long message needs to be let a longer time FIXME
-                time_to_wait = int(self.
-                                   params[DISPLAY_TIME_LONG_MESSAGE_PARAM])
-
-                def _scroll_thread():
-                    self.active_label_message.configure(anchor=tk.W)
-                    current_index_message = self.index_sequence_message
-                    message = \
-                        self.message_list[self.index_sequence_message].message
-                    # First 2 seconds are fixed
-                    sleep(2)
-                    while self.is_running and \
-                            current_index_message == \
-                            self.index_sequence_message \
-                            and self.message_list[current_index_message]. \
+                self.scroll_task = self.scheduler.start_task(
+                    self._scroll_task(font_size))
+
+        def _scroll_task(self, font_size):
+            """! Scrolls a message too long for the player UI """
+            self.active_label_message.configure(anchor=tk.W)
+            current_index_message = self.index_sequence_message
+            message = \
+                self.message_list[self.index_sequence_message].message
+            # First 2 seconds are fixed
+            yield 2
+            while self.is_running and \
+                    current_index_message == \
+                    self.index_sequence_message \
+                    and self.message_list[current_index_message]. \
+                    is_active():
+                wait = False
+                # removing first char until it fits
+                if self.active_label_message.winfo_width() >= \
+                   self.player_window.winfo_width() - \
+                   self.active_label_author.winfo_width():
+
+                    chunk_message = tk.Label(self.frame_messages,
+                                             text=message[0:5],
+                                             font=('calibri',
+                                                   font_size))
+                    chunk_message.place(relx=-1, rely=-1)
+                    yield 0.05
+                    width = chunk_message.winfo_width()
+                    print_trace_in_ui(
+                        f"Size of chunk {message[0:5]} : {width}")
+                    message = message[6:]
+                    self.active_label_message.configure(text=message)
+
+                    while width > 0 and self.is_running:
+                        # Thats a big hack to approximately
+                        # get the size right..
+                        # the padx width is not exactly the true
+                        self.active_label_message.configure(
+                            padx=10 + 1.07*width)
+                        width = width - SCROLL_STEP_PX
+                        yield SCROLL_PERIOD_S
+                    chunk_message.destroy()
+                else:
+                    # Then when it fits, wait a bit
+                    wait = True
+
+                if wait:
+                    yield 2
+                    if self.message_list[current_index_message]. \
                             is_active():
-                        wait = False
-                        # removing first char until it fits
-                        if self.active_label_message.winfo_width() >= \
-                           self.player_window.winfo_width() - \
-                           self.active_label_author.winfo_width():
-
-                            chunk_message = tk.Label(self.frame_messages,
-                                                     text=message[0:5],
-                                                     font=('calibri',
-                                                           font_size))
-                            chunk_message.place(relx=-1, rely=-1)
-                            sleep(0.05)
-                            width = chunk_message.winfo_width()
-                            print_trace_in_ui(
-                                f"Size of chunk {message[0:5]} : {width}")
-                            message = message[6:]
-                            self.active_label_message.configure(text=message)
-
-                            while width > 0 and self.is_running:
-                                # Thats a big hack to approximately
-                                # get the size right..
-                                # the padx width is not exactly the true
-                                self.active_label_message.configure(
-                                    padx=10 + 1.07*width)
-                                width = width - 2
-                                sleep(0.01)
-                            chunk_message.destroy()
-                        else:
-                            # Then when it fits, wait a bit
-                            wait = True
-
-                        if wait:
-                            sleep(2)
-                            if self.message_list[current_index_message]. \
-                                    is_active():
-                                message = \
-                                    self.message_list[current_index_message]. \
-                                    message
-                                self.active_label_message. \
-                                    configure(text=message)
-                                sleep(2)
-                            else:
-                                print_trace_in_ui(
-                                    "Current message is not active anymore ! ")
-                        else:
-                            sleep(0.08)
-                        self.active_label_message.configure(text=message)
-                if self.scroll_thread is not None:
-                    self.scroll_thread.join()
-                    self.scroll_thread = None
-
-                self.scroll_thread = \
-                    threading.Thread(name="MessageUI Scroll Thread",
-                                     target=_scroll_thread)
-                self.scroll_thread.start()
+                        message = \
+                            self.message_list[current_index_message]. \
+                            message
+                        self.active_label_message. \
+                            configure(text=message)
+                        yield 2
+                    else:
+                        print_trace_in_ui(
+                            "Current message is not active anymore ! ")
+                else:
+                    yield 0.08
+                self.active_label_message.configure(text=message)
 
         def runtime(self):
-            """! Runtime """
+            """! Runtime task of the scheduler """
             print_trace_in_ui("Messaging UI Runtime")
             while self.is_running:
                 self._compute_messages()
@@ -630,15 +653,11 @@ class MessagingPlugin(PluginBase):
                         self.hide()
                     else:
                         self.index_sequence_message = index_sequence_message
-                        self.runtime_display_message()
+                        yield from self._display_message_task()
                 else:
                     # If there is no message to show
                     self.hide()
-                sleep(time_to_wait)
-            #self.frame_messages.destroy()
-            if self.scroll_thread is not None:
-                self.scroll_thread.join()
-                self.scroll_thread = None
+                yield time_to_wait
 
         def load_message(self, message):
             """! Loading a message from the database,
@@ -670,7 +689,8 @@ class MessagingPlugin(PluginBase):
                               activate_toggle_cb=message.activate_toggle_cb)
             # if the timestamp is correct, set active
             if message.timestamp_activation + \
-               int(self.params[DELETE_AFTER_MINUTES_PARAM])*60 > time():
+               int(self.params[DELETE_AFTER_MINUTES_PARAM])*60 > \
+               self.clock.time():
                 message.set_active()
 
                 # Recompute show (we now have messages)
@@ -735,6 +755,9 @@ class MessagingPlugin(PluginBase):
         def stop(self):
             """! Stops the module"""
             self.is_running = False
+            if self.scroll_task is not None:
+                self.scroll_task.cancel()
+                self.scroll_task = None
 
         def _compute_messages(self):
             # If its been more than 10 minutes, the message disappears from
@@ -743,7 +766,8 @@ class MessagingPlugin(PluginBase):
             # Change state of messages
             for message in self.message_list:
                 if message.timestamp_activation + \
-                   int(self.params[DELETE_AFTER_MINUTES_PARAM])*60 < time() \
+                   int(self.params[DELETE_AFTER_MINUTES_PARAM])*60 < \
+                   self.clock.time() \
                    and not message.manual_activation and message.is_active():
                     print_trace_in_ui(
                         f"Message going inactive ! {message.message}")
@@ -18,13 +18,17 @@
 #
 
 import tkinter as tk
-from time import sleep, time
-from threading import Thread
 
 from colors import UI_BACKGROUND_COLOR
 from logger import print_trace_in_ui
 from plugin_base import PluginBase
 
+# Period and step of the sliding animation of the pane
+ANIMATION_PERIOD_S = 0.04
+ANIMATION_STEP_PX = 20
+# Time the pane stays shown, in seconds
+SHOW_DURATION_S = 10
+
 
 class SongInfoPlugin(PluginBase):
     """! Plugin to show the song info as it plays """
@@ -38,7 +42,8 @@ class SongInfoPlugin(PluginBase):
     is_showing_info = False
     timestamp_show_info = 0
 
-    thread_ui_info = None
+    # Scheduler timer of the showing task
+    task_ui_info = None
     show_button = None
     toggle_automatic_button = None
     maintenance_song_info_frame = None
@@ -98,12 +103,9 @@ class SongInfoPlugin(PluginBase):
             # Provides a button to show the song info manually
             def button_show_song_info():
                 if self.frame_songinfo is not None:
-                    if not self._is_show_song_info_thread_active():
-                        # Recreate thread
-                        self.thread_ui_info = \
-                            Thread(name="Manual UI song info Thread",
-                                   target=self._show_song_info_thread)
-                        self.thread_ui_info.start()
+                    if not self._is_showing_song_info():
+                        self.task_ui_info = self.scheduler.start_task(
+                            self._show_song_info_task(self.frame_songinfo))
                     else:
                         print_trace_in_ui("It is already showing !")
                 else:
@@ -145,24 +147,19 @@ class SongInfoPlugin(PluginBase):
         if self.frame_songinfo is not None:
             if self.is_automatic_show_song_info:
                 # And it stays only for 10 seconds
-                if time_s == 10 and \
-                   not self._is_show_song_info_thread_active():
+                if time_s == 10 and not self._is_showing_song_info():
                     print_trace_in_ui("Showing song info")
-                    # Recreate thread
-                    self.thread_ui_info = \
-                        Thread(name="Automatic UI song info Thread",
-                               target=self._show_song_info_thread)
-                    self.thread_ui_info.start()
+                    self.task_ui_info = self.scheduler.start_task(
+                        self._show_song_info_task(self.frame_songinfo))
 
     def on_exit(self):
         """! Called at the end of a video playback """
         # If we didnt have time to delete the frame info,
-        #  we do it now to prevent future weird behaviours
+        #  we do it now to prevent future weird behaviours.
+        # A running show goes on with it until hidden
         if self.frame_songinfo is not None:
-            print_trace_in_ui("Warning ! Deleting song info lately")
-            if self.thread_ui_info is not None \
-               and self.thread_ui_info.is_alive():
-                self.thread_ui_info.join()
+            if self._is_showing_song_info():
+                print_trace_in_ui("Warning ! Deleting song info lately")
             self.frame_songinfo = None
 
     def is_maintenance_frame(self):
@@ -176,38 +173,30 @@ class SongInfoPlugin(PluginBase):
 
     def on_destroy(self):
         super().on_destroy()
-        if self.thread_ui_info is not None:
-            self.thread_ui_info.join()
+        if self.task_ui_info is not None:
+            self.task_ui_info.cancel()
 
-    def _is_show_song_info_thread_active(self):
+    def _is_showing_song_info(self):
         return self.is_showing_info or self.is_hiding_info
 
 # Private functions
-    def _show_song_info_thread(self):
-        """! Thread to handle the display of the song info pane
-             Single thread that shows and hide !
+    def _show_song_info_task(self, frame_songinfo):
+        """! Scheduler task showing then hiding the song info pane
+            @param frame_songinfo : the pane, kept until hidden
         """
         self.show_button.configure(state=tk.DISABLED)
         self.is_showing_info = True
-        self.timestamp_show_info = time()
-        for x_pos in range(-500, 50, 5):
-            if not self.is_running:
-                break
-            self.frame_songinfo.place(x=x_pos, rely=0.8)
-            sleep(0.01)
+        self.timestamp_show_info = self.clock.time()
+        for x_pos in range(-500, 50, ANIMATION_STEP_PX):
+            frame_songinfo.place(x=x_pos, rely=0.8)
+            yield ANIMATION_PERIOD_S
         self.is_hiding_info = True
-        # Wait for 10 seconds if running
-        for _ in range(10):
-            if not self.is_running:
-                break
-            sleep(1)
+        yield SHOW_DURATION_S
         self.is_showing_info = False
-        for x_pos in range(50, -1000, -5):
-            if not self.is_running:
-                break
-            self.frame_songinfo.place(x=x_pos, rely=0.8)
-            sleep(0.01)
-        self.frame_songinfo.pack_forget()
+        for x_pos in range(50, -1000, -ANIMATION_STEP_PX):
+            frame_songinfo.place(x=x_pos, rely=0.8)
+            yield ANIMATION_PERIOD_S
+        frame_songinfo.pack_forget()
         self.is_hiding_info = False
         self.timestamp_show_info = 0
         self.show_button.configure(state=tk.NORMAL)
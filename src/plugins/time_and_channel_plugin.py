@@ -17,7 +17,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 import tkinter as tk
-from time import strftime
+from time import strftime, localtime
 from PIL import Image, ImageTk
 
 
@@ -79,7 +79,7 @@ class TimeAndChannelPlugin(PluginBase):
                 self.font_size = new_font_size
                 self.label_time.configure(font=('calibri', self.font_size, 'bold'))
 
-            self.label_time.configure(text=strftime('%H:%M'))
+            self.label_time.configure(text=strftime('%H:%M', localtime(self.clock.time())))
             self.frame_time.place(relx=0.10, rely=0.06)
             self.label_channel.place(relx=0.85, rely=0.06)
 
@@ -0,0 +1,306 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Program guide module
+     Plan of the upcoming videos for the next hours,
+     exported as JSON or XMLTV for the "up next" boards
+"""
+import json
+import os
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from logger import print_trace_in_ui
+
+# Stops the planning of a sequence whose blocks have no length
+MAX_PROGRAM_ENTRIES = 10000
+# Real time gathering the updates of the guide into a single export,
+# in seconds
+EXPORT_DELAY_S = 1
+
+
+class ProgramGuide:
+    """! Upcoming programs of the sequence
+
+        The guide starts with the resolved blocks, whose videos and
+        start times are known, and goes on with the next blocks of the
+        sequence model, wrapping around the sequence as needed, with
+        estimated videos and lengths.
+
+        The estimated programs are kept between updates : an update
+        drops the ones that got resolved, shifts the others after the
+        resolved ones, and only estimates the new blocks needed
+        to reach the end of the guide.
+    """
+    class ProgramEntry:
+        """! A program of the guide """
+        # Absolute position of the block in the sequence
+        position = 0
+        # Position of the block in its sequence iteration
+        index = 0
+        title = ""
+        artist = None
+        song = None
+        start_s = 0
+        length_s = 0
+        # False if the video and length are only estimated
+        is_resolved = False
+
+        def __init__(self, position, index, title, artist, song,
+                     length_s, start_s=0, is_resolved=False):
+            """! Initialize the entry """
+            self.position = position
+            self.index = index
+            self.title = title
+            self.artist = artist
+            self.song = song
+            self.length_s = length_s
+            self.start_s = start_s
+            self.is_resolved = is_resolved
+
+        def get_end(self):
+            """! Returns the end time of the program """
+            return self.start_s + self.length_s
+
+        def to_dict(self):
+            """! Returns the entry as a JSON serializable dictionary """
+            return {"position": self.position,
+                    "index": self.index,
+                    "title": self.title,
+                    "artist": self.artist,
+                    "song": self.song,
+                    "start": datetime.fromtimestamp(self.start_s).isoformat(),
+                    "stop": datetime.fromtimestamp(self.get_end()).isoformat(),
+                    "start_timestamp": self.start_s,
+                    "length": self.length_s,
+                    "is_estimated": not self.is_resolved}
+
+    channel_name = ""
+    hours = 0
+    # Flattened sequence, to plan the blocks after the resolved ones
+    _sequence_model = None
+    # Returns an unresolved ProgramEntry for a (position, index, block)
+    _estimate_cb = None
+    # Programs of the guide, from the playing one
+    _entries = []
+    # Estimated programs after the resolved ones, including the ones
+    # planned after the end of the guide
+    _estimated_entries = []
+
+    def __init__(self, channel_name, sequence_model, estimate_cb, hours):
+        """! Initialize the guide
+            @param channel_name : name of the channel in the exports
+            @param sequence_model : LazySequence of the sequence
+            @param estimate_cb : called with the position, index and block
+                                 of an unresolved block, returns its
+                                 estimated ProgramEntry
+            @param hours : duration of the guide
+        """
+        self.channel_name = channel_name
+        self.hours = hours
+        self._sequence_model = sequence_model
+        self._estimate_cb = estimate_cb
+        self._entries = []
+        self._estimated_entries = []
+        # The guide is exported from another thread
+        self._lock = threading.Lock()
+
+    def get_entries(self):
+        """! Returns the programs of the guide, from the playing one """
+        with self._lock:
+            return list(self._entries)
+
+    def get_signature(self):
+        """! Returns what the exports show of the programs, to know
+             if the guide changed since an export
+        """
+        with self._lock:
+            return tuple((entry.position, entry.title, entry.start_s,
+                          entry.length_s, entry.is_resolved)
+                         for entry in self._entries)
+
+    def update(self, resolved_entries):
+        """! Updates the guide after the resolved blocks changed
+            @param resolved_entries : ProgramEntry of the resolved blocks,
+                                      from the playing one, with their
+                                      start times
+        """
+        if not resolved_entries:
+            return
+        with self._lock:
+            self._update(resolved_entries)
+
+    def _update(self, resolved_entries):
+        """! Updates the guide, with the lock held """
+        time_end_s = resolved_entries[0].start_s + self.hours * 3600
+        next_position = resolved_entries[-1].position + 1
+        time_s = resolved_entries[-1].get_end()
+
+        # Keep the estimates of the blocks that are still not resolved,
+        # as long as they follow the resolved ones
+        estimated_entries = [entry for entry in self._estimated_entries
+                             if entry.position >= next_position]
+        if estimated_entries and \
+           estimated_entries[0].position != next_position:
+            estimated_entries = []
+        for entry in estimated_entries:
+            entry.start_s = time_s
+            time_s = entry.get_end()
+
+        # Estimate the new blocks needed to fill the guide
+        if estimated_entries:
+            next_position = estimated_entries[-1].position + 1
+        if time_s < time_end_s:
+            for position, index, block in \
+                    self._sequence_model.iter_from(next_position):
+                if len(resolved_entries) + len(estimated_entries) \
+                        >= MAX_PROGRAM_ENTRIES:
+                    break
+                entry = self._estimate_cb(position, index, block)
+                entry.start_s = time_s
+                estimated_entries.append(entry)
+                time_s = entry.get_end()
+                if time_s >= time_end_s:
+                    break
+
+        self._estimated_entries = estimated_entries
+        self._entries = list(resolved_entries) + \
+            [entry for entry in estimated_entries
+             if entry.start_s < time_end_s]
+
+    def export(self, path):
+        """! Writes the guide atomically, so that readers
+             never see a partial file
+            @param path : path of the guide, exported as XMLTV
+                          if it ends with .xml, as JSON otherwise
+        """
+        with self._lock:
+            if path.endswith(".xml"):
+                content = self._to_xmltv()
+            else:
+                content = json.dumps(
+                    {"channel": self.channel_name,
+                     "generated": datetime.now().isoformat(),
+                     "programmes": [entry.to_dict()
+                                    for entry in self._entries]},
+                    indent=2)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False,
+                                         encoding="utf-8",
+                                         suffix=".tmp") as guide_file:
+            guide_file.write(content)
+            guide_file.flush()
+            os.fsync(guide_file.fileno())
+        os.replace(guide_file.name, path)
+
+    def _to_xmltv(self):
+        """! Returns the guide in the XMLTV format """
+        def xmltv_time(time_s):
+            return datetime.fromtimestamp(time_s, timezone.utc) \
+                .strftime("%Y%m%d%H%M%S +0000")
+
+        tv_node = ET.Element("tv", {"generator-info-name": "VLCSequencer"})
+        channel_node = ET.SubElement(tv_node, "channel", {"id": "vlcsequencer"})
+        ET.SubElement(channel_node, "display-name").text = self.channel_name
+        for entry in self._entries:
+            programme_node = ET.SubElement(tv_node, "programme", {
+                "start": xmltv_time(entry.start_s),
+                "stop": xmltv_time(entry.get_end()),
+                "channel": "vlcsequencer"})
+            if entry.song is not None:
+                ET.SubElement(programme_node, "title").text = entry.song
+                ET.SubElement(programme_node, "sub-title").text = entry.title
+            else:
+                ET.SubElement(programme_node, "title").text = entry.title
+            if entry.artist is not None:
+                credits_node = ET.SubElement(programme_node, "credits")
+                ET.SubElement(credits_node, "presenter").text = entry.artist
+        return ET.tostring(tv_node, encoding="unicode")
+
+
+class GuideExporter:
+    """! Exports a program guide in the background
+
+        The sequencer only asks for an export when the schedule changes :
+        the thread waits EXPORT_DELAY_S for the next changes to gather,
+        then writes the guide if its programs changed since the last
+        export. The writes and their fsync stay out of the transitions.
+    """
+    program_guide = None
+    path = None
+    delay_s = EXPORT_DELAY_S
+    # Programs of the last export, None before the first one
+    _signature = None
+    _thread = None
+    _is_running = False
+
+    def __init__(self, program_guide, path, delay_s=EXPORT_DELAY_S):
+        """! Starts the export thread
+            @param program_guide : ProgramGuide to export
+            @param path : path of the guide, exported as XMLTV
+                          if it ends with .xml, as JSON otherwise
+            @param delay_s : real time gathering the updates
+        """
+        self.program_guide = program_guide
+        self.path = path
+        self.delay_s = delay_s
+        self._signature = None
+        self._is_running = True
+        self._request_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(name="Program Guide Thread",
+                                        target=self._export_thread,
+                                        daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """! Asks for an export, from any thread """
+        self._request_event.set()
+
+    def stop(self):
+        """! Writes the export asked, and stops the thread """
+        self._is_running = False
+        self._stop_event.set()
+        self._request_event.set()
+        self._thread.join()
+
+    def _export_thread(self):
+        """! Exports the guide once the updates are gathered """
+        while True:
+            self._request_event.wait()
+            # Stopping cuts the wait short, the last export is written
+            self._stop_event.wait(self.delay_s)
+            self._request_event.clear()
+            self._export()
+            if not self._is_running:
+                return
+
+    def _export(self):
+        """! Writes the guide if its programs changed """
+        signature = self.program_guide.get_signature()
+        if signature == self._signature:
+            return
+        try:
+            self.program_guide.export(self.path)
+            self._signature = signature
+        except OSError as error:
+            print_trace_in_ui("ERR ! The program guide cannot be written : ",
+                              error)
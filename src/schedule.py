@@ -0,0 +1,266 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Schedule module
+     Start times of the resolved blocks, kept as prefix sums
+     of their playing lengths
+"""
+import threading
+import time
+
+
+class Schedule:
+    """! Playing lengths of consecutive blocks, and their start times
+
+        The lengths are stored once, in a Fenwick tree, and the start
+        time of a block is the anchor time plus the sum of the lengths
+        before it. Changing a length or re-anchoring the schedule
+        is O(log n), and the start times of every following block
+        follow without being touched. Finding the block airing at a
+        given time is a binary search down the tree.
+
+        Blocks are appended at the end and dropped from the front,
+        like the sequence window they describe : the slot indexes
+        are the indexes in the window.
+        The lengths must not be negative.
+
+        A pause extends the paused slot by a single offset, the time
+        elapsed since the pause, applied when the times are read.
+        Nothing is updated while paused, the offset is added to the
+        length of the slot once on resume.
+
+        The schedule is changed by the sequencer thread and by the pause
+        button of the main loop : every method holds its lock, and
+        get_starts reads all the start times at once.
+    """
+    # Start time of the first slot, in seconds
+    _anchor_time_s = 0
+    # Playing length of each slot, including the dropped ones
+    _lengths = []
+    # 1-based Fenwick tree over _lengths
+    _tree = []
+    # Number of dropped slots at the beginning of _lengths
+    _first = 0
+    # Slot extended by the running pause, None if not paused
+    _paused_index = None
+    # Time the running pause began
+    _pause_begin_s = 0
+    # Returns the current time in seconds
+    _clock = None
+    _lock = None
+
+    def __init__(self, anchor_time_s=0, clock=time.time):
+        """! Creates an empty schedule
+            @param anchor_time_s : start time of the first slot
+            @param clock : returns the current time, used for the pauses
+        """
+        self._anchor_time_s = anchor_time_s
+        self._lengths = []
+        self._tree = [0]
+        self._first = 0
+        self._paused_index = None
+        self._pause_begin_s = 0
+        self._clock = clock
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._lengths) - self._first
+
+    def _prefix(self, count):
+        """! Returns the sum of the first count lengths of _lengths """
+        total = 0
+        while count > 0:
+            total = total + self._tree[count]
+            count = count - (count & -count)
+        return total
+
+    def _offset(self, index):
+        """! Returns the time between the first slot and the slot index """
+        return self._prefix(self._first + index) - self._prefix(self._first)
+
+    def _add(self, position, delta_s):
+        """! Adds delta_s to the length at a position of _lengths """
+        self._lengths[position] = self._lengths[position] + delta_s
+        position = position + 1
+        while position < len(self._tree):
+            self._tree[position] = self._tree[position] + delta_s
+            position = position + (position & -position)
+
+    def _check_index(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("Schedule index out of range")
+
+    def append(self, length_s):
+        """! Adds a slot at the end of the schedule
+            @param length_s : playing length of the slot in seconds
+        """
+        with self._lock:
+            self._lengths.append(length_s)
+            count = len(self._lengths)
+            # The new node covers the lengths from count - lowbit(count) + 1
+            self._tree.append(length_s + self._prefix(count - 1)
+                              - self._prefix(count - (count & -count)))
+
+    def pop_front(self, nb_slots):
+        """! Drops the first slots, the next one becomes the first
+            @param nb_slots : number of slots to drop
+        """
+        with self._lock:
+            if nb_slots <= 0:
+                return
+            self._check_index(nb_slots - 1)
+            if self._paused_index is not None:
+                # The paused slot is the playing one, it is never dropped
+                self._paused_index = self._paused_index - nb_slots
+            self._anchor_time_s = self._anchor_time_s + self._offset(nb_slots)
+            self._first = self._first + nb_slots
+            # Rebuild the tree once half of it is made of dropped slots,
+            # so that the tree stays the size of the schedule
+            if self._first > len(self._lengths) // 2:
+                lengths = self._lengths[self._first:]
+                self._lengths = []
+                self._tree = [0]
+                self._first = 0
+                for length_s in lengths:
+                    self.append(length_s)
+
+    def get_length(self, index):
+        """! Returns the playing length of a slot, including the running pause """
+        with self._lock:
+            self._check_index(index)
+            if index == self._paused_index:
+                return self._lengths[self._first + index] + \
+                    self.get_pause_offset()
+            return self._lengths[self._first + index]
+
+    def set_length(self, index, length_s):
+        """! Changes the playing length of a slot,
+             which moves the start time of every following slot
+        """
+        with self._lock:
+            self._check_index(index)
+            self._add(self._first + index,
+                      length_s - self._lengths[self._first + index])
+
+    def add_length(self, index, delta_s):
+        """! Extends the playing length of a slot,
+             which moves the start time of every following slot
+        """
+        with self._lock:
+            self._check_index(index)
+            self._add(self._first + index, delta_s)
+
+    def get_start(self, index):
+        """! Returns the start time of a slot, in seconds """
+        with self._lock:
+            self._check_index(index)
+            if self._paused_index is not None and index > self._paused_index:
+                return self._anchor_time_s + self._offset(index) + \
+                    self.get_pause_offset()
+            return self._anchor_time_s + self._offset(index)
+
+    def get_starts(self):
+        """! Returns the start times of every slot, in seconds """
+        with self._lock:
+            start_s = self._anchor_time_s
+            starts = []
+            for index, length_s in enumerate(self._lengths[self._first:]):
+                starts.append(start_s)
+                start_s = start_s + length_s
+                if index == self._paused_index:
+                    start_s = start_s + self.get_pause_offset()
+            return starts
+
+    def get_end(self, index):
+        """! Returns the end time of a slot, in seconds """
+        with self._lock:
+            return self.get_start(index) + self.get_length(index)
+
+    def set_start(self, index, time_s):
+        """! Moves the whole schedule so that a slot starts at time_s """
+        with self._lock:
+            self._check_index(index)
+            self._anchor_time_s = time_s - self._offset(index)
+
+    def pause(self, index):
+        """! Starts extending a slot until the schedule is resumed
+            @param index : index of the paused slot
+        """
+        with self._lock:
+            self._check_index(index)
+            if self._paused_index is None:
+                self._paused_index = index
+                self._pause_begin_s = self._clock()
+
+    def resume(self):
+        """! Adds the time spent in pause to the length of the paused slot """
+        with self._lock:
+            if self._paused_index is None:
+                return
+            pause_offset_s = self.get_pause_offset()
+            paused_index = self._paused_index
+            self._paused_index = None
+            self.add_length(paused_index, pause_offset_s)
+
+    def is_paused(self):
+        """! Returns True between a pause and a resume """
+        with self._lock:
+            return self._paused_index is not None
+
+    def get_pause_offset(self):
+        """! Returns the time spent in the running pause, in seconds """
+        with self._lock:
+            if self._paused_index is None:
+                return 0
+            return self._clock() - self._pause_begin_s
+
+    def find(self, time_s):
+        """! Returns the slot airing at a given time
+            @param time_s : timestamp in seconds
+            @return the index of the slot, None if the time is
+                    before or after the schedule
+        """
+        with self._lock:
+            if self._paused_index is not None and \
+               time_s >= self.get_start(self._paused_index):
+                # The slots after the paused one are pushed back by the pause
+                if time_s < self.get_end(self._paused_index):
+                    return self._paused_index
+                time_s = time_s - self.get_pause_offset()
+            return self._find_unpaused(time_s)
+
+    def _find_unpaused(self, time_s):
+        """! Returns the slot airing at a given time, without the pause """
+        remaining = time_s - self._anchor_time_s + self._prefix(self._first)
+        if time_s < self._anchor_time_s or not self:
+            return None
+        # Binary search down the tree for the number of lengths
+        # whose sum is lower or equal to the remaining time
+        position = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step > 0:
+            if position + step < len(self._tree) and \
+               self._tree[position + step] <= remaining:
+                position = position + step
+                remaining = remaining - self._tree[position]
+            step = step >> 1
+        index = position - self._first
+        if index >= len(self):
+            return None
+        return index
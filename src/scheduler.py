@@ -0,0 +1,308 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Scheduler module
+     Single timer running the timed activities of the application :
+     clocks, animations, fades and periodic refreshes
+"""
+import heapq
+import itertools
+import threading
+
+from logger import print_trace_in_ui
+
+# Timers due that close to a wake-up run with it, in seconds
+COALESCE_S = 0.005
+# Period of the wake-up rate and lateness report, in seconds
+STATS_PERIOD_S = 60
+# Longest wait of the Tk main loop, picking up the timers added by
+# the other threads, in seconds
+TK_POLL_PERIOD_S = 0.05
+
+
+class Scheduler:
+    """! Runs the timers of the application from a single wake-up
+
+        With a tkinter root, the timers run in the Tk main loop, from a
+        single pending 'after' armed for the earliest one : they can
+        touch the UI. Tk is only used from the main loop : the timers
+        added by the other threads are picked up at its next wake-up,
+        which is at most TK_POLL_PERIOD_S away. Without a tkinter root,
+        for the runs without a display, they run in one thread sleeping
+        on the clock until the earliest one.
+
+        A timer runs a callback once or periodically, or resumes a task :
+        a generator yielding the delay in seconds before its next step.
+        The timers can be added and cancelled from any thread.
+
+        The number of wake-ups per second and the worst lateness of the
+        timers are traced at most every minute, and given by get_stats.
+    """
+    class Timer:
+        """! A callback or a task planned on the scheduler """
+        # Clock timestamp of the next run
+        time_s = 0
+        # Period of a periodic timer, None if it runs once
+        period_s = None
+        callback = None
+        args = ()
+        # Generator of a task, None for a callback
+        task = None
+        is_cancelled = False
+
+        def __init__(self, callback, args, period_s=None, task=None):
+            self.callback = callback
+            self.args = args
+            self.period_s = period_s
+            self.task = task
+            self.time_s = 0
+            self.is_cancelled = False
+
+        def cancel(self):
+            """! Stops the timer, a running task is not resumed anymore """
+            self.is_cancelled = True
+
+    clock = None
+    tk_root = None
+    # Heap of (time, counter, timer)
+    _timers = []
+    # Clock timestamp of the pending wake-up, None if none
+    _time_wake_up_s = None
+    _after_id = None
+    _thread = None
+    _is_running = False
+    # Statistics since the start, and since the last report
+    _nb_wake_ups = 0
+    _max_lateness_s = 0
+    _time_start_s = 0
+    _nb_period_wake_ups = 0
+    _max_period_lateness_s = 0
+    _time_period_start_s = 0
+
+    def __init__(self, clock, tk_root=None):
+        """! Creates the scheduler
+            @param clock : clock the timers are timed with
+            @param tk_root : tkinter root running the timers,
+                             None to run them in a thread
+        """
+        self.clock = clock
+        self.tk_root = tk_root
+        self._timers = []
+        self._time_wake_up_s = None
+        self._after_id = None
+        self._thread = None
+        self._is_running = True
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._wake_up_event = clock.new_event()
+        self._nb_wake_ups = 0
+        self._max_lateness_s = 0
+        self._time_start_s = clock.time()
+        self._nb_period_wake_ups = 0
+        self._max_period_lateness_s = 0
+        self._time_period_start_s = self._time_start_s
+        if tk_root is not None:
+            # The chain of 'after' of the main loop, created from it
+            self._arm(self._time_start_s)
+
+    def call_later(self, delay_s, callback, *args):
+        """! Runs callback(*args) once after delay_s seconds
+            @return the Timer, to cancel it
+        """
+        timer = self.Timer(callback, args)
+        self._add(timer, self.clock.time() + delay_s)
+        return timer
+
+    def call_soon(self, callback, *args):
+        """! Runs callback(*args) as soon as possible, after the
+             callbacks already asked
+            @return the Timer, to cancel it
+        """
+        return self.call_later(0, callback, *args)
+
+    def call_every(self, period_s, callback, *args, delay_s=None):
+        """! Runs callback(*args) every period_s seconds, skipping the
+             periods missed instead of catching up
+            @param delay_s : delay before the first run, a period by default
+            @return the Timer, to cancel it
+        """
+        timer = self.Timer(callback, args, period_s=period_s)
+        self._add(timer, self.clock.time() +
+                  (period_s if delay_s is None else delay_s))
+        return timer
+
+    def start_task(self, task, delay_s=0):
+        """! Runs a task, resumed after each delay it yields
+            @param task : generator yielding delays in seconds
+            @param delay_s : delay before its first step
+            @return the Timer, to cancel it
+        """
+        timer = self.Timer(None, (), task=task)
+        self._add(timer, self.clock.time() + delay_s)
+        return timer
+
+    def stop(self):
+        """! Stops running the timers """
+        self._is_running = False
+        self._wake_up_event.set()
+        if self._thread is not None and \
+           self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        # From another thread, the pending 'after' ends the chain itself
+        if self._after_id is not None and \
+           threading.current_thread() is threading.main_thread():
+            self.tk_root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def get_stats(self):
+        """! Returns the wake-ups statistics since the start
+            @return a dictionary with the number of wake-ups, the wake-up
+                    rate per second, the worst lateness of a timer in
+                    seconds and the number of planned timers
+        """
+        with self._lock:
+            duration_s = self.clock.time() - self._time_start_s
+            return {"wake_ups": self._nb_wake_ups,
+                    "wake_up_rate": self._nb_wake_ups / duration_s
+                                    if duration_s > 0 else 0,
+                    "max_lateness_s": self._max_lateness_s,
+                    "timers": len(self._timers)}
+
+    def _trace_stats(self, time_now_s):
+        """! Traces the wake-ups since the last report, once a period """
+        with self._lock:
+            duration_s = time_now_s - self._time_period_start_s
+            if duration_s < STATS_PERIOD_S:
+                return
+            rate = self._nb_period_wake_ups / duration_s
+            max_lateness_s = self._max_period_lateness_s
+            self._nb_period_wake_ups = 0
+            self._max_period_lateness_s = 0
+            self._time_period_start_s = time_now_s
+        print_trace_in_ui("Scheduler : ", "{:.2f}".format(rate),
+                          " wake-ups/s, worst lateness ",
+                          "{:.1f}".format(max_lateness_s * 1000), " ms")
+
+    def _add(self, timer, time_s):
+        """! Plans a timer, waking the scheduler up earlier if needed """
+        with self._lock:
+            timer.time_s = time_s
+            heapq.heappush(self._timers, (time_s, next(self._counter), timer))
+            is_earlier = self._time_wake_up_s is None or \
+                time_s < self._time_wake_up_s
+            if is_earlier:
+                self._time_wake_up_s = time_s
+        if is_earlier and self._is_running:
+            self._arm(time_s)
+
+    def _arm(self, time_s):
+        """! Wakes the scheduler up at time_s """
+        if self.tk_root is None:
+            if self._thread is None:
+                self._thread = threading.Thread(name="Scheduler Thread",
+                                                target=self._scheduler_thread,
+                                                daemon=True)
+                self._thread.start()
+            else:
+                self._wake_up_event.set()
+            return
+        # Tk is not thread safe : the main loop picks the timer up
+        # at its next poll
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if self._after_id is not None:
+            self.tk_root.after_cancel(self._after_id)
+        delay_s = min(time_s - self.clock.time(), TK_POLL_PERIOD_S)
+        self._after_id = self.tk_root.after(max(int(delay_s * 1000), 0),
+                                            self._on_tk_wake_up)
+
+    def _on_tk_wake_up(self):
+        """! Pending 'after' of the Tk main loop """
+        self._after_id = None
+        if not self._is_running:
+            return
+        time_next_s = self._run_due_timers()
+        if self._is_running:
+            self._arm(self.clock.time() + TK_POLL_PERIOD_S
+                      if time_next_s is None else time_next_s)
+
+    def _scheduler_thread(self):
+        """! Runs the timers without a tkinter root """
+        while self._is_running:
+            self._wake_up_event.clear()
+            time_next_s = self._run_due_timers()
+            timeout_s = None
+            if time_next_s is not None:
+                timeout_s = max(time_next_s - self.clock.time(), 0)
+            self.clock.wait_event(self._wake_up_event, timeout_s)
+
+    def _run_due_timers(self):
+        """! Runs the timers due, and plans the next wake-up
+            @return clock timestamp of the next timer, None if none
+        """
+        time_now_s = self.clock.time()
+        with self._lock:
+            self._nb_wake_ups = self._nb_wake_ups + 1
+            self._nb_period_wake_ups = self._nb_period_wake_ups + 1
+        while self._is_running:
+            with self._lock:
+                if not self._timers or \
+                   self._timers[0][0] > time_now_s + COALESCE_S:
+                    break
+                (time_s, _, timer) = heapq.heappop(self._timers)
+                lateness_s = max(time_now_s - time_s, 0)
+                self._max_lateness_s = max(self._max_lateness_s, lateness_s)
+                self._max_period_lateness_s = \
+                    max(self._max_period_lateness_s, lateness_s)
+            if not timer.is_cancelled:
+                self._run(timer, time_now_s)
+        self._trace_stats(time_now_s)
+        with self._lock:
+            # The timers cancelled are dropped when they come up
+            while self._timers and self._timers[0][2].is_cancelled:
+                heapq.heappop(self._timers)
+            self._time_wake_up_s = self._timers[0][0] \
+                if self._timers else None
+            return self._time_wake_up_s
+
+    def _run(self, timer, time_now_s):
+        """! Runs a timer due, and plans its next run if any """
+        time_next_s = None
+        try:
+            if timer.task is not None:
+                time_next_s = time_now_s + next(timer.task)
+            else:
+                timer.callback(*timer.args)
+                if timer.period_s is not None:
+                    time_next_s = timer.time_s + timer.period_s
+                    if time_next_s <= time_now_s:
+                        # Late by more than a period
+                        time_next_s = time_now_s + timer.period_s
+        except StopIteration:
+            return
+        # A broken timer must not stop the others
+        except Exception as error: # pylint: disable=broad-except
+            print_trace_in_ui("ERR ! Scheduled ", timer.callback or timer.task,
+                              " failed : ", repr(error))
+            return
+        if time_next_s is not None and not timer.is_cancelled:
+            with self._lock:
+                timer.time_s = time_next_s
+                heapq.heappush(self._timers,
+                               (time_next_s, next(self._counter), timer))
@@ -0,0 +1,258 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Sequence compiler
+     Compiles the sequence file and the metadata file into a plan,
+     cached on disk so that a restart doesnt parse them again
+"""
+import hashlib
+import json
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+from cache_directory import get_cache_directory
+from logger import print_trace_in_ui
+from metadata_manager import MetaDataManager
+from video_pools import RANDOM_VIDEO_MODES, RANDOM_VIDEO_MODE_UNIFORM
+
+# Directory of the cached plans, in the cache directory
+PLAN_CACHE_DIRECTORY_NAME = "sequence_plans"
+# Changes the cache key of every plan when the plan format changes
+PLAN_VERSION = 2
+
+
+class SequencePlan:
+    """! Compiled sequence
+
+        Holds everything the sequencer needs from the input files :
+        the title, the plugins and their parameters, the block tree as
+        compact descriptors, the flattened length, the resolved random
+        video directories, and the effective length of the fixed videos
+        whose metadata gives an end timestamp.
+
+        A block descriptor is a list :
+        ["video", path, is_on_repeat],
+        ["randomvideo", path, timeout, selection mode]
+        or ["repeat", nb_times, [child descriptors]].
+        The repeat blocks are kept as is, the sequence model
+        expands them on demand.
+    """
+    title = ""
+    # List of (plugin name, parameters dictionary)
+    plugins = []
+    # Descriptors of the blocks of the sequence
+    sequence = []
+    # Number of blocks of a sequence iteration, repeats expanded
+    flat_length = 0
+    # Random video directories : path in the sequence -> full path
+    directories = {}
+    # Effective lengths of the fixed videos : path in the sequence -> seconds
+    lengths = {}
+
+    def __init__(self, title, plugins, sequence, flat_length,
+                 directories, lengths):
+        """! Initialize the plan """
+        self.title = title
+        self.plugins = plugins
+        self.sequence = sequence
+        self.flat_length = flat_length
+        self.directories = directories
+        self.lengths = lengths
+
+    def to_dict(self):
+        """! Returns the plan as a JSON serializable dictionary """
+        return {"version": PLAN_VERSION,
+                "title": self.title,
+                "plugins": self.plugins,
+                "sequence": self.sequence,
+                "flat_length": self.flat_length,
+                "directories": self.directories,
+                "lengths": self.lengths}
+
+    @classmethod
+    def from_dict(cls, plan_dict):
+        """! Builds a plan from a dictionary returned by to_dict """
+        return cls(plan_dict["title"],
+                   [tuple(plugin) for plugin in plan_dict["plugins"]],
+                   plan_dict["sequence"],
+                   plan_dict["flat_length"],
+                   plan_dict["directories"],
+                   plan_dict["lengths"])
+
+
+def _compile_blocks(sequence_xml_node):
+    """! Compiles the children of a xml node into block descriptors
+        @return (list of descriptors, flattened length)
+    """
+    descriptors = []
+    flat_length = 0
+    for child in sequence_xml_node:
+        if child.tag == "Repeat":
+            nb_times = int(child.attrib['nb_time'])
+            children, children_length = _compile_blocks(child)
+            descriptors.append(["repeat", nb_times, children])
+            flat_length = flat_length + nb_times * children_length
+        if child.tag == "Video":
+            descriptors.append(["video", child.attrib['path'],
+                                child.attrib.get('repeat') == "1"])
+            flat_length = flat_length + 1
+        if child.tag == "RandomVideo":
+            mode = child.attrib.get('mode', RANDOM_VIDEO_MODE_UNIFORM)
+            assert mode in RANDOM_VIDEO_MODES
+            descriptors.append(["randomvideo", child.attrib['path'],
+                                child.attrib['reselect_timeout'], mode])
+            flat_length = flat_length + 1
+    return descriptors, flat_length
+
+
+def _iter_leaves(descriptors):
+    """! Yields the video and random video descriptors of a tree """
+    for descriptor in descriptors:
+        if descriptor[0] == "repeat":
+            yield from _iter_leaves(descriptor[2])
+        else:
+            yield descriptor
+
+
+def compile_sequence(xml_path, metadata_path=None):
+    """! Compiles a sequence file and its metadata file into a plan
+        @param xml_path : path of the sequence file
+        @param metadata_path : path of the metadata csv, None if there is none
+        @return a SequencePlan
+    """
+    print_trace_in_ui("Compiling the sequence ", xml_path)
+    xml_root = ET.parse(xml_path).getroot()
+    assert xml_root.tag == 'Document'
+    path_dirname = os.path.dirname(xml_path)
+
+    title = ""
+    plugins = []
+    sequence = []
+    flat_length = 0
+    for child in xml_root:
+        if child.tag == "Title":
+            title = child.text
+        elif child.tag == "Plugin":
+            # Childs of a plugins are its parameter
+            params = {}
+            for param in child:
+                assert ("name" in param.attrib and "value" in param.attrib)
+                params[param.attrib["name"]] = param.attrib["value"]
+            plugins.append((child.attrib['name'], params))
+        elif child.tag == "Sequence":
+            sequence, flat_length = _compile_blocks(child)
+
+    metadata_manager = MetaDataManager(metadata_path)
+    directories = {}
+    lengths = {}
+    for descriptor in _iter_leaves(sequence):
+        if descriptor[0] == "randomvideo":
+            directories[descriptor[1]] = path_dirname + "/" + descriptor[1]
+        elif metadata_path is not None:
+            metadata = metadata_manager.get_metadata(
+                descriptor[1].split("/").pop())
+            if metadata is not None and metadata.timestamp_end != 0:
+                lengths[descriptor[1]] = \
+                    metadata.timestamp_end - metadata.timestamp_begin
+    return SequencePlan(title, plugins, sequence, flat_length,
+                        directories, lengths)
+
+
+def get_plan_key(xml_path, metadata_path=None):
+    """! Returns the cache key of a plan : the hash of the contents
+         of its input files, and of the directory of the sequence
+         from which the video directories are resolved
+    """
+    plan_hash = hashlib.sha256(f"VLCSequencer plan {PLAN_VERSION}\n".encode())
+    plan_hash.update(os.path.dirname(xml_path).encode() + b"\n")
+    for path in (xml_path, metadata_path):
+        if path is not None:
+            with open(path, "rb") as input_file:
+                content = input_file.read()
+            plan_hash.update(len(content).to_bytes(8, "little"))
+            plan_hash.update(content)
+    return plan_hash.hexdigest()
+
+
+def get_plan_file_name(xml_path, metadata_path=None):
+    """! Returns the file name of the cached plan of a sequence : the plan
+         version, the hash of the path of the sequence file and the cache
+         key, so that the stale plans of the sequence can be found
+    """
+    sequence_hash = hashlib.sha256(
+        os.path.abspath(xml_path).encode()).hexdigest()[:16]
+    return f"v{PLAN_VERSION}-{sequence_hash}-" + \
+        get_plan_key(xml_path, metadata_path) + ".json"
+
+
+def _prune_plans(cache_directory, plan_file_name):
+    """! Removes the cached plans that cannot be loaded anymore : the ones
+         of another plan version, and the ones of the same sequence file
+         with other input files
+        @param plan_file_name : file name of the plan of the sequence
+    """
+    version_prefix = plan_file_name.split("-")[0] + "-"
+    sequence_prefix = plan_file_name.rsplit("-", 1)[0] + "-"
+    try:
+        for file_name in os.listdir(cache_directory):
+            if file_name.endswith(".json") and \
+               file_name != plan_file_name and \
+               (not file_name.startswith(version_prefix) or
+                    file_name.startswith(sequence_prefix)):
+                os.remove(cache_directory + "/" + file_name)
+    except OSError as error:
+        print_trace_in_ui("ERR ! Could not prune the sequence plans : ",
+                          error)
+
+
+def load_sequence_plan(xml_path, metadata_path=None, cache_directory=None):
+    """! Returns the plan of a sequence, from the cache if the input
+         files didnt change, compiled and cached otherwise
+        @param xml_path : path of the sequence file
+        @param metadata_path : path of the metadata csv, None if there is none
+        @param cache_directory : directory of the cached plans, in the cache
+                                 directory of the application by default
+        @return a SequencePlan
+    """
+    if cache_directory is None:
+        cache_directory = get_cache_directory() + "/" + \
+            PLAN_CACHE_DIRECTORY_NAME
+    plan_file_name = get_plan_file_name(xml_path, metadata_path)
+    plan_path = cache_directory + "/" + plan_file_name
+    try:
+        with open(plan_path, encoding="utf-8") as plan_file:
+            plan = SequencePlan.from_dict(json.load(plan_file))
+        print_trace_in_ui("Sequence plan loaded from ", plan_path)
+        return plan
+    except (OSError, ValueError, KeyError):
+        pass
+
+    plan = compile_sequence(xml_path, metadata_path)
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=cache_directory,
+                                         delete=False, encoding="utf-8",
+                                         suffix=".tmp") as plan_file:
+            json.dump(plan.to_dict(), plan_file)
+        os.replace(plan_file.name, plan_path)
+    except OSError as error:
+        print_trace_in_ui("ERR ! Could not cache the sequence plan : ", error)
+        return plan
+    _prune_plans(cache_directory, plan_file_name)
+    return plan
@@ -0,0 +1,122 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Sequence model
+     Flattened view of the sequence block tree, where the repeat blocks
+     are expanded on demand instead of being copied
+"""
+
+# Block types that are actually played
+LEAF_BLOCK_TYPES = ("video", "randomvideo")
+
+
+class LazySequence:
+    """! Flattened view of a sequence block tree
+
+        The flattened sequence is never materialized : its length is
+        computed once from the tree, and the blocks at a given position
+        are found by walking down the tree, skipping whole repeat loops.
+        The blocks returned are the leaves of the tree, shared by every
+        repetition : they must be copied before being modified.
+    """
+    _root = None
+    _length = 0
+    # Flattened length of each block of the tree, by block id
+    _flat_lengths = {}
+
+    def __init__(self, sequence_block):
+        """! Builds the flattened view
+            @param sequence_block : the root "sequence" block of the tree
+        """
+        self._root = sequence_block
+        self._flat_lengths = {}
+        self._length = self._compute_flat_length(sequence_block)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._length:
+            raise IndexError("Sequence index out of range")
+        return next(self._iter_block(self._root, index))
+
+    def _get_nb_times(self, block):
+        """! Returns the number of times the children of a block are played """
+        if block.block_type == "repeat":
+            return int(block.block_args)
+        return 1
+
+    def _compute_flat_length(self, block):
+        """! Computes the flattened length of a block and its children """
+        if block.block_type in LEAF_BLOCK_TYPES:
+            length = 1
+        else:
+            length = self._get_nb_times(block) * \
+                sum(self._compute_flat_length(child)
+                    for child in block.inner_sequence)
+        self._flat_lengths[id(block)] = length
+        return length
+
+    def _iter_block(self, block, start):
+        """! Yields the leaves of a block, from a flattened offset
+            @param block : the block to expand
+            @param start : offset of the first leaf to yield in the block
+        """
+        if block.block_type in LEAF_BLOCK_TYPES:
+            if start == 0:
+                yield block
+            return
+
+        inner_length = self._flat_lengths[id(block)] // \
+            max(self._get_nb_times(block), 1)
+        if inner_length == 0:
+            return
+        first_iteration, offset = divmod(start, inner_length)
+        for _ in range(first_iteration, self._get_nb_times(block)):
+            for child in block.inner_sequence:
+                child_length = self._flat_lengths[id(child)]
+                if offset >= child_length:
+                    # Skip the whole child
+                    offset = offset - child_length
+                    continue
+                yield from self._iter_block(child, offset)
+                offset = 0
+
+    def iter_from(self, position):
+        """! Yields the blocks of the sequence endlessly, looping at the end
+            @param position : absolute position of the first block,
+                              counted from the first iteration
+            @return a generator of (position, index, block) tuples, index
+                    being the position of the block in its iteration
+        """
+        while self._length > 0:
+            start = position % self._length
+            for index, block in enumerate(
+                    self._iter_block(self._root, start), start):
+                yield (position, index, block)
+                position = position + 1
+
+    def iter_leaves(self):
+        """! Yields each leaf block of the tree once, without repetitions """
+        blocks = [self._root]
+        while blocks:
+            block = blocks.pop(0)
+            if block.block_type in LEAF_BLOCK_TYPES:
+                yield block
+            else:
+                blocks.extend(block.inner_sequence)
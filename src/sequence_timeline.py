@@ -0,0 +1,237 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Sequence timeline
+     View of the sequence blocks, drawn on a single canvas
+"""
+import tkinter as tk
+from datetime import datetime
+
+from colors import UI_BACKGROUND_COLOR
+
+# Size of a block on the timeline, in pixels
+BLOCK_WIDTH = 200
+BLOCK_HEIGHT = 250
+# Space around each block
+BLOCK_PADDING_X = 10
+BLOCK_PADDING_Y = 20
+# Horizontal space taken by a block and its padding
+SLOT_WIDTH = BLOCK_WIDTH + 2 * BLOCK_PADDING_X
+# Height of the playing time and of the buttons of a block
+HEADER_HEIGHT = 30
+BUTTON_HEIGHT = 40
+
+
+class SequenceTimeline:
+    """! Horizontal timeline of the resolved sequence blocks
+
+        Instead of a tree of widgets per block, the blocks are drawn
+        as canvas items, and only the blocks in the visible part of
+        the canvas are drawn. Each drawn block remembers the state it
+        was drawn with, so a refresh only redraws the blocks whose
+        state changed, and the blocks that scrolled into view.
+
+        A block is placed on the timeline by its absolute position,
+        so the drawn blocks never move when the played ones are evicted.
+
+        The timeline is only used from the tkinter main loop.
+    """
+    _canvas = None
+    _scrollbar = None
+    # Blocks displayed on the timeline, ordered by position
+    _blocks = []
+    # Drawn blocks : position -> state the block was drawn with
+    _drawn_states = {}
+    # Start times of the blocks, in seconds
+    _start_times = []
+    # Called with the block when its "Change Video" button is clicked
+    _on_change_video_cb = None
+
+    def __init__(self, tk_frame, on_change_video_cb):
+        """! Creates the timeline canvas
+            @param tk_frame : the tkinter frame in which add the timeline
+            @param on_change_video_cb : called with the block
+                                        to change the video of
+        """
+        self._blocks = []
+        self._drawn_states = {}
+        self._start_times = []
+        self._on_change_video_cb = on_change_video_cb
+
+        self._view = tk.Frame(tk_frame, background=UI_BACKGROUND_COLOR)
+        self._canvas = tk.Canvas(
+            self._view,
+            width=1000,
+            height=BLOCK_HEIGHT + 2 * BLOCK_PADDING_Y,
+            background=UI_BACKGROUND_COLOR,
+            highlightthickness=0)
+        self._scrollbar = tk.Scrollbar(self._view,
+                                       orient=tk.HORIZONTAL,
+                                       command=self._canvas.xview)
+        self._canvas.configure(xscrollcommand=self._on_scroll)
+        self._canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self._scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self._canvas.bind("<Configure>", lambda _: self.refresh())
+        self._canvas.bind("<Button-1>", self._on_click)
+
+    def get_view(self):
+        """! Returns the inner view object """
+        return self._view
+
+    def set_blocks(self, blocks, start_times):
+        """! Sets the blocks displayed on the timeline
+            @param blocks : list of the resolved blocks, ordered by position
+            @param start_times : start time of each block, in seconds
+        """
+        self._blocks = list(blocks)
+        self._start_times = list(start_times)
+        if self._blocks:
+            self._canvas.configure(scrollregion=(
+                self._blocks[0].position * SLOT_WIDTH, 0,
+                (self._blocks[-1].position + 1) * SLOT_WIDTH,
+                BLOCK_HEIGHT + 2 * BLOCK_PADDING_Y))
+        self.refresh()
+
+    def see(self, block):
+        """! Scrolls the timeline so that the block is the first visible
+            @param block : a block of the timeline
+        """
+        if not self._blocks:
+            return
+        first_position = self._blocks[0].position
+        nb_slots = self._blocks[-1].position + 1 - first_position
+        self._canvas.xview_moveto(
+            (block.position - first_position) / nb_slots)
+        self.refresh()
+
+    def refresh(self):
+        """! Redraws the visible blocks whose state changed,
+             and removes the blocks that are not visible anymore
+        """
+        if not self._blocks:
+            return
+        first_position = self._blocks[0].position
+        x_min = self._canvas.canvasx(0)
+        x_max = self._canvas.canvasx(self._canvas.winfo_width())
+        visible_blocks = {}
+        for position in range(int(x_min // SLOT_WIDTH),
+                              int(x_max // SLOT_WIDTH) + 1):
+            index = position - first_position
+            if 0 <= index < len(self._blocks):
+                visible_blocks[position] = self._blocks[index]
+
+        for position in [position for position in self._drawn_states
+                         if position not in visible_blocks]:
+            self._canvas.delete(f"position{position}")
+            del self._drawn_states[position]
+
+        for position, block in visible_blocks.items():
+            state = self._get_block_state(
+                block, self._start_times[position - first_position])
+            if self._drawn_states.get(position) != state:
+                self._canvas.delete(f"position{position}")
+                self._draw_block(position, state)
+                self._drawn_states[position] = state
+
+    def _on_scroll(self, first, last):
+        """! Draws the blocks scrolled into view """
+        self._scrollbar.set(first, last)
+        self.refresh()
+
+    def _on_click(self, _):
+        """! Dispatches the clicks on the buttons of the blocks """
+        tags = self._canvas.gettags("current")
+        positions = [int(tag[len("position"):]) for tag in tags
+                     if tag.startswith("position")]
+        if not positions:
+            return
+        first_position = self._blocks[0].position
+        block = self._blocks[positions[0] - first_position]
+        if "repeat_button" in tags:
+            block.set_on_repeat()
+            self.refresh()
+        elif "change_button" in tags:
+            self._on_change_video_cb(block)
+
+    @staticmethod
+    def _get_block_state(block, start_time_s):
+        """! Returns everything displayed for a block, to know
+             if it needs to be drawn again
+        """
+        ui_playing_label_time = datetime.fromtimestamp(start_time_s).time()
+        return (block.index,
+                "{:02d}".format(ui_playing_label_time.hour) + ":" +
+                "{:02d}".format(ui_playing_label_time.minute) + ":" +
+                "{:02d}".format(ui_playing_label_time.second),
+                block.ui_title,
+                block.ui_artist,
+                block.ui_song,
+                block.ui_color,
+                block.ui_frame_color,
+                block.is_played)
+
+    def _draw_block(self, position, state):
+        """! Draws a block on the canvas
+            @param position : absolute position of the block
+            @param state : state returned by _get_block_state
+        """
+        (index, playing_time, title, artist, song,
+         color, frame_color, is_played) = state
+        tag = f"position{position}"
+        x_left = position * SLOT_WIDTH + BLOCK_PADDING_X
+        x_right = x_left + BLOCK_WIDTH
+        x_middle = x_left + BLOCK_WIDTH / 2
+        y_top = BLOCK_PADDING_Y
+        y_bottom = y_top + BLOCK_HEIGHT
+
+        self._canvas.create_rectangle(x_left, y_top, x_right, y_bottom,
+                                      fill=frame_color, width=0, tags=tag)
+        self._canvas.create_text(x_middle, y_top + HEADER_HEIGHT / 2,
+                                 text=playing_time, fill="white",
+                                 font=('calibri', 12), tags=tag)
+        self._canvas.create_rectangle(x_left, y_top + HEADER_HEIGHT,
+                                      x_right, y_bottom,
+                                      fill=color, width=0, tags=tag)
+
+        texts = [(str(index), ('calibri', 20, "bold"))]
+        if artist is not None and song is not None:
+            texts.append((artist, ('calibri', 14, 'bold')))
+            texts.append((song, ('calibri', 14)))
+        texts.append((title, ('calibri', 11, 'italic')))
+        y_text = y_top + HEADER_HEIGHT + 20
+        for text, font in texts:
+            self._canvas.create_text(x_middle, y_text, text=text,
+                                     fill="black", font=font,
+                                     width=BLOCK_WIDTH - 10, tags=tag)
+            y_text = y_text + 35
+
+        if is_played:
+            return
+        y_button = y_bottom - BUTTON_HEIGHT
+        for (button_tag, text, x_begin, x_end) in \
+                (("repeat_button", "Toggle Repeat", x_left, x_middle),
+                 ("change_button", "Change Video", x_middle, x_right)):
+            self._canvas.create_rectangle(x_begin, y_button, x_end, y_bottom,
+                                          fill=color, outline=frame_color,
+                                          tags=(tag, button_tag))
+            self._canvas.create_text((x_begin + x_end) / 2,
+                                     y_button + BUTTON_HEIGHT / 2,
+                                     text=text, fill="white",
+                                     font=('calibri', 12),
+                                     tags=(tag, button_tag))
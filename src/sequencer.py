@@ -25,12 +25,9 @@ import threading
 import sys
 import os
 import time
-import random
-import xml.etree.ElementTree as ET
-import copy
+import itertools
 from datetime import datetime
 from functools import partial
-import magic
 
 # Application related imports
 from colors import (UI_BACKGROUND_COLOR,
@@ -44,6 +41,29 @@ from logger import print_trace_in_ui, logger_set_is_stopping
 from plugin_base import plugin_type_factory
 from history_view import HistoryListbox
 from log_view import LogListbox
+from media_library import get_media_library
+from data_manager import kill_data_manager
+from audio_analysis import AudioAnalyzer, get_trim_points
+from media_prober import MediaProber
+from video_pools import (PlaybackHistory, RandomVideoPool, ShuffleBagPool,
+                         WeightedVideoPool, RANDOM_VIDEO_MODE_SHUFFLE,
+                         RANDOM_VIDEO_MODE_WEIGHTED, WEIGHTS_FILE_EXTENSION,
+                         DEFAULT_WEIGHT, read_weights_file)
+from sequence_model import LazySequence
+from sequence_timeline import SequenceTimeline
+from schedule import Schedule
+from program_guide import GuideExporter, ProgramGuide
+from scheduler import Scheduler
+from ui_dispatcher import UiDispatcher
+from transition_telemetry import TransitionTelemetry, PHASE_NEXT_VIDEO
+from sequence_compiler import load_sequence_plan
+
+# Number of blocks resolved at once by the lookahead
+LOOKAHEAD_BLOCKS = 8
+# Number of played blocks kept in the sequence window
+WINDOW_PLAYED_BLOCKS = 2
+# Default duration of the program guide, in hours
+PROGRAM_GUIDE_HOURS = 24
 
 
 class MainSequencer():
@@ -53,10 +73,29 @@ class MainSequencer():
     ui_player = None
     ui_sequencer = None
     thread = None
-
-    def __init__(self, ui_player, ui_sequencer):
+    # Clock of the sequence manager
+    clock = None
+    # Called with (path, start timestamp, end timestamp) after each playback
+    on_playback_cb = None
+    # Timing of the transitions between the videos
+    telemetry = None
+
+    def __init__(self, ui_player, ui_sequencer, on_playback_cb=None,
+                 telemetry=None):
+        """! Creates the main sequencer
+            @param on_playback_cb : called with (path, start timestamp,
+                                    end timestamp) after each playback
+            @param telemetry : TransitionTelemetry of the transitions,
+                               a new one in memory by default
+        """
         self.ui_player = ui_player
         self.ui_sequencer = ui_sequencer
+        self.clock = ui_sequencer.clock
+        self.on_playback_cb = on_playback_cb
+        self.telemetry = telemetry if telemetry is not None else \
+            TransitionTelemetry()
+        self.ui_player.set_next_video_cb(self.ui_sequencer.peek_next_video)
+        self.ui_player.set_telemetry(self.telemetry)
 
     def launch_sequencer(self):
         """! Launch the sequencer thread"""
@@ -68,13 +107,21 @@ class MainSequencer():
 
     def sequencer_thread(self):
         """! Actual sequencer thread """
+        # The playback timers started from here wait for this thread
+        self.clock.take_part()
         while self.is_running_flag:
+            # The previous video ended, the player marks the next phases
+            self.telemetry.begin(self.clock.time())
             (path, length_s) = self.ui_sequencer.get_next_video()
             if path is None and length_s is None:
                 # We are exiting
                 self.is_running_flag = False
                 break
+            self.telemetry.mark(PHASE_NEXT_VIDEO, path=path)
+            time_start_s = self.clock.time()
             self.ui_player.play(path=path, length_s=length_s)
+            if self.on_playback_cb is not None:
+                self.on_playback_cb(path, time_start_s, self.clock.time())
 
     def kill(self):
         """! Kills the main sequencer """
@@ -96,40 +143,43 @@ class SequenceBlock:
     inner_sequence = []
     block_type = None
     block_args = None
-    ui_frame = None
-    ui_playing_time = None
-    ui_video_frame = None
-    ui_label = None
-    ui_id_label = None
-    ui_artist_label = None
-    ui_song_label = None
-    ui_button_frame = None
-    ui_button_repeat_toggle = None
-    ui_button_change_video = None
+    # What the sequence timeline displays for the block
+    ui_title = ""
+    ui_artist = None
+    ui_song = None
+    ui_color = UI_BLOCK_PLAYED_VIDEO_COLOR
+    ui_frame_color = UI_BLOCK_USED_VIDEO_FRAME_COLOR
+    is_played = False
     is_on_repeat = False
-    last_playback = 0
+    # Resolved video of the block : full path and length in seconds
+    path = None
+    length = 0
+    # Position of the block in its sequence iteration,
+    # and absolute position since the beginning of the playback
+    index = 0
+    position = 0
 
     def __init__(self,
                  block_type,
                  block_args=None,
                  repeat=False):
         self.inner_sequence = []
-        self.ui_frame = None
-        self.ui_playing_time = None
-        self.ui_video_frame = None
-        self.ui_label = None
-        self.ui_id_label = None
-        self.ui_artist_label = None
-        self.ui_song_label = None
-        self.ui_button_repeat_toggle = None
-        self.ui_button_frame = None
-        self.ui_button_change_video = None
         self.block_type = block_type
         self.block_args = block_args
-        self.last_playback = 0
+        self.ui_title = block_type
+        self.ui_artist = None
+        self.ui_song = None
+        self.ui_color = self.get_color()
+        self.ui_frame_color = UI_BLOCK_USED_VIDEO_FRAME_COLOR
+        self.is_played = False
+        self.path = None
+        self.length = 0
+        self.index = 0
+        self.position = 0
 
         if repeat:
             self.is_on_repeat = True
+            self.ui_color = UI_BLOCK_REPEAT_VIDEO_COLOR
         else:
             self.is_on_repeat = False
 
@@ -160,35 +210,14 @@ class SequenceBlock:
         """! Select the video by putting a different background
                 to the main ui frame of the block
         """
-        self.ui_frame.configure(
-            bg=UI_BLOCK_SELECTED_VIDEO_FRAME_COLOR)
-        self.ui_playing_time.configure(
-            bg=UI_BLOCK_SELECTED_VIDEO_FRAME_COLOR)
+        self.ui_frame_color = UI_BLOCK_SELECTED_VIDEO_FRAME_COLOR
 
     def modify_color(self, color):
-        """! Modify background colors of the UI elements of the block """
-        # TODO "for widget in ui:"
-        # Have a dictionary of widgets
-        self.ui_frame.configure(
-            bg=UI_BLOCK_USED_VIDEO_FRAME_COLOR)
-        self.ui_playing_time.configure(
-            bg=UI_BLOCK_USED_VIDEO_FRAME_COLOR)
-        self.ui_video_frame.configure(
-            bg=color)
-        self.ui_label.configure(
-            bg=color)
-        self.ui_id_label.configure(
-            bg=color)
-        self.ui_artist_label.configure(
-            bg=color)
-        self.ui_song_label.configure(
-            bg=color)
-        self.ui_button_frame.configure(
-            bg=color)
-        self.ui_button_repeat_toggle.configure(
-            bg=color)
-        self.ui_button_change_video.configure(
-            bg=color)
+        """! Modify background colors of the UI elements of the block
+             The sequence timeline draws it again on its next refresh
+        """
+        self.ui_frame_color = UI_BLOCK_USED_VIDEO_FRAME_COLOR
+        self.ui_color = color
 
     def __str__(self):
         if self.block_type == "repeat":
@@ -197,7 +226,8 @@ class SequenceBlock:
             return "Video : " + self.block_args
         if self.block_type == "randomvideo":
             return ("RandomVideo from dir : " + self.block_args[0]
-                    + " and timeout " + self.block_args[1])
+                    + " and timeout " + self.block_args[1]
+                    + " in " + self.block_args[2] + " mode")
         if self.block_type == "sequence":
             sequence_description = "Sequence :\n"
             for child in self.inner_sequence:
@@ -210,29 +240,14 @@ class SequenceBlock:
         return "Block unknown .. Error"
 
 
-class UiSequenceManager:
+class SequenceManager:
     """! Reads the sequence description and builds the video sequence
 
-        Open a UI to visualize and modify the sequence
+        Resolves the blocks of the sequence ahead of the playback and
+        keeps their schedule, without any UI : this is all the sequencer
+        needs to run without a display.
+        UiSequenceManager adds the UI to visualize and modify the sequence.
     """
-    class ListViews:
-        """! Notebook of list views of history and logs (which are not plugins)"""
-        log_object = None
-        history_object = None
-
-        def __init__(self, ui_parent):
-
-            listviews = ttk.Notebook(ui_parent)
-
-            listviews.columnconfigure(0, weight=1)
-            listviews.columnconfigure(1, weight=1)
-            listviews.rowconfigure(0, weight=1)
-
-            self.history_object = HistoryListbox(listviews)
-            self.log_object = LogListbox(listviews)
-
-            listviews.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
-
     # Reference to the player object to
     # connect the playback buttons to the associated callbacks
     ui_player = None
@@ -241,153 +256,107 @@ class UiSequenceManager:
     metadata_manager = None
     # Reference to the plugins API
     plugin_manager = None
-    #  Reference to the Vlc instance to get true
+    #  Reference to the player backend to get true
     #  metadata about the video (length..)
-    vlc_instance = None
+    backend = None
+    # Clock of the playback, given by the backend
+    clock = None
+    # Parses the videos to get their length
+    media_prober = None
+    # Analyzes the audio of the videos, None to not analyze it
+    audio_analyzer = None
     # Reference to the kill callback of the main sequencer,
     # which is a parent but we need access to the kill feature
     # from the UI
     main_sequencer_kill_cb = None
 
-    # main Tkinter panes, from top to bottom
-    # Top view with the clock
-    main_clock_view = None
-    # View of the sequence with its different blocks
-    sequence_view = None
-    # Control buttons
-    ui_playback_control_view = None
-    # Bottom view : listboxes of history and logs, and plugins management UIs
-    bottom_view = None
-
-    listviews = None
-    # Dictionary of parsed videos
-    history_knownvideos = {}
-    # Parsed video sequence, as a "sequence" block
+    # Flattened view of the sequence, expanding the repeat blocks on demand
+    sequence_model = None
+    # Window of the resolved blocks, from the last played ones
+    # to the ones resolved ahead
+    sequence_window = []
+    # Playing lengths and start times of the blocks of the window
+    schedule = None
+    # Protects the window and the schedule changed together,
+    # from the snapshots taken for the other threads
+    _window_lock = None
+    # Selection pools of the random video directories,
+    # by (directory, selection mode)
+    _random_video_pools = {}
+    # Last playbacks of the videos of the random video directories,
+    # shared by the pools of every mode, by directory
+    _playback_histories = {}
+    # Protects the pools, picked from the lookahead thread and
+    # updated from the UI
+    _random_video_pools_lock = None
+    # Compiled sequence and metadata files
+    sequence_plan = None
+    # Parsed video sequence tree, as a "sequence" block
     sequence_data = None
     # path of the xml sequence file
     xml_path = ""
     # Sequence title (and so the title of the window)
     title = ""
     path_dirname = ""
+    # Index of the playing video in the sequence window
     index_playing_video = -1
     is_running_flag = False
+    # Thread resolving the next blocks of the sequence, and its result
+    _lookahead_thread = None
+    _lookahead_blocks = None
 
     # If the video is in pause, need to recalculate the timestamps every second
     is_paused = False
 
+    # Upcoming programs, and the file where they are exported (if any)
+    program_guide = None
+    program_guide_path = None
+    # Background export of the program guide, None if not exported
+    _guide_exporter = None
+    program_guide_hours = PROGRAM_GUIDE_HOURS
+    # Mean video length of the random video directories,
+    # used to estimate the program guide
+    _mean_lengths = {}
+
     def __init__(self,
-                 tkroot,
-                 vlc_instance,
+                 backend,
                  ui_player,
                  path,
                  metadata_manager,
-                 plugin_manager):
+                 plugin_manager,
+                 program_guide_path=None,
+                 program_guide_hours=PROGRAM_GUIDE_HOURS):
         """! The Sequence manager initializer
 
+            @param backend : the PlayerBackend used to parse the videos
             @param path : path the sequence file
-            @return An instance of a UiSequenceManager
+            @param program_guide_path : path of the program guide export,
+                                        JSON or XMLTV (.xml), None to disable
+            @param program_guide_hours : duration of the program guide
+            @return An instance of a SequenceManager
         """
         self.ui_player = ui_player
-        self.vlc_instance = vlc_instance
+        self.backend = backend
+        self.clock = backend.get_clock()
+        self.media_prober = MediaProber(backend,
+                                        on_probed_cb=self._on_video_probed)
+        self.audio_analyzer = None
         self.metadata_manager = metadata_manager
         self.plugin_manager = plugin_manager
         self.is_running_flag = True
         self.is_paused = False
-
-        # start UI
-        self.ui_sequence_manager = tk.Toplevel(tkroot)
-        self._ui_tkroot = tkroot
-        self.ui_sequence_manager.title("Sequence Manager")
-
-        self.main_clock_view = tk.Frame(
-            self.ui_sequence_manager,
-            width=1000,
-            height=200,
-            background=UI_BACKGROUND_COLOR)
-        self.main_clock_view.pack(
-            side=tk.TOP,
-            fill=tk.BOTH)
-
-        lbl = tk.Label(self.main_clock_view,
-                       font=('calibri', 60, 'bold'),
-                       background=UI_BACKGROUND_COLOR,
-                       foreground='white')
-        lbl.pack(side=tk.TOP,  fill=tk.BOTH, pady=50)
-
-        # Launch clock thread
-        def update_clock():
-            while self.is_running_flag:
-                string = time.strftime('%H:%M:%S')
-                lbl.config(text=string)
-                time.sleep(1)
-
-        self.clock_thread = \
-            threading.Thread(
-                name="UpdateClock Thread",
-                target=update_clock)
-        self.clock_thread.start()
-
-        self.sequence_view = tk.Frame(
-            self.ui_sequence_manager,
-            width=1000,
-            height=500,
-            background=UI_BACKGROUND_COLOR)
-        self.sequence_view.pack(
-            side=tk.TOP,
-            fill=tk.BOTH)
-
-        self.ui_playback_control_view = tk.Frame(
-            self.ui_sequence_manager,
-            width=500,
-            background=UI_BACKGROUND_COLOR)
-
-        self.pause_button = tk.Button(
-            self.ui_playback_control_view,
-            text="Pause/Resume",
-            command=self.pause_resume_callback,
-            padx=10, pady=10, font=('calibri', 12),
-            fg="white",
-            bg=UI_BACKGROUND_COLOR)
-        self.mute_button = tk.Button(
-            self.ui_playback_control_view,
-            text="Mute/Unmute",
-            command=self.ui_player.mute_trigger,
-            padx=10, pady=10, font=('calibri', 12),
-            fg="white",
-            bg=UI_BACKGROUND_COLOR)
-        self.next_button = tk.Button(
-            self.ui_playback_control_view,
-            text="Next",
-            command=self.ui_player.next,
-            padx=10, pady=10, font=('calibri', 12),
-            fg="white",
-            bg=UI_BACKGROUND_COLOR)
-        self.reload_csv_button = tk.Button(
-            self.ui_playback_control_view,
-            text="Reload Metadata",
-            command=self.reload_metadata,
-            padx=10, pady=10, font=('calibri', 12),
-            fg="white",
-            bg=UI_BACKGROUND_COLOR)
-        self.quit_button = tk.Button(
-            self.ui_playback_control_view,
-            text="Quit",
-            command=self.kill,
-            padx=10, pady=10, font=('calibri', 12),
-            fg="white",
-            bg=UI_BACKGROUND_COLOR)
-        self.pause_button.grid(column=0, row=0, padx=10, pady=10)
-        self.mute_button.grid(column=1, row=0, padx=10, pady=10)
-        self.next_button.grid(column=2, row=0, padx=10, pady=10)
-        self.reload_csv_button.grid(column=3, row=0, padx=10, pady=10)
-        self.quit_button.grid(column=4, row=0, padx=10, pady=10)
-        self.ui_playback_control_view.pack(side=tk.TOP,  fill=tk.BOTH)
-
-        self.bottom_view = tk.Frame(self.ui_sequence_manager,
-                                    background=UI_BACKGROUND_COLOR)
-        self.bottom_view.pack(fill=tk.BOTH, expand=1)
-
-        self.listviews = self.ListViews(self.bottom_view)
+        self.program_guide_path = program_guide_path
+        self.program_guide_hours = program_guide_hours
+        self._guide_exporter = None
+        self._mean_lengths = {}
+        self._random_video_pools = {}
+        self._playback_histories = {}
+        self._random_video_pools_lock = threading.RLock()
+        self.sequence_window = []
+        self._window_lock = threading.RLock()
+        self.schedule = Schedule(clock=self.clock.time)
+        self._lookahead_thread = None
+        self._lookahead_blocks = None
 
         # Store file data
         self.xml_path = path
@@ -399,55 +368,48 @@ class UiSequenceManager:
 
         if not self.is_paused:
             self.is_paused = True
-            # Activate the thread that add a second
-            # to the length of the current video
-
-            def current_playing_is_paused_thread():
-                while self.is_paused and self.is_running_flag:
-                    time.sleep(1)
-                    video = self.sequence_data \
-                                .inner_sequence[self.index_playing_video]
-                    video.length = video.length + 1
-
-                    # Changing timestamps for the videos after
-                    # the current one, if they exists
-                    if self.index_playing_video + 1 < \
-                            len(self.sequence_data.inner_sequence):
-                        for i in range(self.index_playing_video + 1,
-                                       len(self.sequence_data.inner_sequence)):
-                            video = self.sequence_data.inner_sequence[i]
-
-                            self.sequence_data.inner_sequence[i]. \
-                                last_playback = \
-                                self.sequence_data. \
-                                inner_sequence[i]. \
-                                last_playback+1
-                            # self._resolve_timestamps(index=i)
-
-                            ui_playing_label_time = datetime.fromtimestamp(
-                                video.last_playback).time()
-                            video.ui_playing_time.configure(
-                                text="{:02d}".
-                                     format(ui_playing_label_time.hour) +
-                                     ":" +
-                                     "{:02d}".
-                                     format(ui_playing_label_time.minute) +
-                                     ":" +
-                                     "{:02d}".
-                                     format(ui_playing_label_time.second))
-            threading.Thread(name="OnPause Thread",
-                             target=current_playing_is_paused_thread). \
-                start()
+            # The videos after the current one are pushed back
+            # by the time spent in pause, applied by the schedule
+            if self.index_playing_video > -1:
+                self.schedule.pause(self.index_playing_video)
+            self._on_paused()
         else:
             self.is_paused = False
+            self.schedule.resume()
+            self._on_schedule_changed()
 
     def reload_metadata(self):
         """! Reloads metadata file """
         print_trace_in_ui("Reloading metadata")
         if self.metadata_manager is not None:
             self.metadata_manager.reload()
+            # The effective lengths of the plan come from the metadata
+            self.sequence_plan.lengths = load_sequence_plan(
+                self.xml_path, self.metadata_manager.path).lengths
+            # As well as the weights of the weighted random videos
+            with self._random_video_pools_lock:
+                for (path, mode), pool in self._random_video_pools.items():
+                    if mode == RANDOM_VIDEO_MODE_WEIGHTED:
+                        pool.update_files(
+                            self._get_random_video_files(path, mode))
         # TODO Reload UI
 
+    def reindex_media(self):
+        """! Indexes the random video directories again in the background,
+             new files join the selection pools and removed ones leave them
+        """
+        def reindex_thread():
+            get_media_library().refresh_directories(
+                self.sequence_plan.directories.values())
+            self._mean_lengths = {}
+            with self._random_video_pools_lock:
+                for (path, mode), pool in self._random_video_pools.items():
+                    pool.update_files(self._get_random_video_files(path, mode))
+            self._prefetch_video_lengths()
+            self._analyze_audio()
+
+        threading.Thread(name="Reindex Thread", target=reindex_thread).start()
+
     def _get_metadata(self, video_name):
         """! Gets the metadata through the API, wraps the None protection
             @param video_name : name of the video file,
@@ -460,39 +422,70 @@ class UiSequenceManager:
                 video_name=video_name)
         return metadata
 
-    def _build_sequence(self, sequence_xml_node, sequence_data_node):
-        """! Builds the sequence from a xml node. Recursive"""
-        for child in sequence_xml_node:
-            if child.tag == "Repeat":
-                nb_times = child.attrib['nb_time']
-                block = SequenceBlock("repeat", nb_times)
-                self._build_sequence(
-                    sequence_xml_node=child, sequence_data_node=block)
-                sequence_data_node.add_block(block)
-            if child.tag == "Video":
-                path = child.attrib['path']
-                repeat = child.attrib.setdefault('repeat', None)
-                block = SequenceBlock("video", path, repeat=repeat == "1")
-                sequence_data_node.add_block(block)
-            if child.tag == "RandomVideo":
-                path = child.attrib['path']
-                reselect_timeout = child.attrib['reselect_timeout']
-                block = SequenceBlock("randomvideo", (path, reselect_timeout))
-                sequence_data_node.add_block(block)
-
-    def _flatten_sequence(self, sequence_data_node):
-        """! Resolves the repeat blocks by flattening the loops """
-        for i, block in enumerate(sequence_data_node.inner_sequence):
-            if block.block_type == "repeat":
-                for _ in range(int(block.block_args)):
-                    for block_child in block.inner_sequence:
-                        self._flatten_sequence(block_child)
-                        sequence_data_node.inner_sequence.insert(
-                            i, copy.copy(block_child))
-                block.inner_sequence = None
-                sequence_data_node.inner_sequence.remove(block)
-
-    def _find_random_video(self, path, timeout_m, time_programmed_s):
+    def _build_sequence(self, descriptors, sequence_data_node):
+        """! Builds the sequence from the block descriptors of the plan. Recursive"""
+        for descriptor in descriptors:
+            if descriptor[0] == "repeat":
+                block = SequenceBlock("repeat", str(descriptor[1]))
+                self._build_sequence(descriptors=descriptor[2],
+                                     sequence_data_node=block)
+            elif descriptor[0] == "video":
+                block = SequenceBlock("video", descriptor[1],
+                                      repeat=descriptor[2])
+            else:
+                block = SequenceBlock("randomvideo",
+                                      (descriptor[1], descriptor[2],
+                                       descriptor[3]))
+            sequence_data_node.add_block(block)
+
+    def _get_random_video_files(self, path, mode):
+        """! Returns the videos of a random video directory,
+             as the selection pools take them
+          @param path : the path of the directory, relative to the sequence
+          @param mode : selection mode of the RandomVideo block
+          @return the list of the paths of the videos, or for the weighted
+                  mode the dictionary of the paths and their weight : from
+                  the weights file next to the directory, then from the
+                  metadata
+        """
+        full_path = self.path_dirname + "/" + path
+        paths = [file.path for file in
+                 get_media_library().get_media_files(full_path)]
+        if mode != RANDOM_VIDEO_MODE_WEIGHTED:
+            return paths
+
+        file_weights = read_weights_file(full_path + WEIGHTS_FILE_EXTENSION)
+        weights = {}
+        for video_path in paths:
+            video_name = video_path.split("/").pop()
+            weight = file_weights.get(video_name)
+            if weight is None and self.metadata_manager is not None:
+                weight = self.metadata_manager.get_weight(video_name)
+            weights[video_path] = DEFAULT_WEIGHT if weight is None else weight
+        return weights
+
+    def _get_random_video_pool(self, path, mode):
+        """! Returns the selection pool of a random video directory,
+             created from the media library on first use
+          @param path : the path of the directory, relative to the sequence
+          @param mode : selection mode of the RandomVideo block
+        """
+        if (path, mode) not in self._random_video_pools:
+            files = self._get_random_video_files(path, mode)
+            history = self._playback_histories.setdefault(path,
+                                                          PlaybackHistory())
+            if mode == RANDOM_VIDEO_MODE_SHUFFLE:
+                pool = ShuffleBagPool(self.path_dirname + "/" + path, files,
+                                      get_media_library(), history=history)
+            elif mode == RANDOM_VIDEO_MODE_WEIGHTED:
+                pool = WeightedVideoPool(files, history=history)
+            else:
+                pool = RandomVideoPool(files, history=history)
+            self._random_video_pools[(path, mode)] = pool
+        return self._random_video_pools[(path, mode)]
+
+    def _find_random_video(self, path, timeout_m, time_programmed_s,
+                           mode):
         """! Returns a video in the directory given by the path
              parameter and that hasnt played for timeout minutes
           @param path : the path of the directory to search videos in
@@ -502,93 +495,107 @@ class UiSequenceManager:
           @param time_programmed_s : Timestamp in the future
                                      for the programmed video,
                                      when its gonna be played
+          @param mode : selection mode of the RandomVideo block
+          @return the path of the video, None if the directory
+                  has no media file
         """
-        # gather list of files
-        files = os.listdir(self.path_dirname + "/" + path)
-        # List of files that have been played too recently
-        forbidden_files = []
-        video_found = None
-
-        while video_found is None:
-            is_file_selected = False
-            while not is_file_selected:
-                file = files[random.randrange(len(files))]
-                is_file_selected = file not in forbidden_files
-            complete_path = self.path_dirname + "/" + path + "/" + file
-            print_trace_in_ui("Testing " + complete_path)
-            # Verify its a Media file before trying to play it
-
-            if "Media" in magic.from_file(complete_path):
-                if complete_path in self.history_knownvideos:
-                    video = self.history_knownvideos[complete_path]
-
-                    print_trace_in_ui("Already known video... Last playback on ",
-                                   datetime.fromtimestamp(video.last_playback),
-                                   " and timeout ",
-                                   int(timeout_m)*60, "s")
-                    print_trace_in_ui(" and timestamp of the programmed video  ",
-                                   datetime.fromtimestamp(time_programmed_s))
-                    if (video.last_playback + int(timeout_m)*60 <
-                            time_programmed_s):
-                        video_found = complete_path
-                        # Overriding the last playback to now +
-                        # last programmed videos time
-                        self.history_knownvideos[complete_path]. \
-                            last_playback = time_programmed_s
-                    else:
-                        print_trace_in_ui("Last playback too recent.. ")
-                        # Forbid this video to be tested again
-                        forbidden_files.append(complete_path)
-                        if len(forbidden_files) == len(files):
-                            print_trace_in_ui(
-                                "ERR ! All videos are forbidden ! Selecting ",
-                                complete_path,
-                                " anyway..")
-                            video_found = complete_path
-                            self.history_knownvideos[complete_path]. \
-                                last_playback = time_programmed_s
-                else:
-                    video_found = complete_path
-            else:
-                print_trace_in_ui("Not a video file")
-                forbidden_files.append(complete_path)
-                if len(forbidden_files) == len(files):
-                    print_trace_in_ui("ERROR ! Trying again...")
-
+        with self._random_video_pools_lock:
+            pool = self._get_random_video_pool(path, mode)
+            video_found = pool.pick(
+                timeout_s=int(timeout_m)*60,
+                time_programmed_s=time_programmed_s)
+        print_trace_in_ui("Selecting ", video_found, " for ",
+                          datetime.fromtimestamp(time_programmed_s))
         return video_found
 
-    def _resolve_timestamps(self, index):
-
-        video = self.sequence_data.inner_sequence[index]
-        # Resolves the timestamp in the future where we need to put the video
-        time_programmed_s = time.time()
-
-        # We simply need to take the last video timestamp and add it
-        if index > 0:
-            # Compute last video length
-            path_video = self.sequence_data.inner_sequence[index-1].path
-
-            # Get the metadata to gather
-            # the actual programmed playing time of the videos
-            metadata = self._get_metadata(path_video.split("/").pop())
-
-            if metadata is not None:
-                if metadata.timestamp_end != 0:
-                    # If there is a end timestamp,
-                    # we know the length is end - start
-                    playing_length_s = metadata.timestamp_end - \
-                                       metadata.timestamp_begin
-                else:
-                    # If theres a start we have to get the length and substract
-                    playing_length_s = self.history_knownvideos[path_video].length - \
-                        metadata.timestamp_begin
-            else:
-                playing_length_s = self.history_knownvideos[path_video].length
-
-            # New time_programmed is the last playback + the length of the last track
-            time_programmed_s = self.sequence_data. \
-                inner_sequence[index - 1].last_playback + playing_length_s
-        video.last_playback = time_programmed_s
+    def _reindex_random_video_directory(self, path):
+        """! Indexes a random video directory again, and synchronizes
+             the pools of the directory with its files
+          @param path : the path of the directory, relative to the sequence
+        """
+        get_media_library().refresh_directory(self.path_dirname + "/" + path)
+        with self._random_video_pools_lock:
+            for (pool_path, mode), pool in self._random_video_pools.items():
+                if pool_path == path:
+                    pool.update_files(self._get_random_video_files(path,
+                                                                   mode))
+
+    def _get_playing_length(self, path_video):
+        """! Returns the actual programmed playing time of a video
+            @param path_video : full path of the video, already parsed
+        """
+        # Get the metadata to gather
+        # the actual programmed playing time of the videos
+        metadata = self._get_metadata(path_video.split("/").pop())
+        # Without timestamps in the metadata, the silences are trimmed
+        (begin_s, end_s) = get_trim_points(path_video, metadata)
+
+        if end_s != 0:
+            # If there is a end timestamp,
+            # we know the length is end - start
+            return end_s - begin_s
+        # If theres a start we have to get the length and substract
+        length_s = get_media_library().get_entry(path_video).duration - begin_s
+        if metadata is not None and metadata.fade_out and \
+           self.ui_player is not None:
+            # The next video begins with the fade out of the end
+            length_s = max(length_s - self.ui_player.fade_duration_s, 0)
+        return length_s
+
+    def _on_video_probed(self, path, length, tracks):
+        """! Called by the media prober for each parsed video
+            @param path : full path of the video
+            @param length : length of the video in seconds
+            @param tracks : tracks of the video
+        """
+        # Store the video in the library, for this launch and the next ones
+        get_media_library().set_probe_result(path, length, tracks)
+        # The mean lengths of the random blocks are averaged again
+        self._mean_lengths = {}
+
+    def _parse_video_length(self, path):
+        """! Returns the length of a video, parsed once and then
+             kept in the media library until the file changes
+            @param path : full path of the video
+            @return the length in seconds, None if the video cannot be parsed
+        """
+        entry = get_media_library().lookup(path)
+        if entry is None:
+            return None
+        if entry.duration > 0:
+            print_trace_in_ui(path + " : Known video, already parsed length ",
+                              entry.duration)
+            return entry.duration
+        return self.media_prober.probe_now(path)
+
+    def _prefetch_video_lengths(self):
+        """! Queues the parsing of every video the sequence can play,
+             so that they are parsed concurrently in the background
+        """
+        for block in self.sequence_model.iter_leaves():
+            if block.block_type == "video":
+                entry = get_media_library().lookup(
+                    self.path_dirname + "/" + block.block_args)
+                if entry is not None and entry.duration == 0:
+                    self.media_prober.probe(entry.path)
+        for full_path in self.sequence_plan.directories.values():
+            for file in get_media_library().get_media_files(full_path):
+                if file.duration == 0:
+                    self.media_prober.probe(file.path)
+
+    def _analyze_audio(self):
+        """! Queues the audio analysis of every video the sequence can
+             play, the videos analyzed already are skipped
+        """
+        if self.audio_analyzer is None:
+            return
+        paths = [self.path_dirname + "/" + block.block_args
+                 for block in self.sequence_model.iter_leaves()
+                 if block.block_type == "video"]
+        for full_path in self.sequence_plan.directories.values():
+            paths.extend(file.path for file in
+                         get_media_library().get_media_files(full_path))
+        self.audio_analyzer.analyze(paths)
 
     def _load_video(self, path, video):
         """! Load video info in the block
@@ -597,207 +604,254 @@ class UiSequenceManager:
         """
         # Storing path in the block
         video.path = path
-        if video.path in self.history_knownvideos:
-            video.length = self.history_knownvideos[video.path].length
-            print_trace_in_ui(video.path + " : Known video, already parsed length ", video.length)
-        else:
-            print_trace_in_ui(
-                video.path + " : New video, reading attributes ")
-            media = self.vlc_instance.media_new(video.path)
-            media.parse_with_options(1, 0)
-            # Blocking the parsing time
-            while True:
-                if str(media.get_parsed_status()) == 'MediaParsedStatus.done':
-                    break
-            video.length = media.get_duration()/1000
-
-            # Store video in the dictionary
-            self.history_knownvideos[video.path] = copy.copy(video)
-            # We do not need this media anymore
-            media.release()
+        video.length = self._parse_video_length(path)
+        self._update_block_ui(video)
 
+    def _update_block_ui(self, video):
+        """! Fills the displayed info of the block with its video
+            @param video : Reference to the resolved video block
+        """
         # Split the path and get the name after the last '/' and get the name before the extension
-        video.ui_label.configure(
-            text=video.path.split("/").pop().split(".")[0])
+        video.ui_title = video.path.split("/").pop().split(".")[0]
 
         metadata = self._get_metadata(video.path.split("/").pop())
 
+        video.ui_artist = None
+        video.ui_song = None
         if metadata is not None:
-            if metadata.artist is not None and metadata.song is not None:
-                video.ui_artist_label.configure(text=metadata.artist)
-                video.ui_artist_label.pack(padx=5, pady=5, fill="both", expand=True)
-                video.ui_song_label.configure(text=metadata.song)
-                video.ui_song_label.pack(padx=5, pady=5, fill="both", expand=True)
-        else:
-            video.ui_artist_label.pack_forget()
-            video.ui_song_label.pack_forget()
-
-        ui_playing_label_time = datetime.fromtimestamp(
-            video.last_playback).time()
-        video.ui_playing_time.configure(
-            text="{:02d}".format(ui_playing_label_time.hour) + ":" +
-                 "{:02d}".format(ui_playing_label_time.minute) + ":" +
-                 "{:02d}".format(ui_playing_label_time.second))
-
-    def _resolve_sequence(self):
-        """! Chooses the random videos to be displayed,
-             add length for each media and media info to blocks """
-        for i, video in enumerate(self.sequence_data.inner_sequence):
+            video.ui_artist = metadata.artist
+            video.ui_song = metadata.song
+
+    def _resolve_blocks(self, position, nb_blocks, time_begin_s):
+        """! Creates the next blocks of the sequence, choosing
+             the random videos and parsing the length of each media,
+             without touching the sequence window nor the UI
+            @param position : absolute position of the first block
+            @param nb_blocks : number of blocks to resolve
+            @param time_begin_s : timestamp of the beginning of the first block
+            @return the list of the resolved blocks,
+                    None if a video is missing or if we are stopping
+        """
+        resolved_blocks = []
+        time_programmed_s = time_begin_s
+        for block_position, index, template in itertools.islice(
+                self.sequence_model.iter_from(position), nb_blocks):
+            if not self.is_running_flag:
+                return None
             final_path = None
-            self._resolve_timestamps(index=i)
+            length = None
 
-            if video.block_type == "randomvideo":
-                path = video.block_args[0]
-                timeout = video.block_args[1]
+            if template.block_type == "randomvideo":
+                path = template.block_args[0]
+                timeout = template.block_args[1]
                 final_path = self._find_random_video(
-                    path=path, timeout_m=timeout, time_programmed_s=video.last_playback)
+                    path=path, timeout_m=timeout, time_programmed_s=time_programmed_s,
+                    mode=template.block_args[2])
+                # The picked videos are the indexed files of the directory,
+                # they are only checked when they cannot be parsed
+                length = None if final_path is None else \
+                    self._parse_video_length(final_path)
+                if final_path is not None and length is None:
+                    print_trace_in_ui(final_path, " cannot be parsed, "
+                                      "indexing ", path, " again")
+                    self._reindex_random_video_directory(path)
+                    final_path = self._find_random_video(
+                        path=path, timeout_m=timeout,
+                        time_programmed_s=time_programmed_s,
+                        mode=template.block_args[2])
+                    length = None if final_path is None else \
+                        self._parse_video_length(final_path)
                 print_trace_in_ui(f"Video {final_path} is programmed to be played on ",
-                               datetime.fromtimestamp(video.last_playback))
-            elif video.block_type == "video":
-                final_path = self.path_dirname + "/" + video.block_args
+                               datetime.fromtimestamp(time_programmed_s))
+            elif template.block_type == "video":
+                final_path = self.path_dirname + "/" + template.block_args
+                if os.path.isfile(final_path):
+                    length = self._parse_video_length(final_path)
+                else:
+                    print_trace_in_ui(f"{final_path} : The video doesnt exist ! ")
+                    return None
+
+            if final_path is None:
+                print_trace_in_ui(f"{final_path} : The video doesnt exist ! ")
+                return None
+
+            if length is None:
+                print_trace_in_ui(f"{final_path} : The video cannot be parsed ! ")
+                return None
+
+            block = SequenceBlock(template.block_type,
+                                  template.block_args,
+                                  repeat=template.is_on_repeat)
+            block.index = index
+            block.position = block_position
+            block.path = final_path
+            block.length = length
+            resolved_blocks.append(block)
+
+            time_programmed_s = time_programmed_s + \
+                self._get_playing_length(final_path)
+        return resolved_blocks
+
+    def _append_blocks(self, blocks):
+        """! Adds resolved blocks at the end of the sequence window
+            @param blocks : blocks returned by _resolve_blocks
+        """
+        for block in blocks:
+            self._update_block_ui(block)
+            with self._window_lock:
+                self.sequence_window.append(block)
+                self.schedule.append(self._get_playing_length(block.path))
+        self._on_blocks_changed()
+
+    def _evict_played_blocks(self):
+        """! Removes the oldest played blocks from the sequence window """
+        if self.index_playing_video <= WINDOW_PLAYED_BLOCKS:
+            return
+        nb_evicted = self.index_playing_video - WINDOW_PLAYED_BLOCKS
+        with self._window_lock:
+            del self.sequence_window[:nb_evicted]
+            self.schedule.pop_front(nb_evicted)
+        self.index_playing_video = WINDOW_PLAYED_BLOCKS
+        self._on_blocks_changed()
+
+    def _start_lookahead(self):
+        """! Resolves the next blocks of the sequence in the background,
+             while the current ones play
+        """
+        last_video = self.sequence_window[-1]
+        time_begin_s = self.schedule.get_end(len(self.schedule) - 1)
+
+        def lookahead_thread():
+            self._lookahead_blocks = self._resolve_blocks(
+                last_video.position + 1, LOOKAHEAD_BLOCKS, time_begin_s)
 
-            if not os.path.isfile(final_path):
-                print_trace_in_ui(final_path + " : The video doesnt exist ! ")
-                sys.exit(-1)
+        self._lookahead_blocks = None
+        self._lookahead_thread = threading.Thread(name="Lookahead Thread",
+                                                  target=lookahead_thread)
+        self._lookahead_thread.start()
 
-            self._load_video(final_path, video)
+    def _take_lookahead(self):
+        """! Returns the blocks resolved by the lookahead,
+             waiting for them if they are not ready yet
+        """
+        if self._lookahead_thread is None:
+            return None
+        if self._lookahead_thread.is_alive():
+            print_trace_in_ui("Waiting for the lookahead resolver")
+        self._lookahead_thread.join()
+        self._lookahead_thread = None
+        return self._lookahead_blocks
 
     def load_sequence(self):
-        """! Loads the Sequence xml file"""
-        xml_root = ET.parse(self.xml_path).getroot()
-        if xml_root is None:
-            return
-        assert xml_root.tag == 'Document'
-        for child in xml_root:
-            if child.tag == "Title":
-                print_trace_in_ui(f"Title of the sequence : {child.text}")
-                self.title = child.text
-            elif child.tag == "Plugin":
-                plugin_name = child.attrib['name']
-                print_trace_in_ui(f"Load plugin {plugin_name}")
-                # Childs of a plugins are its parameter
-                params = {}
-                for param in child:
-                    assert ("name" in param.attrib and "value" in param.attrib)
-                    params[param.attrib["name"]] = param.attrib["value"]
-
-                self.plugin_manager.add_plugin(
-                    plugin_type_factory(plugin_name), params)
-            elif child.tag == "Sequence":
-                print_trace_in_ui("Sequence found!")
-                self.sequence_data = SequenceBlock("sequence")
-                self._build_sequence(sequence_xml_node=child,
-                                     sequence_data_node=self.sequence_data)
-        self._flatten_sequence(self.sequence_data)
+        """! Loads the Sequence xml file, through its compiled plan"""
+        metadata_path = None
+        if self.metadata_manager is not None:
+            metadata_path = self.metadata_manager.path
+        self.sequence_plan = load_sequence_plan(self.xml_path, metadata_path)
+
+        print_trace_in_ui(f"Title of the sequence : {self.sequence_plan.title}")
+        self.title = self.sequence_plan.title
+
+        self.sequence_data = SequenceBlock("sequence")
+        self._build_sequence(descriptors=self.sequence_plan.sequence,
+                             sequence_data_node=self.sequence_data)
         print_trace_in_ui(self.sequence_data)
+        self.sequence_model = LazySequence(self.sequence_data)
+        print_trace_in_ui("Flattened sequence of ", len(self.sequence_model),
+                          " blocks")
+
+        # Index the random video directories once, only new or
+        # modified files are classified
+        get_media_library().refresh_directories(
+            self.sequence_plan.directories.values())
+        for block in self.sequence_model.iter_leaves():
+            if block.block_type == "randomvideo":
+                self._get_random_video_pool(block.block_args[0],
+                                            block.block_args[2])
+        self._prefetch_video_lengths()
+        self._analyze_audio()
+
+        self._load_plugins()
+
+        # First blocks resolving. The next ones are
+        # resolved in the background by the lookahead
+        time_begin_s = self.clock.time()
+        resolved_blocks = self._resolve_blocks(0, LOOKAHEAD_BLOCKS, time_begin_s)
+        if not resolved_blocks:
+            sys.exit(-1)
+        self._append_blocks(resolved_blocks)
+        self.schedule.set_start(0, time_begin_s)
+
+        self.program_guide = ProgramGuide(self.title, self.sequence_model,
+                                          self._estimate_program,
+                                          self.program_guide_hours)
+        if self.program_guide_path is not None:
+            self._guide_exporter = GuideExporter(self.program_guide,
+                                                 self.program_guide_path)
+        self._on_schedule_changed()
+
+    def _load_plugins(self):
+        """! Loads the plugins of the sequence
+             The plugins draw on the player window : they are
+             not loaded without a display
+        """
+        for plugin_name, _ in self.sequence_plan.plugins:
+            print_trace_in_ui(f"Plugin {plugin_name} not loaded without a display")
+
+    def _get_window_snapshot(self):
+        """! Returns the blocks of the sequence window and their start
+             times, taken together so that the other threads see them
+             agree
+            @return (list of the blocks, list of their start times)
+        """
+        with self._window_lock:
+            return (list(self.sequence_window), self.schedule.get_starts())
 
-        # Fill the UI
-        for i, block in enumerate(self.sequence_data.inner_sequence):
-            block.ui_frame = tk.Frame(
-                self.sequence_view, width=200, height=250, bg=UI_BACKGROUND_COLOR)
-            block.ui_frame.pack(side=tk.LEFT, padx=10,
-                                pady=20, fill=tk.BOTH, expand=True)
-            block.ui_playing_time = tk.Label(block.ui_frame, text=block.last_playback, font=(
-                'calibri', 12), bg=UI_BACKGROUND_COLOR, fg="white")
-            block.ui_playing_time.pack(
-                padx=5, pady=5, fill="none", expand=False)
-            block.ui_video_frame = tk.Frame(
-                block.ui_frame, bg=block.get_color(), width=200, height=100)
-
-            block.ui_frame.pack_propagate(False)
-            block.ui_video_frame.pack(
-                side=tk.BOTTOM, fill=tk.BOTH, expand=True)
-
-            block.ui_id_label = tk.Label(
-                block.ui_video_frame,
-                text=str(i),
-                bg=block.get_color(),
-                fg="black",
-                font=('calibri', 20, "bold"))
-            block.ui_id_label.pack(
-                padx=5, pady=5, fill="none", expand=False)
-            block.ui_label = tk.Label(
-                block.ui_video_frame,
-                text=block.block_type,
-                bg=block.get_color(),
-                fg="black",
-                font=('calibri', 11, 'italic'))
-            block.ui_artist_label = tk.Label(
-                block.ui_video_frame,
-                text="Artist",
-                bg=block.get_color(),
-                fg="black",
-                font=('calibri', 14, 'bold'))
-            block.ui_artist_label.pack(padx=5, pady=5)
-            block.ui_song_label = tk.Label(
-                block.ui_video_frame,
-                text="Song",
-                bg=block.get_color(),
-                fg="black",
-                font=('calibri', 14))
-            block.ui_song_label.pack(padx=5, pady=5)
-
-            block.ui_label.pack(padx=5, pady=5,  fill="none", expand=False)
-
-            block.ui_button_frame = tk.Frame(
-                block.ui_video_frame,
-                bg=block.get_color())
-            block.ui_button_frame.pack(fill=tk.BOTH, expand=True)
-            block.ui_button_repeat_toggle = tk.Button(
-                block.ui_button_frame,
-                text="Toggle Repeat",
-                command=block.set_on_repeat,
-                font=('calibri', 12),
-                fg="white",
-                bg=block.get_color())
-
-            block.ui_button_repeat_toggle.pack(
-                side=tk.LEFT,
-                fill=tk.BOTH,
-                expand=True)
-            block.ui_button_change_video = tk.Button(
-                block.ui_button_frame,
-                text="Change Video",
-                command=partial(self._change_video, i),
-                font=('calibri', 12),
-                fg="white",
-                bg=block.get_color())
-            block.ui_button_change_video.pack(
-                side=tk.RIGHT,
-                fill=tk.BOTH,
-                expand=True)
-
-            if block.is_on_repeat:
-                block.modify_color(UI_BLOCK_REPEAT_VIDEO_COLOR)
-            else:
-                block.modify_color(block.get_color())
+    def _on_blocks_changed(self):
+        """! Called when blocks are added to or removed from the window """
 
-        # Add UI plugins
-        tab_control = ttk.Notebook(self.bottom_view)
-        for plugin in self.plugin_manager.get_plugins():
-            if plugin.is_maintenance_frame():
-                print_trace_in_ui("Creating frame for plugin ", plugin.get_name())
-                frame = ttk.Frame(tab_control)
-                plugin.setup(maintenance_frame=frame)
-                tab_control.add(frame, text=plugin.get_name())
-        tab_control.pack(side=tk.RIGHT, expand=1, fill=tk.BOTH)
+    def _on_schedule_changed(self):
+        """! Called when the start times of the blocks changed """
+        self._update_program_guide()
 
-        # First sequence resolving. After each sequence iteration it will be called
-        self._resolve_sequence()
+    def _on_paused(self):
+        """! Called when the playback is paused """
 
-    def _change_video(self, video_index):
-        """! Modify the video of the block
-            @param video_index : Index of the video to modify
+    def _on_video_selected(self, video):
+        """! Called when a video of the window starts to play
+            @param video : the block of the video
+        """
+
+    def _on_video_played(self, video, time_last_playback):
+        """! Called when a video of the window has been played
+            @param video : the block of the video
+            @param time_last_playback : datetime.time of the playback start
+        """
+
+    def _can_change_video(self, video):
+        """! Returns True if the video of a block can be changed
+            @param video : the block to modify
         """
-        if self.index_playing_video == video_index:
+        if video not in self.sequence_window:
+            print_trace_in_ui("This video is not in the sequence anymore")
+            return False
+        if self.index_playing_video == self.sequence_window.index(video):
             print_trace_in_ui("You cannot change the current video")
+            return False
+        return True
+
+    def change_video(self, video, video_path):
+        """! Modify the video of the block
+            @param video : the block to modify
+            @param video_path : path of the new video
+        """
+        if not self._can_change_video(video):
             return
-        video = self.sequence_data.inner_sequence[video_index]
-        print_trace_in_ui("Change video ", video_index)
-        video_path = filedialog.askopenfilename(
-            title='Select Video',
-            filetypes=[('Video files', '*.mp4')])
+        video_index = self.sequence_window.index(video)
         if os.path.isfile(video_path):
+            if self._parse_video_length(video_path) is None:
+                print_trace_in_ui(f"{video_path} : The video cannot be parsed ! ")
+                return
             self._load_video(video_path, video)
             if video.is_on_repeat:
                 video.modify_color(UI_BLOCK_REPEAT_VIDEO_COLOR)
@@ -808,84 +862,179 @@ class UiSequenceManager:
 
     def _reconfigure_timestamps(self, from_index, is_now = True):
         """! Reconfigure all timestamps from the index chosen
-            @param from_index : Index of the first video to recompute
-            @param is_now : true if the first video is to be set from now (default)
+            The playing length of the video is stored again in the schedule,
+            the start times of the next videos follow from it
+            @param from_index : Index of the video to recompute
+            @param is_now : true if the playing video is to be set from now (default)
                             false if we need to take the already computed time
         """
-
         if is_now:
-        # Recompute timestamps
-            self.sequence_data.inner_sequence[self.index_playing_video].last_playback = time.time()
-            ui_playing_label_time = datetime.fromtimestamp(
-            self.sequence_data.inner_sequence[self.index_playing_video].last_playback).time()
-            self.sequence_data.inner_sequence[self.index_playing_video]. \
-                ui_playing_time.configure(text="{:02d}".format(ui_playing_label_time.hour) + ":" +
-                                               "{:02d}".format(ui_playing_label_time.minute) + ":" +
-                                               "{:02d}".format(ui_playing_label_time.second))
-        # Adding timestamps since the playing video
-        for i in range(from_index + 1, len(self.sequence_data.inner_sequence)):
-            video_modify = self.sequence_data.inner_sequence[i]
-            print_trace_in_ui("Changing timestamps of video ",
-                        i, " " + video_modify.path)
-
-            self._resolve_timestamps(index=i)
-
-            ui_playing_label_time = datetime.fromtimestamp(
-                video_modify.last_playback).time()
-            video_modify.ui_playing_time. \
-                configure(text="{:02d}".format(ui_playing_label_time.hour) + ":" +
-                               "{:02d}".format(ui_playing_label_time.minute) + ":" +
-                               "{:02d}".format(ui_playing_label_time.second))
+            # A running pause extends the playing video
+            if self.schedule.is_paused():
+                self.schedule.resume()
+                self.schedule.pause(self.index_playing_video)
+            # Recompute timestamps
+            self.schedule.set_start(self.index_playing_video, self.clock.time())
+        self.schedule.set_length(
+            from_index,
+            self._get_playing_length(self.sequence_window[from_index].path))
+        self._on_schedule_changed()
+
+    def _estimate_program(self, position, index, block):
+        """! Estimates the program of a block that is not resolved yet,
+             from the cached durations and metadata
+            @return a ProgramEntry
+        """
+        if block.block_type == "video":
+            path = self.path_dirname + "/" + block.block_args
+            length_s = 0
+            if block.block_args in self.sequence_plan.lengths:
+                length_s = self.sequence_plan.lengths[block.block_args]
+            elif get_media_library().lookup(path) is not None:
+                length_s = max(self._get_playing_length(path), 0)
+            title = path.split("/").pop().split(".")[0]
+            artist = None
+            song = None
+            metadata = self._get_metadata(path.split("/").pop())
+            if metadata is not None:
+                artist = metadata.artist
+                song = metadata.song
+            return ProgramGuide.ProgramEntry(position, index, title,
+                                             artist, song, length_s)
+
+        # A random video is not chosen before it is resolved,
+        # its length is the mean length of its directory
+        directory = block.block_args[0]
+        # Cleared by the prober threads when new durations land
+        mean_lengths = self._mean_lengths
+        if directory not in mean_lengths:
+            lengths = [entry.duration for entry in
+                       get_media_library().get_media_files(
+                           self.path_dirname + "/" + directory)
+                       if entry.duration > 0]
+            mean_lengths[directory] = \
+                sum(lengths) / len(lengths) if lengths else 0
+        return ProgramGuide.ProgramEntry(position, index,
+                                         "Random video from " + directory,
+                                         None, None,
+                                         mean_lengths[directory])
+
+    def _update_program_guide(self):
+        """! Updates the program guide with the resolved blocks,
+             and exports it if asked
+        """
+        if self.program_guide is None:
+            return
+        resolved_entries = []
+        for i in range(max(self.index_playing_video, 0),
+                       len(self.sequence_window)):
+            block = self.sequence_window[i]
+            resolved_entries.append(ProgramGuide.ProgramEntry(
+                block.position, block.index, block.ui_title,
+                block.ui_artist, block.ui_song,
+                self.schedule.get_length(i),
+                start_s=self.schedule.get_start(i),
+                is_resolved=True))
+        self.program_guide.update(resolved_entries)
+        if self._guide_exporter is not None:
+            self._guide_exporter.request()
+
+    def get_program_guide(self):
+        """! Returns the programs of the next hours, from the playing video
+            @return a list of ProgramGuide.ProgramEntry
+        """
+        if self.program_guide is None:
+            return []
+        return self.program_guide.get_entries()
+
+    def export_program_guide(self, path):
+        """! Writes the program guide of the next hours
+            @param path : path of the guide, XMLTV if it ends with .xml,
+                          JSON otherwise
+        """
+        if self.program_guide is not None:
+            self.program_guide.export(path)
+
+    def get_block_at(self, time_s):
+        """! Returns the resolved block airing at a given time
+            @param time_s : timestamp in seconds
+            @return the block, None if it is not resolved yet or already evicted
+        """
+        index = self.schedule.find(time_s)
+        if index is None:
+            return None
+        return self.sequence_window[index]
 
 
     def get_next_video(self):
-        """! Get the next video in the sequence and 
+        """! Get the next video in the sequence and
             increment the current sequence index
         """
         if not self.is_running_flag:
             print_trace_in_ui("We are stopping the app")
             return (None, None)
-        video = self.sequence_data.inner_sequence[self.index_playing_video]
-        # If the current video is set on repeat, we select it again
-        if video.is_on_repeat:
-            self._reconfigure_timestamps(self.index_playing_video)
-            return (video.path, video.length)
 
         if self.index_playing_video > -1:
+            video = self.sequence_window[self.index_playing_video]
+            # If the current video is set on repeat, we select it again
+            if video.is_on_repeat:
+                self._reconfigure_timestamps(self.index_playing_video)
+                return (video.path, video.length)
+
             # Reset frame options
             video.modify_color(UI_BLOCK_PLAYED_VIDEO_COLOR)
             # Remove buttons
-            video.ui_button_frame.pack_forget()
+            video.is_played = True
             # Add to the history
-            time_last_playback = datetime.fromtimestamp(
-                video.last_playback).time()
-
-            self.listviews.history_object.add_entry(
-                timestamp="{:02d}".format(time_last_playback.hour) + ":" +
-                          "{:02d}".format(time_last_playback.minute) + ":" +
-                          "{:02d}".format(time_last_playback.second),
-                video_name= video.path)
-
-        # Resolve the sext sequence
-        if self.index_playing_video == len(self.sequence_data.inner_sequence) - 1:
-            self._resolve_sequence()
-            for block in self.sequence_data.inner_sequence:
-                block.modify_color(block.get_color())
-                # Reset background colors
-                block.ui_frame.configure(bg=UI_BACKGROUND_COLOR)
-                block.ui_playing_time.configure(bg=UI_BACKGROUND_COLOR)
+            self._on_video_played(video, datetime.fromtimestamp(
+                self.schedule.get_start(self.index_playing_video)).time())
+
+        # Append the blocks resolved by the lookahead when they are ready,
+        # we only wait for them if no resolved block is left
+        is_window_exhausted = \
+            self.index_playing_video + 1 >= len(self.sequence_window)
+        if is_window_exhausted and self._lookahead_thread is None:
+            self._start_lookahead()
+        if self._lookahead_thread is not None and \
+           (is_window_exhausted or not self._lookahead_thread.is_alive()):
+            resolved_blocks = self._take_lookahead()
+            if not resolved_blocks:
+                print_trace_in_ui("Could not resolve the next blocks")
+                return (None, None)
+            self._append_blocks(resolved_blocks)
 
         # Incrementing the sequence and setting the selected frame in color
-        self.index_playing_video = (
-            self.index_playing_video + 1) % len(self.sequence_data.inner_sequence)
-        video = self.sequence_data.inner_sequence[self.index_playing_video]
+        self.index_playing_video = self.index_playing_video + 1
+        self._evict_played_blocks()
+        video = self.sequence_window[self.index_playing_video]
         video.select()
+        self._on_video_selected(video)
 
         self._reconfigure_timestamps(self.index_playing_video)
 
+        # Keep enough blocks resolved ahead
+        if self._lookahead_thread is None and \
+           len(self.sequence_window) - self.index_playing_video - 1 < \
+           LOOKAHEAD_BLOCKS:
+            self._start_lookahead()
+
         # Gathering the video details
         return (video.path, video.length)
 
+    def peek_next_video(self):
+        """! Get the video played after the current one, if it is
+             resolved already, without moving in the sequence
+            @return (path, length in seconds), (None, None) if unknown
+        """
+        if not self.is_running_flag or self.index_playing_video < 0:
+            return (None, None)
+        video = self.sequence_window[self.index_playing_video]
+        if not video.is_on_repeat:
+            if self.index_playing_video + 1 >= len(self.sequence_window):
+                return (None, None)
+            video = self.sequence_window[self.index_playing_video + 1]
+        return (video.path, video.length)
+
     def set_main_sequencer_stop_cb(self, main_sequencer_kill_cb):
         """! Sets a kill callback for killing the main sequencer from here """
         self.main_sequencer_kill_cb = main_sequencer_kill_cb
@@ -897,16 +1046,309 @@ class UiSequenceManager:
         self.is_running_flag = False
         self.ui_player.kill()
 
-        self.ui_sequence_manager.destroy()
-        self._ui_tkroot.destroy()
+        self._destroy_ui()
 
         for plugin in self.plugin_manager.get_plugins():
             print_trace_in_ui("Exiting ", plugin.get_name())
             plugin.on_destroy()
 
-        if self.clock_thread is not None:
-            self.clock_thread.join()
-            self.clock_thread = None
+        # Unblocks the sequencer if it waits for a video to be parsed
+        self.media_prober.stop()
 
         if self.main_sequencer_kill_cb is not None:
             self.main_sequencer_kill_cb()
+
+        if self._lookahead_thread is not None:
+            self._lookahead_thread.join()
+
+        if self._guide_exporter is not None:
+            self._guide_exporter.stop()
+
+        if self.audio_analyzer is not None:
+            self.audio_analyzer.stop()
+        with self._random_video_pools_lock:
+            for pool in self._random_video_pools.values():
+                if isinstance(pool, ShuffleBagPool):
+                    pool.store_changes()
+        get_media_library().close()
+        # After the main sequencer, which stores the transitions
+        kill_data_manager()
+
+    def _destroy_ui(self):
+        """! Called on kill to destroy the UI """
+
+
+class UiSequenceManager(SequenceManager):
+    """! Reads the sequence description and builds the video sequence
+
+        Open a UI to visualize and modify the sequence
+    """
+    class ListViews:
+        """! Notebook of list views of history and logs (which are not plugins)"""
+        log_object = None
+        history_object = None
+
+        def __init__(self, tk_frame, ui_dispatcher):
+            listviews = tk.Frame(tk_frame,
+                                 background=UI_BACKGROUND_COLOR)
+            listviews.columnconfigure(0, weight=1)
+            listviews.columnconfigure(1, weight=1)
+            listviews.rowconfigure(0, weight=1)
+
+            self.history_object = HistoryListbox(listviews)
+            self.log_object = LogListbox(listviews,
+                                         ui_dispatcher=ui_dispatcher)
+
+            listviews.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
+
+    # main Tkinter panes, from top to bottom
+    # Top view with the clock
+    main_clock_view = None
+    # Timeline of the sequence with its different blocks
+    timeline = None
+    # Control buttons
+    ui_playback_control_view = None
+    # Bottom view : listboxes of history and logs, and plugins management UIs
+    bottom_view = None
+
+    listviews = None
+    # Scheduler of the clock and of the refreshes
+    scheduler = None
+    _pause_refresh_timer = None
+    # Applies the UI updates asked by the sequencer thread
+    ui_dispatcher = None
+    # Percentiles of the transitions durations, None without telemetry
+    transitions_label = None
+    telemetry = None
+
+    def __init__(self,
+                 tkroot,
+                 backend,
+                 ui_player,
+                 path,
+                 metadata_manager,
+                 plugin_manager,
+                 program_guide_path=None,
+                 program_guide_hours=PROGRAM_GUIDE_HOURS,
+                 scheduler=None,
+                 ui_dispatcher=None,
+                 telemetry=None):
+        """! The Sequence manager initializer
+
+            @param tkroot : the tkinter root of the application
+            @param backend : the PlayerBackend used to parse the videos
+            @param path : path the sequence file
+            @param program_guide_path : path of the program guide export,
+                                        JSON or XMLTV (.xml), None to disable
+            @param program_guide_hours : duration of the program guide
+            @param scheduler : Scheduler running in the tkinter main loop,
+                               a new one by default
+            @param ui_dispatcher : UiDispatcher of the scheduler,
+                                   a new one by default
+            @param telemetry : TransitionTelemetry of the main sequencer,
+                               whose summary is displayed. None if none
+            @return An instance of a UiSequenceManager
+        """
+        super().__init__(backend, ui_player, path, metadata_manager,
+                         plugin_manager, program_guide_path,
+                         program_guide_hours)
+        self.scheduler = scheduler if scheduler is not None else \
+            Scheduler(self.clock, tkroot)
+        # The gains and trims of the videos are measured
+        # for the real playbacks only
+        self.audio_analyzer = AudioAnalyzer()
+        self.ui_dispatcher = ui_dispatcher if ui_dispatcher is not None \
+            else UiDispatcher(self.scheduler)
+        self._pause_refresh_timer = None
+
+        # start UI
+        self.ui_sequence_manager = tk.Toplevel(tkroot)
+        self._ui_tkroot = tkroot
+        self.ui_sequence_manager.title("Sequence Manager")
+
+        self.main_clock_view = tk.Frame(
+            self.ui_sequence_manager,
+            width=1000,
+            height=200,
+            background=UI_BACKGROUND_COLOR)
+        self.main_clock_view.pack(
+            side=tk.TOP,
+            fill=tk.BOTH)
+
+        lbl = tk.Label(self.main_clock_view,
+                       font=('calibri', 60, 'bold'),
+                       background=UI_BACKGROUND_COLOR,
+                       foreground='white')
+        lbl.pack(side=tk.TOP,  fill=tk.BOTH, pady=50)
+
+        # Update the clock on each second
+        def update_clock():
+            string = time.strftime('%H:%M:%S',
+                                   time.localtime(self.clock.time()))
+            lbl.config(text=string)
+
+        update_clock()
+        self.scheduler.call_every(1, update_clock,
+                                  delay_s=1 - self.clock.time() % 1)
+
+        self.telemetry = telemetry
+        if self.telemetry is not None:
+            self.transitions_label = tk.Label(self.main_clock_view,
+                                              font=('courier', 10),
+                                              justify=tk.LEFT,
+                                              background=UI_BACKGROUND_COLOR,
+                                              foreground='white')
+            self.transitions_label.pack(side=tk.TOP, pady=(0, 10))
+            self._refresh_transitions()
+            self.telemetry.set_on_record_cb(
+                lambda _: self.ui_dispatcher.call(
+                    self._refresh_transitions,
+                    key=(self.transitions_label, "refresh")))
+
+        self.timeline = SequenceTimeline(self.ui_sequence_manager,
+                                         self._change_video)
+        self.timeline.get_view().pack(
+            side=tk.TOP,
+            fill=tk.BOTH)
+
+        self.ui_playback_control_view = tk.Frame(
+            self.ui_sequence_manager,
+            width=500,
+            background=UI_BACKGROUND_COLOR)
+
+        self.pause_button = tk.Button(
+            self.ui_playback_control_view,
+            text="Pause/Resume",
+            command=self.pause_resume_callback,
+            padx=10, pady=10, font=('calibri', 12),
+            fg="white",
+            bg=UI_BACKGROUND_COLOR)
+        self.mute_button = tk.Button(
+            self.ui_playback_control_view,
+            text="Mute/Unmute",
+            command=self.ui_player.mute_trigger,
+            padx=10, pady=10, font=('calibri', 12),
+            fg="white",
+            bg=UI_BACKGROUND_COLOR)
+        self.next_button = tk.Button(
+            self.ui_playback_control_view,
+            text="Next",
+            command=self.ui_player.next,
+            padx=10, pady=10, font=('calibri', 12),
+            fg="white",
+            bg=UI_BACKGROUND_COLOR)
+        self.reload_csv_button = tk.Button(
+            self.ui_playback_control_view,
+            text="Reload Metadata",
+            command=self.reload_metadata,
+            padx=10, pady=10, font=('calibri', 12),
+            fg="white",
+            bg=UI_BACKGROUND_COLOR)
+        self.reindex_button = tk.Button(
+            self.ui_playback_control_view,
+            text="Reindex Media",
+            command=self.reindex_media,
+            padx=10, pady=10, font=('calibri', 12),
+            fg="white",
+            bg=UI_BACKGROUND_COLOR)
+        self.quit_button = tk.Button(
+            self.ui_playback_control_view,
+            text="Quit",
+            command=self.kill,
+            padx=10, pady=10, font=('calibri', 12),
+            fg="white",
+            bg=UI_BACKGROUND_COLOR)
+        self.pause_button.grid(column=0, row=0, padx=10, pady=10)
+        self.mute_button.grid(column=1, row=0, padx=10, pady=10)
+        self.next_button.grid(column=2, row=0, padx=10, pady=10)
+        self.reload_csv_button.grid(column=3, row=0, padx=10, pady=10)
+        self.reindex_button.grid(column=4, row=0, padx=10, pady=10)
+        self.quit_button.grid(column=5, row=0, padx=10, pady=10)
+        self.ui_playback_control_view.pack(side=tk.TOP,  fill=tk.BOTH)
+
+        self.bottom_view = tk.Frame(self.ui_sequence_manager,
+                                    background=UI_BACKGROUND_COLOR)
+        self.bottom_view.pack(fill=tk.BOTH, expand=1)
+
+        self.listviews = self.ListViews(self.bottom_view, self.ui_dispatcher)
+
+    def _on_paused(self):
+        if self._pause_refresh_timer is None:
+            self._pause_refresh_timer = \
+                self.scheduler.call_every(1, self._refresh_while_paused)
+
+    def _refresh_transitions(self):
+        """! Displays the percentiles of the transitions durations """
+        self.transitions_label.configure(
+            text="\n".join(self.telemetry.format_summary()))
+
+    def _refresh_while_paused(self):
+        """! Refreshes the visible start times every second while paused """
+        if self.is_paused and self.is_running_flag:
+            self.timeline.set_blocks(*self._get_window_snapshot())
+        else:
+            self._pause_refresh_timer.cancel()
+            self._pause_refresh_timer = None
+
+    def _load_plugins(self):
+        """! Loads the plugins of the sequence,
+             with their maintenance tabs
+        """
+        for plugin_name, params in self.sequence_plan.plugins:
+            print_trace_in_ui(f"Load plugin {plugin_name}")
+            self.plugin_manager.add_plugin(
+                plugin_type_factory(plugin_name), params)
+
+        # Add UI plugins
+        tab_control = ttk.Notebook(self.bottom_view)
+        for plugin in self.plugin_manager.get_plugins():
+            if plugin.is_maintenance_frame():
+                print_trace_in_ui("Creating frame for plugin ", plugin.get_name())
+                frame = ttk.Frame(tab_control)
+                plugin.setup(maintenance_frame=frame)
+                tab_control.add(frame, text=plugin.get_name())
+        tab_control.pack(side=tk.RIGHT, expand=1, fill=tk.BOTH)
+
+    # The hooks are called from the sequencer thread : the timeline
+    # and the history are updated from the main loop, with a snapshot
+    # of the blocks and of their start times
+    def _on_blocks_changed(self):
+        self.ui_dispatcher.call(self.timeline.set_blocks,
+                                *self._get_window_snapshot(),
+                                key=(self.timeline, "set_blocks"))
+
+    def _on_schedule_changed(self):
+        self.ui_dispatcher.call(self.timeline.set_blocks,
+                                *self._get_window_snapshot(),
+                                key=(self.timeline, "set_blocks"))
+        super()._on_schedule_changed()
+
+    def _on_video_selected(self, video):
+        self.ui_dispatcher.call(self.timeline.see, video,
+                                key=(self.timeline, "see"))
+
+    def _on_video_played(self, video, time_last_playback):
+        self.ui_dispatcher.call(
+            partial(self.listviews.history_object.add_entry,
+                    timestamp="{:02d}".format(time_last_playback.hour) + ":" +
+                              "{:02d}".format(time_last_playback.minute) + ":" +
+                              "{:02d}".format(time_last_playback.second),
+                    video_name= video.path))
+
+    def _change_video(self, video):
+        """! Asks the new video of a block
+            @param video : the block to modify
+        """
+        if not self._can_change_video(video):
+            return
+        print_trace_in_ui("Change video ", video.index)
+        video_path = filedialog.askopenfilename(
+            title='Select Video',
+            filetypes=[('Video files', '*.mp4')])
+        self.change_video(video, video_path)
+
+    def _destroy_ui(self):
+        self.ui_dispatcher.stop()
+        self.scheduler.stop()
+        self.ui_sequence_manager.destroy()
+        self._ui_tkroot.destroy()
@@ -0,0 +1,370 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Simulation module
+     Runs a sequence without any display, and simulates hours of
+     broadcast in seconds on a virtual clock to report what aired
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from clock import VirtualClock
+from media_library import (MediaLibrary, MEDIA_LIBRARY_FILE_NAME,
+                           get_media_library_path, set_media_library)
+from metadata_manager import MetaDataManager
+from player_backend import SimulatedBackend
+from plugin_manager import PluginManager
+from scheduler import Scheduler
+from sequencer import SequenceManager, MainSequencer, PROGRAM_GUIDE_HOURS
+from ui_player import UiPlayer
+from transition_telemetry import PERCENTILES
+
+# Duration given to the videos that were never probed, in seconds
+DEFAULT_CLIP_DURATION_S = 180
+
+# Methods timed by the simulation : (attribute of the HeadlessManager,
+# method name)
+INSTRUMENTED_CODE_PATHS = (
+    ("sequence_manager", "load_sequence"),
+    ("sequence_manager", "get_next_video"),
+    ("sequence_manager", "_take_lookahead"),
+    ("sequence_manager", "_resolve_blocks"),
+    ("sequence_manager", "_find_random_video"),
+    ("sequence_manager", "_parse_video_length"),
+    ("sequence_manager", "_append_blocks"),
+    ("sequence_manager", "_evict_played_blocks"),
+    ("sequence_manager", "_reconfigure_timestamps"),
+    ("sequence_manager", "_update_program_guide"),
+    ("player", "play"))
+
+
+class HeadlessManager:
+    """! Runs a sequence without any display
+
+         The sequencer and the player run as with the UI, on a player
+         backend that does not need a display, typically a
+         SimulatedBackend for the continuous integration and the benchmarks
+    """
+    backend = None
+    player = None
+    sequence_manager = None
+    sequencer = None
+    # Runs the timers of the components, in its own thread
+    scheduler = None
+
+    def __init__(self, backend, sequence_file, metadata_file=None,
+                 guide_file=None, guide_hours=PROGRAM_GUIDE_HOURS,
+                 on_playback_cb=None):
+        """! Creates the components, the sequence is loaded by run()
+            @param backend : the PlayerBackend playing the sequence
+            @param sequence_file : path of the sequence file
+            @param metadata_file : path of the metadata file, None if none
+            @param on_playback_cb : called with (path, start timestamp,
+                                    end timestamp) after each playback
+        """
+        self.backend = backend
+        metadata_manager = None
+        if metadata_file is not None and os.path.isfile(metadata_file):
+            metadata_manager = MetaDataManager(path=metadata_file)
+        self.scheduler = Scheduler(backend.get_clock())
+        plugin_manager = PluginManager(clock=backend.get_clock(),
+                                       scheduler=self.scheduler)
+
+        self.player = UiPlayer(tkroot=None,
+                               backend=backend,
+                               metadata_manager=metadata_manager,
+                               plugin_manager=plugin_manager,
+                               scheduler=self.scheduler)
+        self.sequence_manager = SequenceManager(
+            backend=backend,
+            ui_player=self.player,
+            path=sequence_file,
+            metadata_manager=metadata_manager,
+            plugin_manager=plugin_manager,
+            program_guide_path=guide_file,
+            program_guide_hours=guide_hours)
+        self.sequencer = MainSequencer(
+            ui_player=self.player, ui_sequencer=self.sequence_manager,
+            on_playback_cb=on_playback_cb)
+        self.sequence_manager.set_main_sequencer_stop_cb(self.sequencer.kill)
+
+    def run(self, duration_s):
+        """! Loads and plays the sequence, then stops everything
+            @param duration_s : playback duration, on the backend clock
+        """
+        clock = self.backend.get_clock()
+        # The time waits for the loading
+        clock.take_part()
+        self.sequence_manager.load_sequence()
+        time_end_s = clock.time() + duration_s
+        self.sequencer.launch_sequencer()
+        clock.wait_until(time_end_s)
+        self.sequence_manager.kill()
+        self.scheduler.stop()
+
+
+class SimulationReport:
+    """! What aired during a simulation, and what it cost """
+    # Simulated and real durations of the run, in seconds
+    simulated_duration_s = 0
+    real_duration_s = 0
+    # Path of the clip -> [number of airings, airtime in seconds]
+    clips = {}
+    # List of (path, start timestamp, end timestamp)
+    airings = []
+    # List of (path, start timestamp, seconds since the previous airing,
+    # reselect timeout in seconds) of the clips aired again too early
+    timeout_violations = []
+    # Name of the code path -> [number of calls, real time in seconds]
+    code_paths = {}
+    # Phase of the transitions -> {percentile : real time in seconds}
+    transitions = {}
+    nb_transitions = 0
+
+    def __init__(self):
+        """! Creates an empty report """
+        self.simulated_duration_s = 0
+        self.real_duration_s = 0
+        self.clips = {}
+        self.airings = []
+        self.timeout_violations = []
+        self.code_paths = {}
+        self.transitions = {}
+        self.nb_transitions = 0
+        # The code paths are timed from the sequencer and lookahead threads
+        self._lock = threading.Lock()
+
+    def add_airing(self, path, time_start_s, time_end_s):
+        """! Adds the playback of a clip """
+        clip = self.clips.setdefault(path, [0, 0])
+        clip[0] = clip[0] + 1
+        clip[1] = clip[1] + time_end_s - time_start_s
+        self.airings.append((path, time_start_s, time_end_s))
+
+    def add_timeout_violation(self, path, time_start_s, elapsed_s, timeout_s):
+        """! Adds a clip aired again before its reselect timeout """
+        self.timeout_violations.append(
+            (path, time_start_s, elapsed_s, timeout_s))
+
+    def add_code_path_time(self, code_path, duration_s):
+        """! Adds a call of a code path and its real duration """
+        with self._lock:
+            calls = self.code_paths.setdefault(code_path, [0, 0])
+            calls[0] = calls[0] + 1
+            calls[1] = calls[1] + duration_s
+
+    def get_airtime(self):
+        """! Returns the total airtime in seconds """
+        return sum(clip[1] for clip in self.clips.values())
+
+    def to_dict(self):
+        """! Returns the report as a JSON serializable dictionary """
+        return {
+            "simulated_duration_s": self.simulated_duration_s,
+            "real_duration_s": self.real_duration_s,
+            "airtime_s": self.get_airtime(),
+            "clips": [{"path": path, "airings": clip[0], "airtime_s": clip[1]}
+                      for path, clip in sorted(self.clips.items())],
+            "airings": [{"path": path, "start": time_start_s,
+                         "end": time_end_s}
+                        for path, time_start_s, time_end_s in self.airings],
+            "timeout_violations": [
+                {"path": path, "start": time_start_s,
+                 "elapsed_s": elapsed_s, "timeout_s": timeout_s}
+                for path, time_start_s, elapsed_s, timeout_s
+                in self.timeout_violations],
+            "code_paths": [{"name": name, "calls": calls[0],
+                            "real_time_s": calls[1]}
+                           for name, calls in sorted(self.code_paths.items())],
+            "transitions": [{"phase": phase,
+                             "percentiles_s": {str(percentile): duration_s
+                                               for percentile, duration_s
+                                               in percentiles.items()}}
+                            for phase, percentiles in self.transitions.items()]}
+
+    def __str__(self):
+        lines = [
+            "Simulated {:.2f} h in {:.2f} s : {} airings of {} clips, "
+            "{:.2f} h of airtime".format(
+                self.simulated_duration_s / 3600, self.real_duration_s,
+                len(self.airings), len(self.clips),
+                self.get_airtime() / 3600),
+            "",
+            "Airtime per clip :",
+            "{:>8} {:>10}  {}".format("airings", "airtime", "clip")]
+        for path, clip in sorted(self.clips.items(),
+                                 key=lambda item: (-item[1][1], item[0])):
+            minutes, seconds = divmod(int(clip[1]), 60)
+            lines.append("{:>8} {:>7d}:{:02d}  {}".format(
+                clip[0], minutes, seconds, path))
+
+        lines.append("")
+        lines.append(f"Timeout violations : {len(self.timeout_violations)}")
+        for path, time_start_s, elapsed_s, timeout_s \
+                in self.timeout_violations:
+            lines.append("  {} {} aired again after {:.1f} min, "
+                         "timeout {:.0f} min".format(
+                             datetime.fromtimestamp(time_start_s)
+                             .strftime('%Y-%m-%d %H:%M:%S'),
+                             path, elapsed_s / 60, timeout_s / 60))
+
+        lines.append("")
+        lines.append("Real time per code path, callees included :")
+        lines.append("{:>8} {:>10} {:>10}  {}".format(
+            "calls", "total ms", "mean ms", "code path"))
+        for name, calls in sorted(self.code_paths.items(),
+                                  key=lambda item: -item[1][1]):
+            lines.append("{:>8} {:>10.1f} {:>10.3f}  {}".format(
+                calls[0], calls[1] * 1000, calls[1] * 1000 / calls[0], name))
+
+        lines.append("")
+        lines.append(f"Real time of the {self.nb_transitions} transitions :")
+        lines.append("".join("{:>8}".format(f"p{percentile} ms")
+                             for percentile in PERCENTILES) + "  phase")
+        for phase, percentiles in self.transitions.items():
+            lines.append("".join("{:>8.2f}".format(
+                percentiles[percentile] * 1000)
+                                 for percentile in PERCENTILES) + "  " + phase)
+        return "\n".join(lines)
+
+
+class Simulation:
+    """! Simulates the broadcast of a sequence on a virtual clock
+
+         The sequence runs headless on the SimulatedBackend : the videos
+         last the duration stored in the media library, or a default
+         one if they were never probed, and a day of sequencing
+         takes seconds. The application media library is not modified,
+         the simulation works on a copy.
+    """
+    sequence_file = ""
+    metadata_file = None
+    # Path of the clip -> duration in seconds, on top of the media library
+    durations = {}
+    default_clip_duration_s = DEFAULT_CLIP_DURATION_S
+    start_time_s = None
+    report = None
+    # Path of the clip -> start timestamp of its last airing
+    _last_airings = {}
+    _headless_manager = None
+
+    def __init__(self, sequence_file, metadata_file=None, durations=None,
+                 default_clip_duration_s=DEFAULT_CLIP_DURATION_S,
+                 start_time_s=None):
+        """! Initialize the simulation
+            @param sequence_file : path of the sequence file
+            @param metadata_file : path of the metadata file, None if none
+            @param durations : dictionary of clip paths and durations
+                               in seconds, overriding the media library
+            @param default_clip_duration_s : duration of the clips
+                                             that were never probed
+            @param start_time_s : timestamp of the beginning of the
+                                  simulation, now by default
+        """
+        self.sequence_file = sequence_file
+        self.metadata_file = metadata_file
+        self.durations = dict(durations or {})
+        self.default_clip_duration_s = default_clip_duration_s
+        self.start_time_s = start_time_s
+        self.report = None
+        self._last_airings = {}
+        self._headless_manager = None
+
+    def _instrument(self, component, method_name):
+        """! Replaces a method of a component by a version timing
+             each call in the report
+        """
+        method = getattr(component, method_name)
+        code_path = type(component).__name__ + "." + method_name
+        report = self.report
+
+        def timed_method(*args, **kwargs):
+            time_start_s = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                report.add_code_path_time(
+                    code_path, time.perf_counter() - time_start_s)
+        setattr(component, method_name, timed_method)
+
+    def _on_playback(self, path, time_start_s, time_end_s):
+        """! Records an airing, and checks it against the reselect
+             timeout of its random video block
+        """
+        self.report.add_airing(path, time_start_s, time_end_s)
+        sequence_manager = self._headless_manager.sequence_manager
+        block = sequence_manager.sequence_window[
+            sequence_manager.index_playing_video]
+        if block.block_type == "randomvideo":
+            timeout_s = int(block.block_args[1]) * 60
+            time_last_airing_s = self._last_airings.get(path)
+            if time_last_airing_s is not None and \
+               time_start_s - time_last_airing_s < timeout_s:
+                self.report.add_timeout_violation(
+                    path, time_start_s, time_start_s - time_last_airing_s,
+                    timeout_s)
+        self._last_airings[path] = time_start_s
+
+    def run(self, duration_s):
+        """! Simulates the broadcast
+            @param duration_s : simulated duration in seconds
+            @return the SimulationReport
+        """
+        self.report = SimulationReport()
+        self._last_airings = {}
+        working_directory = tempfile.mkdtemp(prefix="vlcsequencer_sim_")
+        library_path = working_directory + "/" + MEDIA_LIBRARY_FILE_NAME
+        if os.path.isfile(get_media_library_path()):
+            shutil.copyfile(get_media_library_path(), library_path)
+        library = MediaLibrary(library_path)
+        set_media_library(library)
+
+        durations = library.get_probed_durations()
+        durations.update(self.durations)
+        clock = VirtualClock(start_time_s=self.start_time_s)
+        backend = SimulatedBackend(
+            durations, clock, default_duration=self.default_clip_duration_s)
+        time_start_s = clock.time()
+        real_time_start_s = time.perf_counter()
+        # The traces of a day of sequencing are not worth printing
+        with open(os.devnull, "w", encoding="utf-8") as devnull, \
+             contextlib.redirect_stdout(devnull):
+            try:
+                self._headless_manager = HeadlessManager(
+                    backend, self.sequence_file, self.metadata_file,
+                    on_playback_cb=self._on_playback)
+                for component_name, method_name in INSTRUMENTED_CODE_PATHS:
+                    self._instrument(
+                        getattr(self._headless_manager, component_name),
+                        method_name)
+                self._headless_manager.run(duration_s)
+                telemetry = self._headless_manager.sequencer.telemetry
+                self.report.transitions = telemetry.get_summary()
+                self.report.nb_transitions = telemetry.get_nb_records()
+            finally:
+                library.close()
+                set_media_library(None)
+                shutil.rmtree(working_directory, ignore_errors=True)
+        self.report.simulated_duration_s = clock.time() - time_start_s
+        self.report.real_duration_s = time.perf_counter() - real_time_start_s
+        return self.report
@@ -0,0 +1,231 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Transition telemetry module
+     Timing of each phase of the transitions between two clips
+"""
+import collections
+import math
+import threading
+import time
+
+from logger import print_trace_in_ui
+
+# Phases of a transition, in order. Each one is marked when it is done
+# The previous clip ended, or the playback starts
+PHASE_ENDED = "ended"
+# The sequence gave the next video : resolution, probing
+PHASE_NEXT_VIDEO = "next_video"
+# The media is created, or prepared already
+PHASE_MEDIA_NEW = "media_new"
+# The media is given to the player
+PHASE_SET_MEDIA = "set_media"
+# The player plays, from the beginning timestamp given to the media
+PHASE_PLAY = "play"
+# The plugins are notified of the beginning
+PHASE_PLUGINS = "plugins"
+PHASES = (PHASE_ENDED, PHASE_NEXT_VIDEO, PHASE_MEDIA_NEW, PHASE_SET_MEDIA,
+          PHASE_PLAY, PHASE_PLUGINS)
+# Name of the summary of the whole transitions
+TOTAL = "total"
+
+# Number of transitions kept in memory
+RING_SIZE = 500
+PERCENTILES = (50, 95, 99)
+# SQLite table of the transitions
+TABLE_NAME = "TRANSITIONS"
+
+
+def get_percentile(sorted_values, percentile):
+    """! Returns a percentile of values, by the nearest rank
+        @param sorted_values : values in ascending order, not empty
+        @param percentile : between 0 and 100
+    """
+    rank = max(math.ceil(percentile / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class TransitionRecord:
+    """! Timing of a transition, from the end of a clip to the
+         beginning of the next one
+    """
+    # Path of the next clip, None until known
+    path = None
+    # Clock timestamp of the beginning of the transition
+    time_s = 0
+    # True if the next clip was prepared on the idle player
+    is_prerolled = False
+    # Phase -> monotonic timestamp of its end
+    _marks = {}
+
+    def __init__(self, time_s):
+        self.path = None
+        self.time_s = time_s
+        self.is_prerolled = False
+        self._marks = {PHASE_ENDED: time.monotonic()}
+
+    def mark(self, phase):
+        """! Marks the end of a phase now """
+        self._marks[phase] = time.monotonic()
+
+    def get_phase_durations(self):
+        """! Returns the durations of the phases marked, in seconds
+            @return a dictionary phase -> duration, with the TOTAL one
+        """
+        durations = {}
+        time_previous_s = self._marks[PHASE_ENDED]
+        for phase in PHASES[1:]:
+            if phase in self._marks:
+                durations[phase] = self._marks[phase] - time_previous_s
+                time_previous_s = self._marks[phase]
+        durations[TOTAL] = time_previous_s - self._marks[PHASE_ENDED]
+        return durations
+
+
+class TransitionTelemetry:
+    """! Records the transitions between the clips
+
+        The sequencer and the player mark the phases of the running
+        transition on a monotonic clock, so the records measure the
+        real time taken even on a virtual clock. The last transitions
+        are kept in a ring for the percentiles summary, and each one is
+        stored in a SQLite table if a DataManager is given.
+    """
+    # Finished records, the oldest dropped first
+    records = None
+    # Running record, None between two transitions
+    _record = None
+    # DataManager storing the records, None to keep them in memory only
+    _data_manager = None
+    # Called with each finished record, from the sequencer thread
+    on_record_cb = None
+
+    def __init__(self, data_manager=None, ring_size=RING_SIZE):
+        """! Creates the telemetry
+            @param data_manager : DataManager of the TRANSITIONS table,
+                                  None to keep the records in memory only
+            @param ring_size : number of records kept in memory
+        """
+        self.records = collections.deque(maxlen=ring_size)
+        self._record = None
+        self._data_manager = data_manager
+        self.on_record_cb = None
+        self._lock = threading.Lock()
+        if data_manager is not None:
+            columns = ["TIMESTAMP", "PATH", "PREROLLED"] + \
+                [phase.upper() + "_MS" for phase in PHASES[1:]] + \
+                [TOTAL.upper() + "_MS"]
+            table_columns = data_manager.get_table_columns(TABLE_NAME)
+            if table_columns and table_columns != columns:
+                # Recorded with other phases, kept aside
+                old_table_name = TABLE_NAME + "_" + str(int(time.time()))
+                print_trace_in_ui("The transitions table has other phases,"
+                                  " renamed to ", old_table_name)
+                data_manager.rename_table(TABLE_NAME, old_table_name)
+                table_columns = []
+            if not table_columns:
+                data_manager.create_table(TABLE_NAME, columns)
+
+    def set_on_record_cb(self, on_record_cb):
+        """! Sets the callback called with each finished record """
+        self.on_record_cb = on_record_cb
+
+    def begin(self, time_s):
+        """! Begins a transition, the previous clip just ended
+            @param time_s : clock timestamp of the end
+        """
+        with self._lock:
+            self._record = TransitionRecord(time_s)
+
+    def mark(self, phase, path=None, is_prerolled=None):
+        """! Marks the end of a phase of the running transition, if any
+            @param path : path of the next clip, if known now
+            @param is_prerolled : True if the clip was prepared
+        """
+        with self._lock:
+            if self._record is None:
+                return
+            self._record.mark(phase)
+            if path is not None:
+                self._record.path = path
+            if is_prerolled is not None:
+                self._record.is_prerolled = is_prerolled
+
+    def end(self):
+        """! Ends the running transition, the next clip plays """
+        with self._lock:
+            record = self._record
+            self._record = None
+            if record is None:
+                return
+            self.records.append(record)
+        if self._data_manager is not None:
+            durations = record.get_phase_durations()
+            # The table is created by __init__, the record is only queued
+            # to the data thread, not to wait for it on the player thread
+            self._data_manager.insert_entries(TABLE_NAME, [
+                (record.time_s, record.path, int(record.is_prerolled)) +
+                tuple(round(durations[phase] * 1000, 3)
+                      if phase in durations else None
+                      for phase in PHASES[1:] + (TOTAL,))],
+                check_table=False)
+        print_trace_in_ui("Transition to ", record.path, " in ",
+                          "{:.1f}".format(
+                              record.get_phase_durations()[TOTAL] * 1000),
+                          " ms")
+        if self.on_record_cb is not None:
+            self.on_record_cb(record)
+
+    def get_summary(self):
+        """! Returns the percentiles of the durations of the phases, over
+             the records in memory
+            @return a dictionary phase -> {percentile : duration in
+                    seconds}, with the TOTAL one. Empty without records
+        """
+        with self._lock:
+            records = list(self.records)
+        phase_durations = collections.defaultdict(list)
+        for record in records:
+            for phase, duration_s in record.get_phase_durations().items():
+                phase_durations[phase].append(duration_s)
+        summary = {}
+        for phase in PHASES[1:] + (TOTAL,):
+            if phase in phase_durations:
+                durations = sorted(phase_durations[phase])
+                summary[phase] = {percentile:
+                                  get_percentile(durations, percentile)
+                                  for percentile in PERCENTILES}
+        return summary
+
+    def get_nb_records(self):
+        """! Returns the number of records in memory """
+        with self._lock:
+            return len(self.records)
+
+    def format_summary(self):
+        """! Returns the summary as lines of text, in milliseconds """
+        summary = self.get_summary()
+        lines = ["{:<14}".format(f"{self.get_nb_records()} transitions") +
+                 "".join("{:>9}".format(f"p{percentile} ms")
+                         for percentile in PERCENTILES)]
+        for phase, percentiles in summary.items():
+            lines.append("{:<14}".format(phase) +
+                         "".join("{:>9.1f}".format(
+                             percentiles[percentile] * 1000)
+                                 for percentile in PERCENTILES))
+        return lines
@@ -0,0 +1,136 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! UI dispatcher module
+     Queue of the UI updates asked by the worker threads,
+     applied from the tkinter main loop
+"""
+import itertools
+import threading
+import time
+
+from logger import print_trace_in_ui
+
+# Period of the frames applying the updates, in seconds
+FRAME_PERIOD_S = 1 / 60
+# Real time given to the updates in a frame, in seconds
+FRAME_BUDGET_S = 0.008
+
+
+class UiDispatcher:
+    """! Applies the UI updates in the thread of the scheduler
+
+        Tkinter widgets must only be used from the main loop : the
+        worker threads queue their updates instead, from any thread.
+        The queue is drained once per frame by the scheduler, running in
+        the main loop, within a budget of real time : what is left goes
+        to the next frame, so that a burst of updates cannot freeze the UI.
+
+        The updates with the same key are coalesced : a later one replaces
+        the queued one, keeping its place in the queue. So only the last
+        text of a label asked during a frame is drawn.
+    """
+    scheduler = None
+    frame_period_s = FRAME_PERIOD_S
+    frame_budget_s = FRAME_BUDGET_S
+    # Key -> (callback, args) of the queued updates, in order
+    _updates = {}
+    # Scheduler timer of the next frame, None if nothing is queued
+    _frame_timer = None
+    # Number of updates replaced by a later one, and applied
+    nb_coalesced = 0
+    nb_applied = 0
+
+    def __init__(self, scheduler, frame_period_s=FRAME_PERIOD_S,
+                 frame_budget_s=FRAME_BUDGET_S):
+        """! Creates the dispatcher
+            @param scheduler : Scheduler running in the tkinter main loop
+            @param frame_period_s : period of the frames
+            @param frame_budget_s : real time given to the updates per frame
+        """
+        self.scheduler = scheduler
+        self.frame_period_s = frame_period_s
+        self.frame_budget_s = frame_budget_s
+        self._updates = {}
+        self._frame_timer = None
+        self.nb_coalesced = 0
+        self.nb_applied = 0
+        self._lock = threading.Lock()
+        # Unique keys of the updates that are not coalesced
+        self._counter = itertools.count()
+
+    def call(self, callback, *args, key=None):
+        """! Queues callback(*args) for the next frame
+            @param key : hashable identifying the update, replacing the
+                         queued update with the same key. None to never
+                         coalesce it
+        """
+        if key is None:
+            key = next(self._counter)
+        with self._lock:
+            if key in self._updates:
+                self.nb_coalesced = self.nb_coalesced + 1
+            self._updates[key] = (callback, args)
+            if self._frame_timer is None:
+                self._frame_timer = self.scheduler.call_later(
+                    self.frame_period_s, self._on_frame)
+
+    def configure(self, widget, **options):
+        """! Queues widget.configure(**options), each option of the widget
+             keeping the last value asked only
+        """
+        for option, value in options.items():
+            self.call(self._configure, widget, option, value,
+                      key=(widget, "configure", option))
+
+    @staticmethod
+    def _configure(widget, option, value):
+        """! Sets one option of a widget """
+        widget.configure(**{option: value})
+
+    def _on_frame(self):
+        """! Applies the queued updates, within the frame budget """
+        time_limit_s = time.perf_counter() + self.frame_budget_s
+        while True:
+            with self._lock:
+                if not self._updates:
+                    self._frame_timer = None
+                    return
+                if time.perf_counter() >= time_limit_s:
+                    # What is left goes to the next frame
+                    self._frame_timer = self.scheduler.call_later(
+                        self.frame_period_s, self._on_frame)
+                    return
+                key = next(iter(self._updates))
+                (callback, args) = self._updates.pop(key)
+                self.nb_applied = self.nb_applied + 1
+            try:
+                callback(*args)
+            # A widget may be destroyed already, the next updates
+            # must be applied anyway
+            except Exception as error: # pylint: disable=broad-except
+                print_trace_in_ui("ERR ! UI update ", callback,
+                                  " failed : ", repr(error))
+
+    def stop(self):
+        """! Drops the queued updates """
+        with self._lock:
+            self._updates = {}
+            if self._frame_timer is not None:
+                self._frame_timer.cancel()
+                self._frame_timer = None
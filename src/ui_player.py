@@ -20,13 +20,33 @@
      Displays the videos and different plugins overlays
 """
 import tkinter as tk
-import threading
-import time
-import sys
+from functools import partial
 
 # Application related imports
 from colors import UI_BACKGROUND_COLOR
 from logger import print_trace_in_ui
+from player_backend import (EVENT_END_REACHED, EVENT_POSITION_CHANGED,
+                            EVENT_ERROR)
+from volume_automation import VolumeAutomation, CURVE_EQUAL_POWER
+from audio_analysis import FULL_VOLUME, get_gain_volume, get_trim_points
+from media_library import get_media_library
+from scheduler import Scheduler
+from ui_dispatcher import UiDispatcher
+from transition_telemetry import (PHASE_MEDIA_NEW, PHASE_SET_MEDIA, PHASE_PLAY,
+                                  PHASE_PLUGINS)
+
+# Time left to the player to notify the end of a media, past its length
+END_EVENT_MARGIN_S = 1
+# Gap between the playback time and the timer that arms the timer again,
+# after a seek or a resume
+POSITION_JUMP_S = 0.5
+# Time before the end of a video when the next one is prepared
+PREROLL_LEAD_S = 5
+# Default duration of the fades in and out
+FADE_DURATION_S = 10
+# Time before the fade in of a media that is not prepared, for the vlc
+# instance to set the volume
+FADE_IN_DELAY_S = 0.5
 
 class UiPlayer():
     """! Main UI Window
@@ -38,6 +58,9 @@ class UiPlayer():
         This enable the audio crossfade capabilities
 
         In the future, different transitions may be added to the program, even visual ones.
+
+        Without a tkinter root, nothing is displayed : the player only
+        times the playbacks, for the runs without a display.
     """
     # Main window
     window = None
@@ -46,22 +69,47 @@ class UiPlayer():
     is_running_flag = False     # Flag to kill application carefully
     is_muted = False
 
-    vlc_instance = None
+    # Player backend creating the media and the media players
+    backend = None
+    # Clock the playback is timed with
+    clock = None
+    # Scheduler of the timed activities
+    scheduler = None
+    # Applies the UI updates and the plugins hooks in the main loop
+    ui_dispatcher = None
     metadata_manager = None
     plugin_manager = None
     nb_video_played = 0
     is_next_asked = False
     is_paused = False
 
-    fade_out_thread = None
-    fade_in_thread  = None
-    fade_out_thread_active = False
-    fade_in_thread_active  = False
+    # Volumes of the players, and their fades
+    volume_automation = None
+    fade_duration_s = FADE_DURATION_S
+    fade_curve = CURVE_EQUAL_POWER
+
+    # Set by the player events and the controls, wakes up the playback
+    _playback_event = None
+    # Set when the active media ended, or failed
+    _is_media_ended = False
+    _is_media_error = False
+    # Playback time of the active media and clock time when it was read,
+    # None out of the playbacks
+    _sync_media_time_s = None
+    _sync_clock_s = None
+
+    # Returns (path, length in seconds) of the next video to prepare
+    next_video_cb = None
+    # Path of the video prepared on the idle player, None if none
+    _preroll_path = None
+    # TransitionTelemetry marking the phases of the transitions, None if none
+    telemetry = None
 
     class MediaFrame:
-        """! Structure that links a Tkinter frame with a Vlc media player """
-        media_player = None  # A Vlc media player
-        ui_frame = None     # Tkinter frame
+        """! Structure that links a Tkinter frame with a media player """
+        media_player = None  # A media player of the backend
+        ui_frame = None     # Tkinter frame, None without a display
+        window_id = None    # Window id of the frame, for the player
 
         def __init__(self, media_player, ui_frame):
             self.media_player = media_player
@@ -69,13 +117,23 @@ class UiPlayer():
 
     media_frames = None  # List (tuple) of media frames
 
-    def __init__(self, tkroot, vlc_instance, metadata_manager, plugin_manager):
-        """! Initialize the main display window """
+    def __init__(self, tkroot, backend, metadata_manager, plugin_manager,
+                 scheduler=None, ui_dispatcher=None):
+        """! Initialize the main display window
+            @param tkroot : the tkinter root, None to play without a display
+            @param backend : the PlayerBackend playing the media
+            @param scheduler : Scheduler of the fades, a new one by default
+            @param ui_dispatcher : UiDispatcher of the scheduler,
+                                   a new one by default
+        """
         # Main window initialisation
         self.window = tkroot
-        self.window.title("MainUI")
-        self.window.geometry("400x300")
-        self.vlc_instance = vlc_instance
+        self.backend = backend
+        self.clock = backend.get_clock()
+        self.scheduler = scheduler if scheduler is not None else \
+            Scheduler(self.clock, tkroot)
+        self.ui_dispatcher = ui_dispatcher if ui_dispatcher is not None \
+            else UiDispatcher(self.scheduler)
         self.metadata_manager = metadata_manager
         self.plugin_manager = plugin_manager
 
@@ -83,171 +141,302 @@ class UiPlayer():
         self.is_paused = False
         self.nb_video_played = 0
 
-        self.fade_out_thread_active = False
-        self.fade_in_thread_active = False
+        self.fade_duration_s = FADE_DURATION_S
+        self.fade_curve = CURVE_EQUAL_POWER
+        self.volume_automation = VolumeAutomation(self.scheduler)
         # 2 players (one for each frame)
         # Initialize media frames with the players and new tk frames.
-        self.media_frames = (self.MediaFrame(self.vlc_instance.media_player_new(),
-                                             tk.Frame(self.window,
-                                                      bg=UI_BACKGROUND_COLOR,
-                                                      width=200,
-                                                      height=150)),
-                             self.MediaFrame(self.vlc_instance.media_player_new(),
-                                             tk.Frame(self.window,
-                                                      bg=UI_BACKGROUND_COLOR,
-                                                      width=200,
-                                                      height=150)))
-        for i, _ in enumerate(self.media_frames):
-            self.media_frames[i].ui_frame.pack(fill="both", expand=True)
-
-        def toggle_full_screen(*unused):
-            self.window.attributes("-fullscreen", not self.is_fullscreen_flag)
-            self.is_fullscreen_flag = not self.is_fullscreen_flag
-        self.window.bind("<F11>", toggle_full_screen)
+        self.media_frames = (self.MediaFrame(self.backend.media_player_new(),
+                                             None),
+                             self.MediaFrame(self.backend.media_player_new(),
+                                             None))
+        self._playback_event = self.clock.new_event()
+        self._is_media_ended = False
+        self._is_media_error = False
+        self._sync_media_time_s = None
+        self._sync_clock_s = None
+        self.next_video_cb = None
+        self._preroll_path = None
+        self.telemetry = None
+        for index, media_frame in enumerate(self.media_frames):
+            media_frame.media_player.event_attach(
+                EVENT_END_REACHED, partial(self._on_media_ended, index, False))
+            media_frame.media_player.event_attach(
+                EVENT_ERROR, partial(self._on_media_ended, index, True))
+            media_frame.media_player.event_attach(
+                EVENT_POSITION_CHANGED,
+                partial(self._on_position_changed, index))
+        if self.window is not None:
+            self.window.title("MainUI")
+            self.window.geometry("400x300")
+            for media_frame in self.media_frames:
+                media_frame.ui_frame = tk.Frame(self.window,
+                                                bg=UI_BACKGROUND_COLOR,
+                                                width=200,
+                                                height=150)
+                media_frame.ui_frame.pack(fill="both", expand=True)
+                # Read from the main loop, the players are set up
+                # from the playback thread
+                media_frame.window_id = media_frame.ui_frame.winfo_id()
+
+            def toggle_full_screen(*unused):
+                self.window.attributes("-fullscreen", not self.is_fullscreen_flag)
+                self.is_fullscreen_flag = not self.is_fullscreen_flag
+            self.window.bind("<F11>", toggle_full_screen)
         self.is_running_flag = True
 
+    def _on_media_ended(self, index_media_players, is_error):
+        """! Called by a player at the end of its media, or on an error
+            @param index_media_players : index of the media frame
+            @param is_error : True if the media could not be played
+        """
+        # The other player may be fading out its media
+        if index_media_players != self.nb_video_played % 2:
+            return
+        self._is_media_error = self._is_media_error or is_error
+        self._is_media_ended = True
+        self._playback_event.set()
+
+    def _on_position_changed(self, index_media_players):
+        """! Called by a player when its playback time moves, wakes up
+             the playback to arm the end timer again if it jumped
+            @param index_media_players : index of the media frame
+        """
+        if index_media_players != self.nb_video_played % 2 or \
+           self._sync_clock_s is None:
+            return
+        player = self.media_frames[index_media_players].media_player
+        expected_time_s = self._sync_media_time_s + \
+            self.clock.time() - self._sync_clock_s
+        if abs(player.get_time() / 1000 - expected_time_s) > POSITION_JUMP_S:
+            self._playback_event.set()
+
+    def set_next_video_cb(self, next_video_cb):
+        """! Sets the callback giving the next video, prepared ahead
+            @param next_video_cb : returns (path, length in seconds) of
+                                   the next video, (None, None) if it is
+                                   not known yet
+        """
+        self.next_video_cb = next_video_cb
+
+    def set_telemetry(self, telemetry):
+        """! Sets the TransitionTelemetry of the transitions, whose
+             running transition is ended once the plugins are notified
+        """
+        self.telemetry = telemetry
+
+    def _mark_transition(self, phase, **kwargs):
+        """! Marks a phase of the running transition, if any """
+        if self.telemetry is not None:
+            self.telemetry.mark(phase, **kwargs)
+
+    def set_fades(self, fade_duration_s, fade_curve):
+        """! Sets how the videos fade in and out, when their metadata ask
+            @param fade_duration_s : duration of a fade
+            @param fade_curve : one of volume_automation.CURVES
+        """
+        self.fade_duration_s = fade_duration_s
+        self.fade_curve = fade_curve
+
+    def _get_metadata(self, path):
+        """! Returns the metadata of a video, None if there is none """
+        if self.metadata_manager is None:
+            return None
+        return self.metadata_manager.get_metadata(
+            video_name=path.split("/").pop())
+
+    def _preroll_next_video(self):
+        """! Prepares the next video on the idle player : opened, seeked
+             to its beginning and buffered paused, so that the switch
+             to it is instantaneous
+            @return True once done, False to try again later
+        """
+        if self.next_video_cb is None:
+            return True
+        media_frame = self.media_frames[(self.nb_video_played + 1) % 2]
+        player = media_frame.media_player
+        if self.volume_automation.is_ramping(player):
+            # The idle player still fades out the previous video
+            return False
+        (path, unused_length_s) = self.next_video_cb()
+        if path is None:
+            return False
+
+        media = self._new_media(path, self._get_metadata(path))
+        media.add_option(":start-paused")
+
+        self.volume_automation.set_volume(player, 0)
+        player.set_media(media)
+        if self.window is not None:
+            player.set_window(media_frame.window_id)
+        player.play()
+        self._preroll_path = path
+        print_trace_in_ui("Next video prepared : ", path)
+        return True
+
+    def _new_media(self, path, metadata):
+        """! Creates the media of a video, cut at its trim points
+            @param path : Path to the video file
+            @param metadata : MetaDataEntry of the video, None if none
+
+            libvlc opens the media at its beginning timestamp and stops
+            it at its end one, so no frame out of them is ever shown
+        """
+        media = self.backend.media_new(path)
+        (begin_s, end_s) = get_trim_points(path, metadata)
+        if begin_s > 0:
+            media.add_option(":start-time=" + str(begin_s))
+        if end_s > 0:
+            # The fade out goes on past the end timestamp, crossfading
+            if metadata is not None and metadata.fade_out:
+                end_s = end_s + self.fade_duration_s
+            media.add_option(":stop-time=" + str(end_s))
+        return media
+
     def _play_on_specific_frame(self, media, index_media_players, length_s,
-                                metadata = None):
+                                metadata = None, trim_points = (0, 0),
+                                volume = FULL_VOLUME):
         """! Main play function.
-            @param media : The Vlc Media instance
+            @param media : The media created by the backend, None if
+                           it is prepared on the player already
             @param index_media_players the index of the media frame to use this time
+            @param trim_points : (begin, end) timestamps of the playback,
+                                 the end is 0 for the end of the media
+            @param volume : volume of the player, equalizing the video
 
             Handles audio crossfading and frame switching accordingly
         """
+        (unused_begin_s, end_s) = trim_points
         if metadata is None:
-            begin_s=0
-            end_s=0
             fade_in=False
             fade_out=False
             artist=None
             song=None
         else:
-            begin_s=metadata.timestamp_begin
-            end_s=metadata.timestamp_end
             fade_in=metadata.fade_in
             fade_out=metadata.fade_out
             artist=metadata.artist
             song=metadata.song
 
         # Getting simpler name from now on
-        frame = self.media_frames[index_media_players].ui_frame
-        player = self.media_frames[index_media_players].media_player
-
-        player.set_media(media)
-        self.window.after(
-            0, lambda: self.media_frames[1 - index_media_players].ui_frame.pack_forget())
-        self.window.after(0, lambda: frame.pack(fill="both", expand=True))
-
-        window_handle = frame.winfo_id()
-        if sys.platform.startswith('win'):
-            player.set_hwnd(window_handle)
-        else:
-            player.set_xwindow(window_handle)
-
-        # Setup the plugins
+        media_frame = self.media_frames[index_media_players]
+        frame = media_frame.ui_frame
+        player = media_frame.media_player
+
+        if media is not None:
+            # Cancels a fade out still running on this player
+            self.volume_automation.set_volume(player, 0)
+            player.set_media(media)
+        self._mark_transition(PHASE_SET_MEDIA)
+        self._is_media_ended = False
+        self._is_media_error = False
+        if self.window is not None:
+            other_frame = self.media_frames[1 - index_media_players].ui_frame
+            self.ui_dispatcher.call(other_frame.pack_forget,
+                                    key=(other_frame, "pack"))
+            self.ui_dispatcher.call(
+                partial(frame.pack, fill="both", expand=True),
+                key=(frame, "pack"))
+            if media is not None:
+                player.set_window(media_frame.window_id)
+
+        # Setup the plugins, their hooks run in the main loop
         for plugin in self.plugin_manager.get_plugins():
-            plugin.setup(player_window = self.window, artist=artist, song=song)
+            self.ui_dispatcher.call(partial(
+                plugin.setup, player_window = self.window,
+                artist=artist, song=song))
 
         if end_s == 0:
             end_s = length_s
+        # The media starts at its beginning timestamp already
         player.play()
+        self._mark_transition(PHASE_PLAY)
+
+        if fade_in:
+            # Let some time for the vlc instance to set the volume,
+            # unless prepared. Fixes high volume spikes
+            self.volume_automation.ramp(
+                player, volume, self.fade_duration_s, curve=self.fade_curve,
+                delay_s=0 if media is None else FADE_IN_DELAY_S)
+        else:
+            self.volume_automation.set_volume(player, volume)
 
-        player.set_position(begin_s/length_s)
-
-        def fade_in_thread():
-            """! Thread to handle fade in on this player"""
-            # The playing video musnt change during the thread !
-            self.fade_in_thread_active = True
-            nb_video_played = self.nb_video_played
-
-            player.audio_set_volume(0)
-            # Let some time for the vlc instance to set the volume. Fixes high volume spikes
-            time.sleep(0.5)
-
-            volume = player.audio_get_volume()
-            while (volume < 100 and self.is_running_flag and not self.is_next_asked
-                   and nb_video_played < self.nb_video_played + 1):
-                print_trace_in_ui("fade_in Volume : ", volume)
-                volume = min(volume + 5, 100)
-                if not self.is_muted:
-                    player.audio_set_volume(volume)
-                while self.is_paused:
-                    # Waiting to get out of pause
-                    time.sleep(1)
-                time.sleep(0.5)
-            self.fade_in_thread_active = False
-
-        def fade_out_thread():
-            """! Thread to handle fade out on this player"""
-            # The playing video musnt change twice during the thread !
-            self.fade_out_thread_active = True
-            nb_video_played = self.nb_video_played
-            volume = player.audio_get_volume()
-            while (volume > 0 and self.is_running_flag and not self.is_next_asked
-                   and self.nb_video_played - nb_video_played < 2):
-                volume = volume - 5
-                player.audio_set_volume(volume)
-                while self.is_paused:
-                    # Waiting to get out of pause
-                    time.sleep(1)
-                time.sleep(0.5)
-            # If we changed 2 times of videos, we're on this player, we better not stop it
-            if self.nb_video_played - nb_video_played != 2:
-                player.stop()
-                self.fade_out_thread_active = False
-
-        # We shouldnt launch multiple concurrent fade_in
-        if fade_in and not self.fade_in_thread_active:
-            self.fade_in_thread = threading.Thread(name="FadeIn Thread", target=fade_in_thread)
-            self.fade_in_thread.start()
-        elif not self.is_muted:
-            player.audio_set_volume(100)
-
-        # Fix : If the end is the actual end, we may never reach it.
+        # The end of the media is notified by the player, the timer
+        # ends the playback at the end timestamp when the media goes
+        # on past it, fading out
         if end_s != length_s:
-            end_position = end_s/length_s
+            time_end_s = end_s
+        elif fade_out:
+            # The fade out ends with the media, over the next video
+            time_end_s = max(length_s - self.fade_duration_s, 0)
         else:
-            end_position = 0.95
-
+            time_end_s = length_s + END_EVENT_MARGIN_S
+        time_preroll_s = min(end_s, time_end_s) - PREROLL_LEAD_S
+        is_next_prerolled = False
 
         for plugin in self.plugin_manager.get_plugins():
-            plugin.on_begin()
+            self.ui_dispatcher.call(plugin.on_begin)
+        self._mark_transition(PHASE_PLUGINS)
+        if self.telemetry is not None:
+            self.telemetry.end()
 
         timer = 0
-        while (player.get_position() < end_position and \
-              self.is_running_flag and not self.is_next_asked):
-            print_trace_in_ui("Current media playing time " +
-                           ("{:.2f}".format(player.get_position()*100))+"%")
-            # Progress the plugins
-            for plugin in self.plugin_manager.get_plugins():
-                plugin.on_progress(timer)
-
-            if (player.get_position() < 0):
-                # Problem on the video
-                player.stop()
-                self.is_next_asked = True
+        time_next_progress_s = self.clock.time()
+        while self.is_running_flag and not self.is_next_asked:
+            self._playback_event.clear()
+            if self._is_media_ended:
                 break
-            time.sleep(1)
-            timer = timer + 1
+            time_now_s = self.clock.time()
+            if time_now_s >= time_next_progress_s:
+                print_trace_in_ui("Current media playing time " +
+                               ("{:.2f}".format(player.get_position()*100))+"%")
+                # Progress the plugins
+                for plugin in self.plugin_manager.get_plugins():
+                    self.ui_dispatcher.call(plugin.on_progress, timer)
+                timer = timer + 1
+                time_next_progress_s = time_next_progress_s + 1
+
+            # Wait for the next plugins progress, the end timestamp,
+            # or an event of the player
+            timeout_s = time_next_progress_s - time_now_s
+            if not self.is_paused:
+                media_time_s = player.get_time() / 1000
+                self._sync_media_time_s = media_time_s
+                self._sync_clock_s = time_now_s
+                if media_time_s >= time_end_s:
+                    break
+                timeout_s = min(timeout_s, time_end_s - media_time_s)
+                # Retried on the next progress until the next video is known
+                if not is_next_prerolled:
+                    if media_time_s >= time_preroll_s:
+                        is_next_prerolled = self._preroll_next_video()
+                    else:
+                        timeout_s = min(timeout_s,
+                                        time_preroll_s - media_time_s)
+            self.clock.wait_event(self._playback_event, timeout_s)
+        self._sync_clock_s = None
+
+        if self._is_media_error:
+            # Problem on the video
+            print_trace_in_ui("ERR ! The video cannot be played")
+            player.stop()
+            self.is_next_asked = True
 
         print_trace_in_ui("End of video")
 
         for plugin in self.plugin_manager.get_plugins():
-            plugin.on_exit()
+            self.ui_dispatcher.call(plugin.on_exit)
 
-        # We shouldnt launch multiple concurrent fade_out
-        if fade_out and not self.fade_out_thread_active:
-            self.fade_out_thread = threading.Thread(name="FadeOut Thread", target=fade_out_thread)
-            self.fade_out_thread.start()
+        # The fade out goes on during the next video, crossfading
+        if fade_out and self.is_running_flag and not self.is_next_asked:
+            self.volume_automation.ramp(player, 0, self.fade_duration_s,
+                                        curve=self.fade_curve,
+                                        on_done_cb=player.stop)
         else:
-            player.audio_set_volume(0)
+            self.volume_automation.set_volume(player, 0)
 
         if not self.is_running_flag:
             print_trace_in_ui("Stopping UI_Player ")
-            if self.fade_in_thread is not None and self.fade_in_thread.is_alive():
-                self.fade_in_thread.join()
-            if self.fade_out_thread is not None and self.fade_out_thread.is_alive():
-                self.fade_out_thread.join()
 
         self.is_next_asked = False
 
@@ -259,26 +448,29 @@ class UiPlayer():
         """
         if self.is_running_flag:
 
-            media = self.vlc_instance.media_new(path)
+            # Try to get metadata about this video, and its analysis
+            metadata = self._get_metadata(path)
+
+            # The video may be prepared on the idle player already
+            if path == self._preroll_path:
+                media = None
+            else:
+                media = self._new_media(path, metadata)
+            self._preroll_path = None
+            self._mark_transition(PHASE_MEDIA_NEW, is_prerolled=media is None)
 
             self.nb_video_played = self.nb_video_played + 1
 
             print_trace_in_ui("Total video played ",self.nb_video_played)
             print_trace_in_ui("Playing on frame number ",self.nb_video_played % 2)
 
-            # Try to get metadata about this video
-            name_of_file = path.split("/").pop()
-            metadata = None
-            if self.metadata_manager is not None:
-                metadata = self.metadata_manager.get_metadata(
-                    video_name=name_of_file)
-            if metadata is not None:
-                self._play_on_specific_frame(media, index_media_players=self.nb_video_played % 2,
-                                             length_s=length_s,
-                                             metadata=metadata)
-            else:
-                self._play_on_specific_frame(
-                    media, index_media_players=self.nb_video_played % 2,  length_s=length_s)
+            entry = get_media_library().get_entry(path)
+            volume = get_gain_volume(
+                entry.audio_analysis if entry is not None else None)
+            self._play_on_specific_frame(
+                media, index_media_players=self.nb_video_played % 2,
+                length_s=length_s, metadata=metadata,
+                trim_points=get_trim_points(path, metadata), volume=volume)
 
     def _get_active_media_player(self):
         """! Get the active player object """
@@ -291,25 +483,23 @@ class UiPlayer():
         self.is_paused = not self.is_paused
         player = self._get_active_media_player()
         player.pause()
+        self.volume_automation.set_paused(self.is_paused)
+        self._playback_event.set()
 
     def mute_trigger(self):
-        """! Toggle mute level
-             FIXME isnt working properly
-        """
-        player = self._get_active_media_player()
-        if player.audio_get_volume() != 0:
-            self.is_muted = True
-            player.audio_set_volume(0)
-        else:
-            self.is_muted = False
-            player.audio_set_volume(100)
+        """! Toggle mute level, the fades go on muted """
+        self.is_muted = not self.is_muted
+        self.volume_automation.set_muted(self.is_muted)
 
     def next(self):
         """! Asks to move to the next video now"""
         self.is_next_asked = True
+        self._playback_event.set()
 
     def kill(self):
-        """! Kill the window and release the vlc instance """
+        """! Kill the window and release the player backend """
         self.is_running_flag = False
-        time.sleep(1) # Wait for all processes to stop
-        self.vlc_instance.release()
+        self._playback_event.set()
+        self.volume_automation.stop()
+        self.clock.sleep(1) # Wait for all processes to stop
+        self.backend.release()
@@ -0,0 +1,749 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Video pools module
+     Selection structures backing the RandomVideo directories
+"""
+import bisect
+import csv
+import heapq
+import random
+
+from logger import print_trace_in_ui
+
+# Selection modes of the RandomVideo blocks
+RANDOM_VIDEO_MODE_UNIFORM = "uniform"
+RANDOM_VIDEO_MODE_SHUFFLE = "shuffle"
+RANDOM_VIDEO_MODE_WEIGHTED = "weighted"
+RANDOM_VIDEO_MODES = (RANDOM_VIDEO_MODE_UNIFORM, RANDOM_VIDEO_MODE_SHUFFLE,
+                      RANDOM_VIDEO_MODE_WEIGHTED)
+# Extension of the weights file of a directory, next to the directory
+WEIGHTS_FILE_EXTENSION = ".weights"
+# Weight of the videos without a given weight
+DEFAULT_WEIGHT = 1
+# Number of picks of a shuffle bag between two stores of its position
+STORE_PERIOD_PICKS = 32
+
+
+def read_weights_file(path):
+    """! Reads a weights file : a csv of video names and weights
+        @param path : path of the file
+        @return a dictionary of the video names and their weight,
+                empty if the file doesnt exist
+    """
+    weights = {}
+    try:
+        with open(path, newline='', encoding="utf-8") as csvfile:
+            for line in csv.reader(csvfile, delimiter=','):
+                if not line or line[0].startswith("#"):
+                    continue
+                # The csv has to be well formed
+                assert len(line) == 2
+                weights[line[0]] = float(line[1])
+    except FileNotFoundError:
+        pass
+    return weights
+
+
+def _get_last_playback(history, path):
+    """! Returns the last playback time of a video in a history,
+         0 if never played or without history
+    """
+    if history is None:
+        return 0
+    time_s = history.get_last_playback(path)
+    return 0 if time_s is None else time_s
+
+
+def _mark_played(pool, path, time_s):
+    """! Marks a video picked by a pool as played, in its history if any """
+    if pool.history is None:
+        pool.mark_played(path, time_s)
+    else:
+        pool.history.mark_played(path, time_s)
+
+
+class PlaybackHistory:
+    """! Last playback times of the videos of a directory, shared by the
+         pools of every selection mode of the directory
+
+        A playback marked by a pool is given to all the others, so that
+        the reselect timeout holds whichever block picked the video.
+    """
+    # path -> last_playback
+    _last_playbacks = {}
+    # Pools of the directory
+    _pools = []
+
+    def __init__(self):
+        self._last_playbacks = {}
+        self._pools = []
+
+    def add_pool(self, pool):
+        """! Shares the history with a pool, given the playbacks known """
+        self._pools.append(pool)
+        for path, time_s in self._last_playbacks.items():
+            pool.mark_played(path, time_s)
+
+    def get_last_playback(self, path):
+        """! Returns the last playback time of a video, None if never """
+        return self._last_playbacks.get(path)
+
+    def mark_played(self, path, time_s):
+        """! Sets the last playback time of a video, in every pool
+            @param path : path of the video
+            @param time_s : timestamp of the playback
+        """
+        self._last_playbacks[path] = time_s
+        for pool in self._pools:
+            pool.mark_played(path, time_s)
+
+
+class RandomVideoPool:
+    """! Uniform random selection among the videos of a directory
+         that have not been played for a given timeout
+
+        The eligible videos are kept in a list, so that a uniform pick
+        in it is a single random draw, and the others in a heap by last
+        playback time. Before a pick, the videos played before the cutoff
+        leave the heap for the list, and the eligible videos played after
+        it, when the cutoff went back, return to the heap : each move
+        costs log(n).
+    """
+    # Paths of the eligible videos
+    _eligible = []
+    # path -> index of the video in _eligible
+    _indexes = {}
+    # Heap of (last_playback, path) of the videos in cooldown
+    _cooldowns = []
+    # Heap of (-last_playback, path) of the eligible videos
+    _recalls = []
+    # path -> last_playback
+    _last_playbacks = {}
+    # History shared with the other pools of the directory, None if none
+    history = None
+
+    def __init__(self, paths, history=None):
+        """! Initialize the pool, every video is eligible at first
+            @param paths : paths of the videos of the directory
+            @param history : PlaybackHistory of the directory
+        """
+        self._eligible = []
+        self._indexes = {}
+        self._cooldowns = []
+        self._recalls = []
+        self._last_playbacks = {}
+        self.history = None
+        self.update_files(paths)
+        if history is not None:
+            self.history = history
+            history.add_pool(self)
+
+    def __len__(self):
+        return len(self._last_playbacks)
+
+    def update_files(self, paths):
+        """! Synchronize the pool with the files of the directory
+            New videos are eligible right away,
+            the removed ones are dropped from the pool
+            @param paths : paths of the videos of the directory
+        """
+        paths = set(paths)
+        for path in [path for path in self._last_playbacks
+                     if path not in paths]:
+            # Its entries in the heaps are dropped when popped
+            del self._last_playbacks[path]
+            if path in self._indexes:
+                self._remove_eligible(path)
+        for path in paths:
+            if path not in self._last_playbacks:
+                time_s = _get_last_playback(self.history, path)
+                self._last_playbacks[path] = time_s
+                heapq.heappush(self._cooldowns, (time_s, path))
+
+    def _add_eligible(self, path):
+        """! Moves a video from the cooldowns to the eligible videos """
+        self._indexes[path] = len(self._eligible)
+        self._eligible.append(path)
+        heapq.heappush(self._recalls, (-self._last_playbacks[path], path))
+
+    def _remove_eligible(self, path):
+        """! Removes a video from the eligible videos, its place
+             is taken by the last one
+        """
+        index = self._indexes.pop(path)
+        last_path = self._eligible.pop()
+        if last_path != path:
+            self._eligible[index] = last_path
+            self._indexes[last_path] = index
+
+    def _update_eligible(self, cutoff_s):
+        """! Makes eligible the videos played before cutoff_s, and only them
+        """
+        while self._cooldowns and self._cooldowns[0][0] < cutoff_s:
+            last_playback, path = heapq.heappop(self._cooldowns)
+            # Removed, played again or already eligible since
+            if path not in self._indexes and \
+               self._last_playbacks.get(path) == last_playback:
+                self._add_eligible(path)
+        while self._recalls and -self._recalls[0][0] >= cutoff_s:
+            last_playback, path = heapq.heappop(self._recalls)
+            last_playback = -last_playback
+            if path in self._indexes and \
+               self._last_playbacks.get(path) == last_playback:
+                self._remove_eligible(path)
+                heapq.heappush(self._cooldowns, (last_playback, path))
+        # The picked videos leave entries in the recalls, that
+        # are dropped once they outnumber the eligible videos
+        if len(self._recalls) > 2 * len(self._eligible) + 16:
+            self._recalls = [(-self._last_playbacks[path], path)
+                             for path in self._eligible]
+            heapq.heapify(self._recalls)
+
+    def mark_played(self, path, time_s):
+        """! Sets the last playback time of a video of the pool
+            @param path : path of the video
+            @param time_s : timestamp of the playback
+        """
+        if path not in self._last_playbacks:
+            return
+        if path in self._indexes:
+            self._remove_eligible(path)
+        self._last_playbacks[path] = time_s
+        heapq.heappush(self._cooldowns, (time_s, path))
+
+    def pick(self, timeout_s, time_programmed_s):
+        """! Picks a video that hasnt played for timeout_s seconds
+             before time_programmed_s, and marks it as played then
+
+            If every video is too recent, the least recently played one
+            is taken anyway
+            @param timeout_s : reselect timeout in seconds
+            @param time_programmed_s : Timestamp in the future
+                                       for the programmed video
+            @return the path of the video, None if the pool is empty
+        """
+        if not self._last_playbacks:
+            print_trace_in_ui("ERR ! No video in the pool !")
+            return None
+
+        self._update_eligible(time_programmed_s - timeout_s)
+        if self._eligible:
+            path = self._eligible[random.randrange(len(self._eligible))]
+        else:
+            while self._cooldowns[0][1] in self._indexes or \
+                    self._last_playbacks.get(self._cooldowns[0][1]) != \
+                    self._cooldowns[0][0]:
+                heapq.heappop(self._cooldowns)
+            path = self._cooldowns[0][1]
+            print_trace_in_ui("ERR ! All videos are forbidden ! Selecting ",
+                              path, ", the least recently played, anyway..")
+
+        _mark_played(self, path, time_programmed_s)
+        return path
+
+
+class ShuffleBagPool:
+    """! Shuffle bag selection among the videos of a directory
+
+        The videos play in the order of a random permutation, each one
+        once per round, and the permutation is shuffled again when the
+        round is over : a pick only takes the next video of the bag.
+        The permutation and the position in it are stored, so that
+        a round goes on after a restart : every STORE_PERIOD_PICKS picks
+        and with store_changes, so that a pick doesnt write to the disk.
+
+        A video is never picked before its timeout : across two rounds,
+        a video of the end of the last round could come first in the new
+        one, the next video out of its timeout is swapped with it. If the
+        videos left in a round were all played too recently by the other
+        pools of the directory, a new round begins.
+
+        The videos of the round found too recent are skipped once : they
+        wait in a heap by playback time, kept in the bag after the next
+        video to play, and are picked once their timeout expires. The
+        playbacks are also kept sorted by time, so that the videos too
+        recent for a pick are counted by a bisection : a pick never goes
+        over the whole bag.
+    """
+    directory = ""
+    # Store of the bag : object with get_shuffle_bag and
+    # store_shuffle_bag methods, None if the bag is not persisted
+    store = None
+    # Permutation of the paths of the videos
+    _order = []
+    # Index in the permutation of the next video to play
+    _next_index = 0
+    # Index in the permutation of the next video to look at, the ones
+    # from _next_index were skipped as too recent
+    _scan_index = 0
+    # Heap of (last_playback, path) of the skipped videos
+    _skipped = []
+    # path -> index in the permutation, of the skipped videos
+    _skipped_indexes = {}
+    # path -> last_playback, for the videos played in this session
+    _last_playbacks = {}
+    # Sorted list of (playback, path), the ones that are not
+    # the last playback of their video are dropped from time to time
+    _playbacks = []
+    # Paths of the videos of the bag
+    _paths = set()
+    # History shared with the other pools of the directory, None if none
+    history = None
+    # Number of picks since the bag was last stored
+    _nb_unstored_picks = 0
+    # True if the permutation changed since it was last stored
+    _is_order_unstored = False
+
+    def __init__(self, directory, paths, store=None, history=None):
+        """! Initialize the pool, from the stored bag if there is one
+            @param directory : path of the directory, key of the stored bag
+            @param paths : paths of the videos of the directory
+            @param store : store of the bag, the MediaLibrary
+            @param history : PlaybackHistory of the directory
+        """
+        self.directory = directory
+        self.store = store
+        self._order = []
+        self._next_index = 0
+        self._scan_index = 0
+        self._skipped = []
+        self._skipped_indexes = {}
+        self._last_playbacks = {}
+        self._playbacks = []
+        self._paths = set()
+        self.history = None
+        self._nb_unstored_picks = 0
+        self._is_order_unstored = False
+        if store is not None:
+            stored_bag = store.get_shuffle_bag(directory)
+            if stored_bag is not None:
+                self._order, self._next_index = stored_bag
+        self.update_files(paths)
+        if history is not None:
+            self.history = history
+            history.add_pool(self)
+
+    def __len__(self):
+        return len(self._order)
+
+    def _store(self, is_order_changed):
+        """! Stores the changes of the bag once a period
+            @param is_order_changed : False if only the position changed
+        """
+        self._is_order_unstored = self._is_order_unstored or is_order_changed
+        self._nb_unstored_picks = self._nb_unstored_picks + 1
+        if self._nb_unstored_picks >= STORE_PERIOD_PICKS:
+            self.store_changes()
+
+    def store_changes(self):
+        """! Stores the permutation if it changed, and the position """
+        if self.store is not None and \
+           (self._nb_unstored_picks > 0 or self._is_order_unstored):
+            self.store.store_shuffle_bag(
+                self.directory,
+                self._order if self._is_order_unstored else None,
+                self._next_index)
+        self._nb_unstored_picks = 0
+        self._is_order_unstored = False
+
+    def update_files(self, paths):
+        """! Synchronize the bag with the files of the directory
+            The order of the remaining videos is kept, the new videos
+            take a random place among the videos not played in this round
+            @param paths : paths of the videos of the directory
+        """
+        paths = set(paths)
+        order = []
+        next_index = self._next_index
+        for index, path in enumerate(self._order):
+            if path in paths:
+                order.append(path)
+            elif index < self._next_index:
+                next_index = next_index - 1
+        # The skipped videos are looked at again
+        self._skipped = []
+        self._skipped_indexes = {}
+        for path in [path for path in self._last_playbacks
+                     if path not in paths]:
+            del self._last_playbacks[path]
+        self._order = order
+        self._paths = paths
+        if self.history is not None:
+            for path in paths.difference(order):
+                time_s = self.history.get_last_playback(path)
+                if time_s is not None:
+                    self.mark_played(path, time_s)
+        self._next_index = min(next_index, len(order))
+        self._scan_index = self._next_index
+
+        for path in paths.difference(order):
+            self._order.append(path)
+            swap_index = random.randint(self._next_index,
+                                        len(self._order) - 1)
+            self._order[-1], self._order[swap_index] = \
+                self._order[swap_index], self._order[-1]
+        self._is_order_unstored = True
+        self.store_changes()
+
+    def pick(self, timeout_s, time_programmed_s):
+        """! Picks the next video of the bag, reshuffled when exhausted
+
+            If every video left in the round is too recent, the next one
+            is taken anyway
+            @param timeout_s : reselect timeout in seconds
+            @param time_programmed_s : Timestamp in the future
+                                       for the programmed video
+            @return the path of the video, None if the pool is empty
+        """
+        if not self._order:
+            print_trace_in_ui("ERR ! No video in the pool !")
+            return None
+
+        is_order_changed = False
+        if self._next_index >= len(self._order):
+            self._shuffle()
+            is_order_changed = True
+
+        # Only the videos played at the end of the last round, or by
+        # the other pools of the directory, can be too recent
+        cutoff_s = time_programmed_s - timeout_s
+        index = self._find_eligible(cutoff_s)
+        if index is None and \
+           self._get_nb_recent(cutoff_s) < len(self._order):
+            # The videos left in the round are too recent, but not
+            # some of the played ones : the round is over early
+            self._shuffle()
+            is_order_changed = True
+            index = self._find_eligible(cutoff_s)
+        if index is None:
+            index = self._next_index
+            print_trace_in_ui("ERR ! All videos are forbidden ! Selecting ",
+                              self._order[index],
+                              ", the next in the bag, anyway..")
+
+        is_order_changed = is_order_changed or index != self._next_index
+        path = self._take(index)
+        _mark_played(self, path, time_programmed_s)
+        self._store(is_order_changed)
+        return path
+
+    def _shuffle(self):
+        """! Begins a new round """
+        random.shuffle(self._order)
+        self._next_index = 0
+        self._scan_index = 0
+        self._skipped = []
+        self._skipped_indexes = {}
+
+    def _is_eligible(self, path, cutoff_s):
+        """! Returns True if a video was not played since cutoff_s """
+        return self._last_playbacks.get(path, cutoff_s - 1) < cutoff_s
+
+    def _get_nb_recent(self, cutoff_s):
+        """! Returns the number of videos played since cutoff_s """
+        index = bisect.bisect_left(self._playbacks, (cutoff_s,))
+        return sum(1 for time_s, path in self._playbacks[index:]
+                   if self._last_playbacks.get(path) == time_s)
+
+    def _find_eligible(self, cutoff_s):
+        """! Returns the index of a video of the round played before
+             cutoff_s : a skipped one whose timeout expired, or else
+             the next one in the bag. None if there is none
+        """
+        while self._skipped and self._skipped[0][0] < cutoff_s:
+            last_playback, path = heapq.heappop(self._skipped)
+            # Played again since, or taken anyway
+            if path in self._skipped_indexes and \
+               self._last_playbacks.get(path) == last_playback:
+                return self._skipped_indexes[path]
+        while self._scan_index < len(self._order):
+            path = self._order[self._scan_index]
+            if self._is_eligible(path, cutoff_s):
+                return self._scan_index
+            self._skipped_indexes[path] = self._scan_index
+            heapq.heappush(self._skipped,
+                           (self._last_playbacks[path], path))
+            self._scan_index = self._scan_index + 1
+        return None
+
+    def _take(self, index):
+        """! Moves a video of the round to the place of the next video
+             to play, and goes past it
+            @param index : index of a skipped video, or of the next
+                           video to look at
+            @return the path of the video
+        """
+        if index == self._scan_index:
+            self._scan_index = self._scan_index + 1
+        # A skipped video can move to the place of the taken one
+        self._order[index], self._order[self._next_index] = \
+            self._order[self._next_index], self._order[index]
+        if self._order[index] in self._skipped_indexes:
+            self._skipped_indexes[self._order[index]] = index
+        path = self._order[self._next_index]
+        self._skipped_indexes.pop(path, None)
+        self._next_index = self._next_index + 1
+        return path
+
+    def mark_played(self, path, time_s):
+        """! Sets the last playback time of a video of the bag,
+             its place in the bag is kept
+            @param path : path of the video
+            @param time_s : timestamp of the playback
+        """
+        if path not in self._paths or \
+           self._last_playbacks.get(path) == time_s:
+            return
+        self._last_playbacks[path] = time_s
+        if path in self._skipped_indexes:
+            heapq.heappush(self._skipped, (time_s, path))
+        if not self._playbacks or self._playbacks[-1][0] <= time_s:
+            # The usual case, the playbacks come in time order
+            self._playbacks.append((time_s, path))
+        else:
+            bisect.insort(self._playbacks, (time_s, path))
+        if len(self._playbacks) > 2 * len(self._last_playbacks) + 16:
+            self._playbacks = sorted(
+                (time_s, path)
+                for path, time_s in self._last_playbacks.items())
+
+
+class WeightedVideoPool:
+    """! Weighted random selection among the videos of a directory
+         that have not been played for a given timeout
+
+        The weights are kept in a Fenwick tree : a pick is a descent
+        in the tree, and a weight update changes log(n) nodes of it.
+        A picked video has its weight set to 0 until its timeout
+        expires, so that the videos in cooldown are never drawn. As in
+        RandomVideoPool, the videos whose timeout expired are recalled
+        in cooldown when the cutoff goes back before their playback.
+    """
+    # Slot of the video -> path, None for the free slots
+    _paths = []
+    # path -> slot of the video
+    _slots = {}
+    # Slot of the video -> weight given to the video
+    _weights = []
+    # Fenwick tree of the weights used for the draws, 1-indexed
+    _tree = []
+    # Sum of the weights used for the draws
+    _total = 0
+    # Heap of (last_playback, path) of the videos in cooldown
+    _cooldowns = []
+    # Heap of (-last_playback, path) of the played videos out of cooldown
+    _recalls = []
+    # Paths of the videos in cooldown
+    _cooling = set()
+    # path -> last_playback, of the played videos
+    _last_playbacks = {}
+    # History shared with the other pools of the directory, None if none
+    history = None
+
+    def __init__(self, weights, history=None):
+        """! Initialize the pool, every video is eligible at first
+            @param weights : dictionary of the paths of the videos
+                             of the directory and their weight
+            @param history : PlaybackHistory of the directory
+        """
+        self.history = None
+        self._paths = list(weights)
+        self._slots = {path: slot for slot, path in enumerate(self._paths)}
+        self._weights = [max(weights[path], 0) for path in self._paths]
+        self._cooldowns = []
+        self._recalls = []
+        self._cooling = set()
+        self._last_playbacks = {}
+        # Linear construction of the tree
+        self._tree = [0] + list(self._weights)
+        for index in range(1, len(self._tree)):
+            parent = index + (index & -index)
+            if parent < len(self._tree):
+                self._tree[parent] = self._tree[parent] + self._tree[index]
+        self._total = sum(self._weights)
+        if history is not None:
+            self.history = history
+            history.add_pool(self)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _add(self, slot, delta):
+        """! Adds delta to the weight drawn for a slot """
+        self._total = self._total + delta
+        index = slot + 1
+        while index < len(self._tree):
+            self._tree[index] = self._tree[index] + delta
+            index = index + (index & -index)
+
+    def _prefix(self, index):
+        """! Returns the sum of the weights drawn for the first slots """
+        total = 0
+        while index > 0:
+            total = total + self._tree[index]
+            index = index - (index & -index)
+        return total
+
+    def _find(self, target):
+        """! Returns the slot where the cumulated weights exceed target """
+        slot = 0
+        mask = 1 << (len(self._tree) - 1).bit_length()
+        while mask:
+            index = slot + mask
+            if index < len(self._tree) and self._tree[index] <= target:
+                slot = index
+                target = target - self._tree[index]
+            mask = mask >> 1
+        return slot
+
+    def _get_drawn_weight(self, slot):
+        """! Returns the weight drawn for a slot, 0 in cooldown """
+        path = self._paths[slot]
+        if path is None or path in self._cooling:
+            return 0
+        return self._weights[slot]
+
+    def set_weight(self, path, weight):
+        """! Changes the weight of a video
+            @param path : path of the video
+            @param weight : new weight, 0 for a video never drawn
+        """
+        slot = self._slots.get(path)
+        if slot is None:
+            return
+        drawn_weight = self._get_drawn_weight(slot)
+        self._weights[slot] = max(weight, 0)
+        self._add(slot, self._get_drawn_weight(slot) - drawn_weight)
+
+    def update_files(self, weights):
+        """! Synchronize the pool with the files of the directory
+            New videos are eligible right away,
+            the removed ones are dropped from the pool
+            @param weights : dictionary of the paths of the videos
+                             of the directory and their weight
+        """
+        for path in [path for path in self._slots if path not in weights]:
+            slot = self._slots.pop(path)
+            self._add(slot, -self._get_drawn_weight(slot))
+            self._paths[slot] = None
+            self._weights[slot] = 0
+            self._last_playbacks.pop(path, None)
+            self._cooling.discard(path)
+        for path, weight in weights.items():
+            if path in self._slots:
+                self.set_weight(path, weight)
+                continue
+            # New slot at the end of the tree : its node covers
+            # the slots from index - lowbit(index) + 1 to index
+            self._paths.append(path)
+            self._weights.append(max(weight, 0))
+            index = len(self._tree)
+            self._tree.append(self._weights[-1] + self._prefix(index - 1) -
+                              self._prefix(index - (index & -index)))
+            self._total = self._total + self._weights[-1]
+            self._slots[path] = index - 1
+            if self.history is not None and \
+               self.history.get_last_playback(path) is not None:
+                self.mark_played(path, self.history.get_last_playback(path))
+
+    def _update_cooldowns(self, cutoff_s):
+        """! Draws the videos played before cutoff_s, and only them
+             among the played videos
+        """
+        while self._cooldowns and self._cooldowns[0][0] < cutoff_s:
+            last_playback, path = heapq.heappop(self._cooldowns)
+            # Removed, played again or already released since
+            if path in self._cooling and \
+               self._last_playbacks.get(path) == last_playback:
+                self._cooling.discard(path)
+                self._add(self._slots[path], self._weights[self._slots[path]])
+                heapq.heappush(self._recalls, (-last_playback, path))
+        while self._recalls and -self._recalls[0][0] >= cutoff_s:
+            last_playback, path = heapq.heappop(self._recalls)
+            last_playback = -last_playback
+            if path not in self._cooling and \
+               self._last_playbacks.get(path) == last_playback:
+                self._add(self._slots[path], -self._get_drawn_weight(
+                    self._slots[path]))
+                self._cooling.add(path)
+                heapq.heappush(self._cooldowns, (last_playback, path))
+        # The played videos leave entries in the recalls, that
+        # are dropped once they outnumber the released videos
+        nb_released = len(self._last_playbacks) - len(self._cooling)
+        if len(self._recalls) > 2 * nb_released + 16:
+            self._recalls = [(-last_playback, path) for path, last_playback
+                             in self._last_playbacks.items()
+                             if path not in self._cooling]
+            heapq.heapify(self._recalls)
+
+    def mark_played(self, path, time_s):
+        """! Puts a video in cooldown from a playback time
+            @param path : path of the video
+            @param time_s : timestamp of the playback
+        """
+        slot = self._slots.get(path)
+        if slot is None:
+            return
+        self._add(slot, -self._get_drawn_weight(slot))
+        self._last_playbacks[path] = time_s
+        self._cooling.add(path)
+        heapq.heappush(self._cooldowns, (time_s, path))
+
+    def pick(self, timeout_s, time_programmed_s):
+        """! Picks a video that hasnt played for timeout_s seconds
+             before time_programmed_s, with a probability proportional
+             to its weight, and marks it as played then
+
+            If every video is too recent, the least recently played one
+            is taken anyway
+            @param timeout_s : reselect timeout in seconds
+            @param time_programmed_s : Timestamp in the future
+                                       for the programmed video
+            @return the path of the video, None if the pool is empty
+                    or if every weight is 0
+        """
+        if not self._slots:
+            print_trace_in_ui("ERR ! No video in the pool !")
+            return None
+
+        self._update_cooldowns(time_programmed_s - timeout_s)
+        path = None
+        # The float sums can make a draw fall past the last slot
+        while path is None and self._total > 0:
+            slot = self._find(random.random() * self._total)
+            if slot < len(self._paths) and self._get_drawn_weight(slot) > 0:
+                path = self._paths[slot]
+            elif self._prefix(len(self._tree) - 1) <= 0:
+                self._total = 0
+        if path is None:
+            while self._cooldowns and \
+                    (self._cooldowns[0][1] not in self._cooling or
+                     self._last_playbacks.get(self._cooldowns[0][1]) !=
+                     self._cooldowns[0][0]):
+                heapq.heappop(self._cooldowns)
+            if not self._cooldowns:
+                print_trace_in_ui("ERR ! Every video of the pool "
+                                  "has a weight of 0 !")
+                return None
+            path = self._cooldowns[0][1]
+            print_trace_in_ui("ERR ! All videos are forbidden ! Selecting ",
+                              path, ", the least recently played, anyway..")
+
+        _mark_played(self, path, time_programmed_s)
+        return path
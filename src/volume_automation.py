@@ -0,0 +1,238 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Volume automation module
+     Volume ramps of the media players, the fades and crossfades,
+     applied by a single timer of the scheduler
+"""
+import math
+import threading
+
+# Shapes of the ramps
+CURVE_LINEAR = "linear"
+# Constant loudness through a crossfade
+CURVE_EQUAL_POWER = "equal_power"
+# Smooth start and end
+CURVE_S = "s_curve"
+CURVES = (CURVE_LINEAR, CURVE_EQUAL_POWER, CURVE_S)
+
+# Period of the volume updates during the ramps, in seconds
+DEFAULT_TICK_S = 0.02
+
+
+def get_curve_fraction(curve, progress, is_rising):
+    """! Returns how far a ramp of a curve is from its start volume
+        @param curve : one of CURVES
+        @param progress : elapsed fraction of the ramp duration, 0 to 1
+        @param is_rising : True if the volume goes up
+        @return the fraction of the volume change, 0 to 1
+    """
+    if curve == CURVE_EQUAL_POWER:
+        # Sine gain going up, cosine gain going down
+        if is_rising:
+            return math.sin(progress * math.pi / 2)
+        return 1 - math.cos(progress * math.pi / 2)
+    if curve == CURVE_S:
+        return progress * progress * (3 - 2 * progress)
+    return progress
+
+
+class VolumeAutomation:
+    """! Owns the volume of the media players
+
+        A ramp moves the volume of a player to a target over a duration,
+        along a curve, possibly from a later time. The ramps of all the
+        players are applied together by one timer of the scheduler, which
+        only ticks while a ramp runs : the crossfades are two overlapping
+        ramps.
+
+        The volumes are kept while muted, and the ramps are held
+        during the pauses.
+    """
+    class Ramp:
+        """! Scheduled volume change of a player """
+        volume_from = 0
+        volume_to = 0
+        time_start_s = 0
+        duration_s = 0
+        curve = CURVE_LINEAR
+        # Called without arguments once the target is reached
+        on_done_cb = None
+
+        def __init__(self, volume_from, volume_to, time_start_s,
+                     duration_s, curve, on_done_cb):
+            self.volume_from = volume_from
+            self.volume_to = volume_to
+            self.time_start_s = time_start_s
+            self.duration_s = duration_s
+            self.curve = curve
+            self.on_done_cb = on_done_cb
+
+        def get_volume(self, time_s):
+            """! Returns the volume of the ramp at a time """
+            if time_s <= self.time_start_s:
+                return self.volume_from
+            if time_s >= self.time_start_s + self.duration_s:
+                return self.volume_to
+            progress = (time_s - self.time_start_s) / self.duration_s
+            return self.volume_from + \
+                (self.volume_to - self.volume_from) * get_curve_fraction(
+                    self.curve, progress, self.volume_to > self.volume_from)
+
+        def is_done(self, time_s):
+            """! Returns True once the target is reached """
+            return time_s >= self.time_start_s + self.duration_s
+
+    scheduler = None
+    clock = None
+    tick_s = DEFAULT_TICK_S
+    is_muted = False
+    # Player -> running Ramp
+    _ramps = {}
+    # Player -> volume, muted or not
+    _volumes = {}
+    # Player -> volume last given to the player
+    _applied_volumes = {}
+    # Clock timestamp of the pause, None out of a pause
+    _time_paused_s = None
+    # Scheduler timer applying the ramps, None while none runs
+    _timer = None
+
+    def __init__(self, scheduler, tick_s=DEFAULT_TICK_S):
+        """! Creates the automation
+            @param scheduler : Scheduler running the ramps
+            @param tick_s : period of the volume updates during the ramps
+        """
+        self.scheduler = scheduler
+        self.clock = scheduler.clock
+        self.tick_s = tick_s
+        self.is_muted = False
+        self._ramps = {}
+        self._volumes = {}
+        self._applied_volumes = {}
+        self._time_paused_s = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def stop(self):
+        """! Stops the ramps where they are """
+        with self._lock:
+            self._ramps = {}
+            self._stop_timer()
+
+    def _start_timer(self):
+        """! Ticks while a ramp runs, with the lock held """
+        if self._timer is None and self._ramps and \
+           self._time_paused_s is None:
+            self._timer = self.scheduler.call_every(self.tick_s, self._tick,
+                                                    delay_s=0)
+
+    def _stop_timer(self):
+        """! Stops ticking, with the lock held """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _apply(self, player, volume):
+        """! Gives a volume to a player, with the lock held """
+        self._volumes[player] = volume
+        applied_volume = 0 if self.is_muted else int(round(volume))
+        if self._applied_volumes.get(player) != applied_volume:
+            self._applied_volumes[player] = applied_volume
+            player.audio_set_volume(applied_volume)
+
+    def get_volume(self, player):
+        """! Returns the volume of a player, even if muted """
+        with self._lock:
+            return self._volumes.get(player, player.audio_get_volume())
+
+    def set_volume(self, player, volume):
+        """! Sets the volume of a player now, cancelling its ramp
+            @param volume : volume between 0 and 100
+        """
+        with self._lock:
+            self._ramps.pop(player, None)
+            self._apply(player, volume)
+
+    def ramp(self, player, volume, duration_s, curve=CURVE_LINEAR,
+             delay_s=0, on_done_cb=None):
+        """! Moves the volume of a player, replacing its running ramp
+            @param volume : target volume between 0 and 100
+            @param duration_s : duration of the ramp
+            @param curve : shape of the ramp, one of CURVES
+            @param delay_s : time before the ramp starts
+            @param on_done_cb : called once the target is reached,
+                                not if the ramp is replaced
+        """
+        assert curve in CURVES, f"Unknown curve {curve}"
+        with self._lock:
+            time_start_s = self.clock.time() + delay_s
+            if self._time_paused_s is not None:
+                time_start_s = self._time_paused_s + delay_s
+            self._ramps[player] = self.Ramp(
+                self._volumes.get(player, player.audio_get_volume()),
+                volume, time_start_s, max(duration_s, 0), curve, on_done_cb)
+            self._start_timer()
+
+    def cancel(self, player):
+        """! Stops the ramp of a player where it is """
+        with self._lock:
+            self._ramps.pop(player, None)
+
+    def is_ramping(self, player):
+        """! Returns True if a ramp of the player is running """
+        with self._lock:
+            return player in self._ramps
+
+    def set_paused(self, is_paused):
+        """! Holds or resumes the ramps """
+        with self._lock:
+            if is_paused and self._time_paused_s is None:
+                self._time_paused_s = self.clock.time()
+            elif not is_paused and self._time_paused_s is not None:
+                pause_duration_s = self.clock.time() - self._time_paused_s
+                for ramp in self._ramps.values():
+                    ramp.time_start_s = ramp.time_start_s + pause_duration_s
+                self._time_paused_s = None
+            if self._time_paused_s is None:
+                self._start_timer()
+            else:
+                self._stop_timer()
+
+    def set_muted(self, is_muted):
+        """! Mutes or unmutes all the players, keeping their volumes """
+        with self._lock:
+            self.is_muted = is_muted
+            for player, volume in self._volumes.items():
+                self._apply(player, volume)
+
+    def _tick(self):
+        """! Applies the ramps, stops ticking once they are done """
+        done_ramps = []
+        with self._lock:
+            time_now_s = self.clock.time()
+            for player, ramp in list(self._ramps.items()):
+                self._apply(player, ramp.get_volume(time_now_s))
+                if ramp.is_done(time_now_s):
+                    del self._ramps[player]
+                    done_ramps.append(ramp)
+            if not self._ramps:
+                self._stop_timer()
+        for ramp in done_ramps:
+            if ramp.on_done_cb is not None:
+                ramp.on_done_cb()
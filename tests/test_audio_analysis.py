@@ -0,0 +1,80 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the audio analysis module """
+import unittest
+
+from audio_analysis import (FULL_VOLUME, MAX_GAIN_DB, SAMPLE_RATE,
+                            SILENCE_BLOCK_S, analyze_block_powers,
+                            analyze_samples, get_block_powers,
+                            get_gain_volume, numpy)
+
+
+def make_audio(silence_begin_s, sound_s, silence_end_s, amplitude=0.5):
+    """! Returns a sine between two silences, at SAMPLE_RATE """
+    sound = amplitude * numpy.sin(
+        2 * numpy.pi * 440 * numpy.arange(int(sound_s * SAMPLE_RATE)) /
+        SAMPLE_RATE)
+    return numpy.concatenate((
+        numpy.zeros(int(silence_begin_s * SAMPLE_RATE)), sound,
+        numpy.zeros(int(silence_end_s * SAMPLE_RATE)))).astype(numpy.float32)
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestAnalyzeSamples(unittest.TestCase):
+    """! Loudness and silences of generated audio """
+
+    def test_sine_between_silences(self):
+        analysis = analyze_samples(make_audio(1.5, 10, 2))
+        # Mean power of a sine of amplitude A : A^2 / 2, lowered a bit
+        # by the gating windows over the edges of the silences
+        self.assertAlmostEqual(analysis["loudness_db"],
+                               20 * numpy.log10(0.5 / numpy.sqrt(2)),
+                               delta=0.5)
+        self.assertAlmostEqual(analysis["silence_begin_s"], 1.5,
+                               delta=2 * SILENCE_BLOCK_S)
+        self.assertAlmostEqual(analysis["silence_end_s"], 11.5,
+                               delta=2 * SILENCE_BLOCK_S)
+
+    def test_silence(self):
+        analysis = analyze_samples(numpy.zeros(SAMPLE_RATE * 3,
+                                               dtype=numpy.float32))
+        self.assertIsNone(analysis["loudness_db"])
+        self.assertEqual(get_gain_volume(analysis), FULL_VOLUME)
+
+    def test_no_audio(self):
+        self.assertEqual(analyze_samples(numpy.zeros(10)), {})
+
+    def test_block_powers_of_chunks(self):
+        samples = make_audio(0.3, 4.2, 0.7)
+        block_size = int(SILENCE_BLOCK_S * SAMPLE_RATE)
+        chunk_size = 7 * block_size
+        powers = numpy.concatenate([
+            get_block_powers(samples[start:start + chunk_size])
+            for start in range(0, len(samples), chunk_size)])
+        self.assertEqual(analyze_block_powers(powers),
+                         analyze_samples(samples))
+
+    def test_quiet_clip_gain_is_bounded(self):
+        analysis = analyze_samples(make_audio(0, 5, 0, amplitude=0.01))
+        self.assertEqual(get_gain_volume(analysis),
+                         int(round(FULL_VOLUME * 10 ** (MAX_GAIN_DB / 20))))
+
+
+if __name__ == "__main__":
+    unittest.main()
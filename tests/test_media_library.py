@@ -0,0 +1,93 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the media library module """
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from media_library import MediaLibrary
+
+
+class TestMediaLibrary(unittest.TestCase):
+    """! Indexing of a directory whose files come and go """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.video_directory = self.directory + "/videos"
+        os.makedirs(self.video_directory)
+        self.library = MediaLibrary(self.directory + "/library.dat")
+
+    def tearDown(self):
+        self.library.close()
+        shutil.rmtree(self.directory)
+
+    def write_files(self, indexes):
+        for index in indexes:
+            with open(f"{self.video_directory}/file{index}.txt", "w",
+                      encoding="utf-8") as file:
+                file.write("text")
+
+    def test_removed_files_leave_the_directory(self):
+        self.write_files(range(4))
+        self.library.refresh_directory(self.video_directory)
+        os.remove(self.video_directory + "/file0.txt")
+        self.library.refresh_directory(self.video_directory)
+        self.assertIsNone(self.library.get_entry(
+            self.video_directory + "/file0.txt"))
+        self.assertIsNotNone(self.library.get_entry(
+            self.video_directory + "/file1.txt"))
+
+    def test_files_read_while_indexed(self):
+        self.write_files(range(20))
+        self.library.refresh_directory(self.video_directory)
+        errors = []
+        is_running = [True]
+
+        def read_thread():
+            while is_running[0]:
+                try:
+                    self.library.get_media_files(self.video_directory)
+                except KeyError as error:
+                    errors.append(error)
+                    return
+
+        switch_interval_s = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        thread = threading.Thread(target=read_thread)
+        thread.start()
+        try:
+            for index in range(40):
+                if index % 2:
+                    self.write_files(range(10))
+                else:
+                    for file_index in range(10):
+                        os.remove(f"{self.video_directory}/"
+                                  f"file{file_index}.txt")
+                self.library.refresh_directory(self.video_directory)
+        finally:
+            is_running[0] = False
+            thread.join()
+            sys.setswitchinterval(switch_interval_s)
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the metadata manager module """
+import os
+import tempfile
+import unittest
+
+from metadata_manager import MetaDataManager
+
+METADATA = """jingle.mov,00:00,00:00,n,n,,
+clip.mp4,00:04,03:10,y,y,Aha,Take On Me
+cut.mp4,01:02.250,02:03.5,n,y,,,2.5
+late.mp4,12:00.0004,75:00,n,n,,,
+"""
+
+
+class TestMetaDataManager(unittest.TestCase):
+    """! Parsing of a metadata file """
+    def setUp(self):
+        descriptor, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(descriptor, "w", encoding="utf-8",
+                       newline="") as metadata_file:
+            metadata_file.write(METADATA)
+        self.metadata_manager = MetaDataManager(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_seconds_timestamps(self):
+        metadata = self.metadata_manager.get_metadata("clip.mp4")
+        self.assertEqual(metadata.timestamp_begin, 4)
+        self.assertEqual(metadata.timestamp_end, 190)
+        self.assertIsInstance(metadata.timestamp_end, int)
+        self.assertTrue(metadata.fade_in and metadata.fade_out)
+        self.assertEqual((metadata.artist, metadata.song),
+                         ("Aha", "Take On Me"))
+
+    def test_milliseconds_timestamps(self):
+        metadata = self.metadata_manager.get_metadata("cut.mp4")
+        self.assertEqual(metadata.timestamp_begin, 62.25)
+        self.assertEqual(metadata.timestamp_end, 123.5)
+        # Rounded to the millisecond
+        metadata = self.metadata_manager.get_metadata("late.mp4")
+        self.assertEqual(metadata.timestamp_begin, 720.0)
+        self.assertEqual(metadata.timestamp_end, 4500)
+
+    def test_weights(self):
+        self.assertEqual(self.metadata_manager.get_weight("cut.mp4"), 2.5)
+        self.assertIsNone(self.metadata_manager.get_weight("late.mp4"))
+        self.assertIsNone(self.metadata_manager.get_weight("jingle.mov"))
+        self.assertIsNone(self.metadata_manager.get_weight("unknown.mp4"))
+
+    def test_reload(self):
+        with open(self.path, "a", encoding="utf-8",
+                  newline="") as metadata_file:
+            metadata_file.write("new.mp4,00:01.5,00:00,n,n,,\n")
+        self.metadata_manager.reload()
+        self.assertEqual(len(self.metadata_manager.metadata_list), 5)
+        self.assertEqual(self.metadata_manager.get_metadata(
+            "new.mp4").timestamp_begin, 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
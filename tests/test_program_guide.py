@@ -0,0 +1,75 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the program guide module """
+import threading
+import unittest
+
+from program_guide import GuideExporter
+
+
+class FakeGuide:
+    """! Guide whose programs the test changes """
+    def __init__(self):
+        self.signature = ()
+        self.exports = []
+        self.export_event = threading.Event()
+
+    def get_signature(self):
+        return self.signature
+
+    def export(self, path):
+        self.exports.append((path, self.signature))
+        self.export_event.set()
+
+
+class TestGuideExporter(unittest.TestCase):
+    """! Background exports of the guide """
+
+    def test_requests_are_gathered(self):
+        guide = FakeGuide()
+        exporter = GuideExporter(guide, "guide.json", delay_s=0.2)
+        for index in range(50):
+            guide.signature = (index,)
+            exporter.request()
+        self.assertTrue(guide.export_event.wait(5))
+        exporter.stop()
+        self.assertEqual(guide.exports, [("guide.json", (49,))])
+
+    def test_unchanged_guide_is_not_written(self):
+        guide = FakeGuide()
+        exporter = GuideExporter(guide, "guide.json", delay_s=0)
+        guide.signature = (1,)
+        exporter.request()
+        self.assertTrue(guide.export_event.wait(5))
+        guide.export_event.clear()
+        exporter.request()
+        exporter.stop()
+        self.assertEqual(len(guide.exports), 1)
+
+    def test_stop_writes_the_last_request(self):
+        guide = FakeGuide()
+        exporter = GuideExporter(guide, "guide.json", delay_s=60)
+        guide.signature = (1,)
+        exporter.request()
+        exporter.stop()
+        self.assertEqual(guide.exports, [("guide.json", (1,))])
+
+
+if __name__ == "__main__":
+    unittest.main()
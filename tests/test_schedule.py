@@ -0,0 +1,129 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the schedule module """
+import random
+import unittest
+
+from schedule import Schedule
+
+ANCHOR_TIME_S = 1000
+
+
+class ManualClock:
+    """! Clock the tests move forward """
+    def __init__(self):
+        self.time_s = 0
+
+    def __call__(self):
+        return self.time_s
+
+
+class TestSchedule(unittest.TestCase):
+    """! Start times compared with the sums of the lengths """
+    def setUp(self):
+        self.clock = ManualClock()
+        self.schedule = Schedule(ANCHOR_TIME_S, clock=self.clock)
+
+    def assert_starts(self, anchor_time_s, lengths):
+        start_s = anchor_time_s
+        self.assertEqual(len(self.schedule), len(lengths))
+        for index, length_s in enumerate(lengths):
+            self.assertEqual(self.schedule.get_start(index), start_s)
+            self.assertEqual(self.schedule.get_length(index), length_s)
+            start_s = start_s + length_s
+
+    def test_random_updates(self):
+        rng = random.Random(4)
+        lengths = []
+        anchor_time_s = ANCHOR_TIME_S
+        for _ in range(500):
+            operation = rng.randrange(4)
+            if operation == 0 or not lengths:
+                lengths.append(rng.randrange(1, 300))
+                self.schedule.append(lengths[-1])
+            elif operation == 1:
+                index = rng.randrange(len(lengths))
+                lengths[index] = rng.randrange(1, 300)
+                self.schedule.set_length(index, lengths[index])
+            elif operation == 2:
+                index = rng.randrange(len(lengths))
+                lengths[index] = lengths[index] + 7
+                self.schedule.add_length(index, 7)
+            else:
+                nb_slots = rng.randrange(1, len(lengths) + 1)
+                anchor_time_s = anchor_time_s + sum(lengths[:nb_slots])
+                del lengths[:nb_slots]
+                self.schedule.pop_front(nb_slots)
+        self.assert_starts(anchor_time_s, lengths)
+
+    def test_set_start_moves_every_slot(self):
+        for length_s in (10, 20, 30):
+            self.schedule.append(length_s)
+        self.schedule.set_start(1, 5000)
+        self.assert_starts(4990, [10, 20, 30])
+
+    def test_find(self):
+        for length_s in (10, 20, 30):
+            self.schedule.append(length_s)
+        self.assertIsNone(self.schedule.find(ANCHOR_TIME_S - 1))
+        self.assertEqual(self.schedule.find(ANCHOR_TIME_S), 0)
+        self.assertEqual(self.schedule.find(ANCHOR_TIME_S + 10), 1)
+        self.assertEqual(self.schedule.find(ANCHOR_TIME_S + 59), 2)
+        self.assertIsNone(self.schedule.find(ANCHOR_TIME_S + 60))
+        self.schedule.pop_front(2)
+        self.assertEqual(self.schedule.find(ANCHOR_TIME_S + 30), 0)
+
+    def test_pause_pushes_back_the_next_slots(self):
+        for length_s in (10, 20, 30):
+            self.schedule.append(length_s)
+        self.clock.time_s = 100
+        self.schedule.pause(1)
+        self.clock.time_s = 115
+        self.assertTrue(self.schedule.is_paused())
+        self.assertEqual(self.schedule.get_length(1), 35)
+        self.assertEqual(self.schedule.get_start(2), ANCHOR_TIME_S + 45)
+        self.assertEqual(self.schedule.find(ANCHOR_TIME_S + 40), 1)
+        self.assertEqual(self.schedule.find(ANCHOR_TIME_S + 45), 2)
+        self.schedule.resume()
+        self.clock.time_s = 200
+        self.assertFalse(self.schedule.is_paused())
+        self.assert_starts(ANCHOR_TIME_S, [10, 35, 30])
+
+    def test_get_starts(self):
+        for length_s in (10, 20, 30):
+            self.schedule.append(length_s)
+        self.schedule.pause(0)
+        self.clock.time_s = 5
+        self.assertEqual(self.schedule.get_starts(),
+                         [self.schedule.get_start(index)
+                          for index in range(3)])
+        self.assertEqual(self.schedule.get_starts(),
+                         [ANCHOR_TIME_S, ANCHOR_TIME_S + 15,
+                          ANCHOR_TIME_S + 35])
+
+    def test_index_out_of_range(self):
+        self.schedule.append(10)
+        with self.assertRaises(IndexError):
+            self.schedule.get_start(1)
+        with self.assertRaises(IndexError):
+            self.schedule.pop_front(2)
+
+
+if __name__ == "__main__":
+    unittest.main()
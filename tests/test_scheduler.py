@@ -0,0 +1,147 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the scheduler module """
+import threading
+import unittest
+
+from scheduler import Scheduler, TK_POLL_PERIOD_S
+
+
+class ManualClock:
+    """! Clock only moving when the test advances it """
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def new_event(self):
+        return threading.Event()
+
+
+class FakeTkRoot:
+    """! Records the 'after' of the scheduler, and the threads using it """
+    def __init__(self):
+        self.pending = {}
+        self.next_id = 0
+        self.nb_foreign_calls = 0
+
+    def _check_thread(self):
+        if threading.current_thread() is not threading.main_thread():
+            self.nb_foreign_calls = self.nb_foreign_calls + 1
+
+    def after(self, delay_ms, callback):
+        self._check_thread()
+        self.next_id = self.next_id + 1
+        self.pending[self.next_id] = (delay_ms, callback)
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        self._check_thread()
+        self.pending.pop(after_id, None)
+
+    def run_pending(self):
+        """! Runs the single pending 'after' """
+        assert len(self.pending) == 1
+        (_, callback) = self.pending.popitem()[1]
+        callback()
+
+
+class TestTkScheduler(unittest.TestCase):
+    """! Timers run in the Tk main loop """
+
+    def setUp(self):
+        self.clock = ManualClock()
+        self.tk_root = FakeTkRoot()
+        self.scheduler = Scheduler(self.clock, tk_root=self.tk_root)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_single_after_chain(self):
+        calls = []
+        self.scheduler.call_later(0.5, calls.append, "main")
+        self.assertEqual(len(self.tk_root.pending), 1)
+        self.clock.now = self.clock.now + 0.5
+        self.tk_root.run_pending()
+        self.assertEqual(calls, ["main"])
+        self.assertEqual(len(self.tk_root.pending), 1)
+
+    def test_timers_of_other_threads_are_polled(self):
+        calls = []
+
+        def worker():
+            for index in range(100):
+                self.scheduler.call_soon(calls.append, index)
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertEqual(self.tk_root.nb_foreign_calls, 0)
+        self.assertEqual(len(self.tk_root.pending), 1)
+        (delay_ms, _) = next(iter(self.tk_root.pending.values()))
+        self.assertLessEqual(delay_ms, TK_POLL_PERIOD_S * 1000)
+        self.tk_root.run_pending()
+        self.assertEqual(calls, list(range(100)))
+
+    def test_stop_ends_the_chain(self):
+        self.scheduler.call_every(1, lambda: None)
+        self.scheduler.stop()
+        self.assertEqual(self.tk_root.pending, {})
+
+
+class TestPeriodicTimers(unittest.TestCase):
+    """! Periodic timers and tasks """
+
+    def setUp(self):
+        self.clock = ManualClock()
+        self.tk_root = FakeTkRoot()
+        self.scheduler = Scheduler(self.clock, tk_root=self.tk_root)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_missed_periods_are_skipped(self):
+        calls = []
+        self.scheduler.call_every(1, lambda: calls.append(self.clock.now))
+        self.clock.now = self.clock.now + 3.5
+        self.tk_root.run_pending()
+        self.clock.now = self.clock.now + 0.9
+        self.tk_root.run_pending()
+        self.assertEqual(len(calls), 1)
+        self.clock.now = self.clock.now + 0.1
+        self.tk_root.run_pending()
+        self.assertEqual(len(calls), 2)
+
+    def test_task_is_resumed_after_its_delays(self):
+        steps = []
+
+        def task():
+            steps.append(1)
+            yield 2
+            steps.append(2)
+        self.scheduler.start_task(task())
+        self.tk_root.run_pending()
+        self.assertEqual(steps, [1])
+        self.clock.now = self.clock.now + 2
+        self.tk_root.run_pending()
+        self.assertEqual(steps, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the cache of the sequence plans """
+import os
+import shutil
+import tempfile
+import unittest
+
+import sequence_compiler
+from sequence_compiler import load_sequence_plan
+
+SEQUENCE = """<Document>
+  <Title>{title}</Title>
+  <Sequence>
+    <Video path="jingle/jingle.mov" />
+    <RandomVideo path="clips" reselect_timeout="60" />
+  </Sequence>
+</Document>
+"""
+
+
+class TestSequencePlanCache(unittest.TestCase):
+    """! Tests of the loading and the pruning of the cached plans """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = self.directory + "/plans"
+        self.xml_path = self.directory + "/sequence.xml"
+        self.write_sequence("First")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_sequence(self, title):
+        with open(self.xml_path, "w", encoding="utf-8") as xml_file:
+            xml_file.write(SEQUENCE.format(title=title))
+
+    def load(self, xml_path=None):
+        return load_sequence_plan(xml_path or self.xml_path,
+                                  cache_directory=self.cache_directory)
+
+    def test_plan_reloaded_from_cache(self):
+        plan = self.load()
+        self.assertEqual(plan.title, "First")
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+        self.assertEqual(self.load().to_dict(), plan.to_dict())
+
+    def test_stale_plan_of_the_sequence_pruned(self):
+        self.load()
+        self.write_sequence("Second")
+        self.assertEqual(self.load().title, "Second")
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+
+    def test_plans_of_other_sequences_kept(self):
+        other_path = self.directory + "/other.xml"
+        with open(other_path, "w", encoding="utf-8") as xml_file:
+            xml_file.write(SEQUENCE.format(title="Other"))
+        self.load(other_path)
+        self.load()
+        self.assertEqual(len(os.listdir(self.cache_directory)), 2)
+
+    def test_plans_of_other_versions_pruned(self):
+        self.load()
+        version = sequence_compiler.PLAN_VERSION
+        sequence_compiler.PLAN_VERSION = version + 1
+        try:
+            self.load()
+        finally:
+            sequence_compiler.PLAN_VERSION = version
+        file_names = os.listdir(self.cache_directory)
+        self.assertEqual(len(file_names), 1)
+        self.assertTrue(file_names[0].startswith(f"v{version + 1}-"))
+
+
+if __name__ == "__main__":
+    unittest.main()
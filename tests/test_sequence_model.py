@@ -0,0 +1,95 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the sequence model module """
+import itertools
+import unittest
+
+from sequence_model import LazySequence
+
+
+class Block:
+    """! Block of a sequence tree, as the sequencer builds them """
+    def __init__(self, block_type, block_args=None, inner_sequence=()):
+        self.block_type = block_type
+        self.block_args = block_args
+        self.inner_sequence = list(inner_sequence)
+
+
+def flatten(block):
+    """! Returns the leaves of a tree with the repeats copied """
+    if block.block_type in ("video", "randomvideo"):
+        return [block]
+    nb_times = int(block.block_args) if block.block_type == "repeat" else 1
+    return [leaf for _ in range(nb_times)
+            for child in block.inner_sequence for leaf in flatten(child)]
+
+
+def make_tree():
+    """! Returns a sequence with nested and empty repeats """
+    return Block("sequence", inner_sequence=[
+        Block("video", "jingle.mov"),
+        Block("repeat", "3", [
+            Block("randomvideo", ("clips", 60, "uniform")),
+            Block("repeat", "2", [Block("video", "ad.mov"),
+                                  Block("video", "ad2.mov")]),
+            Block("repeat", "0", [Block("video", "never.mov")])]),
+        Block("repeat", "4", []),
+        Block("video", "outro.mov")])
+
+
+class TestLazySequence(unittest.TestCase):
+    """! Flattened view compared with the copied repeats """
+    def setUp(self):
+        self.tree = make_tree()
+        self.flat = flatten(self.tree)
+        self.sequence = LazySequence(self.tree)
+
+    def test_length(self):
+        self.assertEqual(len(self.sequence), len(self.flat))
+        self.assertEqual(len(self.sequence), 17)
+
+    def test_indexing(self):
+        for index, block in enumerate(self.flat):
+            self.assertIs(self.sequence[index], block)
+        with self.assertRaises(IndexError):
+            _ = self.sequence[len(self.flat)]
+
+    def test_iteration_loops_from_any_position(self):
+        for position in (0, 5, 16, 40):
+            blocks = list(itertools.islice(
+                self.sequence.iter_from(position), 2 * len(self.flat)))
+            for offset, (block_position, index, block) in enumerate(blocks):
+                self.assertEqual(block_position, position + offset)
+                self.assertEqual(index, block_position % len(self.flat))
+                self.assertIs(block, self.flat[index])
+
+    def test_leaves_listed_once(self):
+        leaves = list(self.sequence.iter_leaves())
+        self.assertEqual(len(leaves), 6)
+        self.assertEqual(len({id(leaf) for leaf in leaves}), 6)
+
+    def test_empty_sequence(self):
+        sequence = LazySequence(Block("sequence", inner_sequence=[
+            Block("repeat", "2", [])]))
+        self.assertEqual(len(sequence), 0)
+        self.assertEqual(list(sequence.iter_from(0)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
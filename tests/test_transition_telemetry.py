@@ -0,0 +1,101 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the transition telemetry module """
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from data_manager import DataManager
+from transition_telemetry import (PHASES, TABLE_NAME, TOTAL,
+                                  TransitionTelemetry, get_percentile)
+
+
+class TestGetPercentile(unittest.TestCase):
+    """! Percentiles by the nearest rank """
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(get_percentile(values, 50), 50)
+        self.assertEqual(get_percentile(values, 95), 95)
+        self.assertEqual(get_percentile(values, 100), 100)
+        self.assertEqual(get_percentile([1, 2, 3], 50), 2)
+
+    def test_low_percentiles_give_the_minimum(self):
+        self.assertEqual(get_percentile([4, 8], 0), 4)
+        self.assertEqual(get_percentile([7], 99), 7)
+
+
+class TestTransitionTelemetry(unittest.TestCase):
+    """! Records of transitions whose phases take a millisecond each """
+
+    def record(self, telemetry, nb_transitions):
+        clock = iter(range(10 ** 6))
+        with mock.patch("transition_telemetry.time.monotonic",
+                        lambda: next(clock) / 1000):
+            for index in range(nb_transitions):
+                telemetry.begin(index)
+                for phase in PHASES[1:]:
+                    telemetry.mark(phase, path="clip.mp4",
+                                   is_prerolled=True)
+                telemetry.end()
+
+    def test_summary(self):
+        telemetry = TransitionTelemetry(ring_size=10)
+        records = []
+        telemetry.set_on_record_cb(records.append)
+        self.record(telemetry, 20)
+        self.assertEqual(len(records), 20)
+        self.assertEqual(telemetry.get_nb_records(), 10)
+        summary = telemetry.get_summary()
+        self.assertAlmostEqual(summary[PHASES[1]][50], 0.001)
+        self.assertAlmostEqual(summary[TOTAL][99],
+                               0.001 * (len(PHASES) - 1))
+        self.assertEqual(len(telemetry.format_summary()), len(PHASES) + 1)
+
+    def test_mark_without_transition(self):
+        telemetry = TransitionTelemetry()
+        telemetry.mark(PHASES[1])
+        telemetry.end()
+        self.assertEqual(telemetry.get_summary(), {})
+
+    def test_records_stored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = directory + "/internal.dat"
+            with sqlite3.connect(path) as db_connection:
+                db_connection.execute(f"CREATE TABLE {TABLE_NAME}(OLD)")
+            data_manager = DataManager(path)
+            self.record(TransitionTelemetry(data_manager), 3)
+            data_manager.kill()
+            with sqlite3.connect(path) as db_connection:
+                rows = db_connection.execute(
+                    f"SELECT * FROM {TABLE_NAME}").fetchall()
+                tables = db_connection.execute(
+                    "SELECT name FROM sqlite_master "
+                    "WHERE type='table'").fetchall()
+            db_connection.close()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0][1:3], ("clip.mp4", 1))
+        self.assertAlmostEqual(rows[0][-1], len(PHASES) - 1)
+        # The table of other phases is kept aside
+        self.assertEqual(len(tables), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,279 @@
+# Copyright (C) 2023 Julien LE THENO
+#
+# This file is part of the VLCSequencer package
+# See github.com/lethenju/VLCSequencer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""! Tests of the video pools module """
+import collections
+import random
+import unittest
+
+from video_pools import (PlaybackHistory, RandomVideoPool, ShuffleBagPool,
+                         WeightedVideoPool, STORE_PERIOD_PICKS)
+
+PATHS = ["clips/video" + str(index) + ".mp4" for index in range(10)]
+TIMEOUT_S = 15 * 60
+# Playing length of a video in the tests
+LENGTH_S = 3 * 60
+# Timestamp of the first pick, 0 being never played
+TIME_START_S = 1.7e9
+
+
+def get_violations(picks, timeout_s):
+    """! Returns the picks of a video played again before its timeout
+        @param picks : list of (time, path)
+    """
+    last_playbacks = {}
+    violations = []
+    for time_s, path in picks:
+        if path in last_playbacks and \
+           time_s - last_playbacks[path] < timeout_s:
+            violations.append((time_s, path))
+        last_playbacks[path] = time_s
+    return violations
+
+
+class MemoryBagStore:
+    """! Store of the shuffle bags, in memory """
+    def __init__(self):
+        self.bags = {}
+        self.nb_stores = 0
+
+    def get_shuffle_bag(self, directory):
+        return self.bags.get(directory)
+
+    def store_shuffle_bag(self, directory, order, next_index):
+        self.nb_stores = self.nb_stores + 1
+        if order is None:
+            order = self.bags[directory][0]
+        self.bags[directory] = (list(order), next_index)
+
+
+class TestShuffleBagPool(unittest.TestCase):
+    """! Shuffle bag selection """
+
+    def test_each_video_once_per_round(self):
+        pool = ShuffleBagPool("clips", PATHS)
+        for round_index in range(3):
+            picks = [pool.pick(TIMEOUT_S, (round_index * len(PATHS) + index)
+                               * LENGTH_S)
+                     for index in range(len(PATHS))]
+            self.assertEqual(sorted(picks), sorted(PATHS))
+
+    def test_timeout_across_rounds(self):
+        pool = ShuffleBagPool("clips", PATHS)
+        picks = []
+        for index in range(200):
+            time_s = TIME_START_S + index * LENGTH_S
+            picks.append((time_s, pool.pick(TIMEOUT_S, time_s)))
+        self.assertEqual(get_violations(picks, TIMEOUT_S), [])
+
+    def test_round_goes_on_after_restart(self):
+        store = MemoryBagStore()
+        pool = ShuffleBagPool("clips", PATHS, store)
+        first_picks = [pool.pick(TIMEOUT_S, index * LENGTH_S)
+                       for index in range(4)]
+        pool.store_changes()
+        pool = ShuffleBagPool("clips", PATHS, store)
+        next_picks = [pool.pick(TIMEOUT_S, (4 + index) * LENGTH_S)
+                      for index in range(len(PATHS) - 4)]
+        self.assertEqual(sorted(first_picks + next_picks), sorted(PATHS))
+
+    def test_position_stored_in_batches(self):
+        store = MemoryBagStore()
+        paths = ["clips/video" + str(index) + ".mp4" for index in range(100)]
+        pool = ShuffleBagPool("clips", paths, store)
+        store.nb_stores = 0
+        for index in range(STORE_PERIOD_PICKS - 1):
+            pool.pick(0, index * LENGTH_S)
+        self.assertEqual(store.nb_stores, 0)
+        pool.store_changes()
+        self.assertEqual(store.bags["clips"][1], STORE_PERIOD_PICKS - 1)
+
+    def test_round_over_early_when_the_rest_is_too_recent(self):
+        history = PlaybackHistory()
+        pool = ShuffleBagPool("clips", PATHS[:4], history=history)
+        played = {pool.pick(TIMEOUT_S, TIME_START_S + index * LENGTH_S)
+                  for index in range(2)}
+        time_s = TIME_START_S + 2 * TIMEOUT_S
+        for path in set(PATHS[:4]) - played:
+            # Played by the pool of another mode
+            history.mark_played(path, time_s)
+        self.assertIn(pool.pick(TIMEOUT_S, time_s + LENGTH_S), played)
+
+    def test_timeout_with_another_mode(self):
+        history = PlaybackHistory()
+        paths = [path + str(index) for path in PATHS for index in range(4)]
+        pools = [ShuffleBagPool("clips", paths, history=history),
+                 RandomVideoPool(paths, history=history)]
+        picks = []
+        for index in range(1000):
+            time_s = TIME_START_S + index * LENGTH_S
+            # Most of the videos are too recent at each pick
+            picks.append((time_s, pools[index % 3 == 0].pick(
+                30 * LENGTH_S, time_s)))
+        self.assertEqual(get_violations(picks, 30 * LENGTH_S), [])
+
+    def test_skipped_video_played_after_restart(self):
+        store = MemoryBagStore()
+        store.bags["clips"] = (PATHS[:4], 0)
+        history = PlaybackHistory()
+        pool = ShuffleBagPool("clips", PATHS[:4], store, history=history)
+        history.mark_played(PATHS[0], TIME_START_S)
+        self.assertEqual(pool.pick(TIMEOUT_S, TIME_START_S + LENGTH_S),
+                         PATHS[1])
+        pool.store_changes()
+        pool = ShuffleBagPool("clips", PATHS[:4], store)
+        picks = [pool.pick(TIMEOUT_S, TIME_START_S + index * TIMEOUT_S)
+                 for index in range(2, 5)]
+        self.assertEqual(sorted(picks), [PATHS[0]] + PATHS[2:4])
+
+    def test_next_video_when_all_forbidden(self):
+        history = PlaybackHistory()
+        pool = ShuffleBagPool("clips", PATHS[:4], history=history)
+        for path in PATHS[:4]:
+            history.mark_played(path, TIME_START_S)
+        self.assertIn(pool.pick(TIMEOUT_S, TIME_START_S + LENGTH_S),
+                      PATHS[:4])
+
+    def test_new_files_join_the_round(self):
+        pool = ShuffleBagPool("clips", PATHS[:5])
+        pool.pick(TIMEOUT_S, 0)
+        pool.update_files(PATHS)
+        self.assertEqual(len(pool), len(PATHS))
+        picks = [pool.pick(TIMEOUT_S, (1 + index) * LENGTH_S)
+                 for index in range(len(PATHS) - 1)]
+        self.assertEqual(len(set(picks)), len(PATHS) - 1)
+
+
+class TestRandomVideoPool(unittest.TestCase):
+    """! Uniform selection among the videos out of their timeout """
+
+    def test_timeout_respected(self):
+        pool = RandomVideoPool(PATHS)
+        picks = [(TIME_START_S + index * LENGTH_S,
+                  pool.pick(TIMEOUT_S, TIME_START_S + index * LENGTH_S))
+                 for index in range(500)]
+        self.assertEqual(get_violations(picks, TIMEOUT_S), [])
+        self.assertEqual({path for _, path in picks}, set(PATHS))
+
+    def test_least_recently_played_when_all_forbidden(self):
+        pool = RandomVideoPool(PATHS[:3])
+        picks = [pool.pick(TIMEOUT_S, TIME_START_S + index)
+                 for index in range(3)]
+        self.assertEqual(sorted(picks), PATHS[:3])
+        # Every video played in the last seconds
+        self.assertEqual(pool.pick(TIMEOUT_S, TIME_START_S + 3), picks[0])
+        self.assertEqual(pool.pick(TIMEOUT_S, TIME_START_S + 4), picks[1])
+
+    def test_empty_pool(self):
+        pool = RandomVideoPool([])
+        self.assertIsNone(pool.pick(TIMEOUT_S, TIME_START_S))
+        pool.update_files(PATHS[:1])
+        self.assertEqual(pool.pick(TIMEOUT_S, TIME_START_S), PATHS[0])
+
+    def test_shorter_then_longer_timeout(self):
+        pool = RandomVideoPool(PATHS)
+        picks = []
+        for index in range(400):
+            time_s = TIME_START_S + index * LENGTH_S
+            # Blocks of the directory with two timeouts
+            timeout_s = TIMEOUT_S if index % 2 else 2 * TIMEOUT_S
+            picks.append((time_s, pool.pick(timeout_s, time_s)))
+            for time_played_s, path in picks[-5:-1]:
+                self.assertFalse(
+                    path == picks[-1][1] and
+                    time_s - time_played_s < timeout_s)
+
+    def test_removed_video_never_picked(self):
+        pool = RandomVideoPool(PATHS)
+        pool.update_files(PATHS[1:])
+        self.assertEqual(len(pool), len(PATHS) - 1)
+        picks = {pool.pick(0, TIME_START_S + index)
+                 for index in range(200)}
+        self.assertNotIn(PATHS[0], picks)
+
+
+class TestWeightedVideoPool(unittest.TestCase):
+    """! Selection proportional to the weights of the videos """
+
+    def test_picks_follow_the_weights(self):
+        random.seed(3)
+        pool = WeightedVideoPool({PATHS[0]: 1, PATHS[1]: 3, PATHS[2]: 0})
+        counts = collections.Counter(pool.pick(0, TIME_START_S + index)
+                                     for index in range(4000))
+        self.assertNotIn(PATHS[2], counts)
+        self.assertAlmostEqual(counts[PATHS[1]] / 4000, 0.75, delta=0.03)
+
+    def test_timeout_respected(self):
+        pool = WeightedVideoPool({path: 1 + index
+                                  for index, path in enumerate(PATHS)})
+        picks = [(TIME_START_S + index * LENGTH_S,
+                  pool.pick(TIMEOUT_S, TIME_START_S + index * LENGTH_S))
+                 for index in range(500)]
+        self.assertEqual(get_violations(picks, TIMEOUT_S), [])
+
+    def test_cutoff_going_back(self):
+        for _ in range(50):
+            pool = WeightedVideoPool({path: 1 for path in PATHS[:3]})
+            first = pool.pick(TIMEOUT_S, TIME_START_S)
+            # Released by a pick further in time
+            second = pool.pick(TIMEOUT_S, TIME_START_S + 2 * TIMEOUT_S)
+            # The lookahead resolved again from an earlier time
+            third = pool.pick(TIMEOUT_S, TIME_START_S + LENGTH_S)
+            self.assertNotIn(third, (first, second))
+
+    def test_weight_changes(self):
+        pool = WeightedVideoPool({path: 1 for path in PATHS[:2]})
+        pool.set_weight(PATHS[0], 0)
+        self.assertEqual({pool.pick(0, TIME_START_S + index)
+                          for index in range(50)}, {PATHS[1]})
+        pool.update_files({PATHS[0]: 1, PATHS[2]: 1})
+        self.assertEqual(len(pool), 2)
+        self.assertEqual({pool.pick(0, TIME_START_S + 100 + index)
+                          for index in range(50)}, {PATHS[0], PATHS[2]})
+
+    def test_every_weight_zero(self):
+        pool = WeightedVideoPool({PATHS[0]: 0})
+        self.assertIsNone(pool.pick(TIMEOUT_S, TIME_START_S))
+
+
+class TestPlaybackHistory(unittest.TestCase):
+    """! Pools of several modes sharing the videos of a directory """
+
+    def test_modes_share_the_timeout(self):
+        history = PlaybackHistory()
+        pools = [ShuffleBagPool("clips", PATHS, history=history),
+                 RandomVideoPool(PATHS, history=history),
+                 WeightedVideoPool({path: 1 for path in PATHS},
+                                   history=history)]
+        picks = []
+        for index in range(600):
+            time_s = TIME_START_S + index * LENGTH_S
+            picks.append((time_s, pools[index % 3].pick(TIMEOUT_S, time_s)))
+        self.assertEqual(get_violations(picks, TIMEOUT_S), [])
+
+    def test_new_pool_knows_the_playbacks(self):
+        history = PlaybackHistory()
+        uniform_pool = RandomVideoPool(PATHS[:2], history=history)
+        played = uniform_pool.pick(TIMEOUT_S, TIME_START_S)
+        shuffle_pool = ShuffleBagPool("clips", PATHS[:2], history=history)
+        self.assertNotEqual(
+            shuffle_pool.pick(TIMEOUT_S, TIME_START_S + LENGTH_S), played)
+
+
+if __name__ == "__main__":
+    unittest.main()